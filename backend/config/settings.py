@@ -4,6 +4,7 @@ import logging
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
+from corsheaders.defaults import default_headers
 import secrets  # noqa: E402 - импорт после dotenv разрешён
 
 # Build paths
@@ -55,12 +56,15 @@ INSTALLED_APPS = [
     'django_cleanup.apps.CleanupConfig',
 
     # Local apps
+    'core',
     'users',
     'exchange',
     'orders',
+    'reports',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -69,6 +73,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.idempotency.IdempotencyMiddleware',
+    'core.db_routers.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -77,8 +83,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Шаблоны (в том числе писем users.email) компилируются один раз
+            # на процесс
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -90,6 +103,15 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+# Асинхронные версии списков валют и курсов, расчёта обмена, отслеживания
+# и публичных отзывов (core.asyncviews). Включать при запуске под ASGI
+ASYNC_HOT_ENDPOINTS = os.getenv('ASYNC_HOT_ENDPOINTS', 'False') == 'True'
+# Списки курсов, балансов и заказов собираются из values() и рендерятся
+# orjson (core.fastpath). Ответ тот же, что у сериализаторов DRF;
+# включается явно после проверки на своих данных (run_benchmarks
+# --serialization сравнивает ответы)
+FAST_LIST_RESPONSES = os.getenv('FAST_LIST_RESPONSES', 'False') == 'True'
 
 # Database configuration
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -114,6 +136,75 @@ else:
         }
     }
 
+# Реплики для чтения: URL через запятую (см. core.db_routers). В тестах
+# реплики указывают на тестовую основную БД
+DATABASE_REPLICA_URLS = [
+    url.strip()
+    for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',')
+    if url.strip()
+]
+DATABASE_REPLICAS = []
+for index, url in enumerate(DATABASE_REPLICA_URLS):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **dj_database_url.parse(url),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+# Сколько секунд после записи клиент читает из основной БД
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+# Маршруты, кроме list/retrieve, которые читают из реплик
+REPLICA_ROUTES = [
+    'order-tracking',
+    'review-list-public',
+    'review-stats',
+]
+
+# Кэш: Redis, если указан REDIS_URL, иначе память процесса
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Версионируемый кэш данных (core.cache): 'shared' - кэш default,
+# 'local' - LRU в памяти каждого процесса. Версии всегда хранятся в default
+VERSIONED_CACHE_BACKEND = os.getenv('VERSIONED_CACHE_BACKEND', 'shared')
+CACHES['local'] = {
+    'BACKEND': 'core.cache.LRUCache',
+    'LOCATION': 'versioned',
+    'OPTIONS': {
+        'MAX_ENTRIES': int(os.getenv('VERSIONED_CACHE_MAX_ENTRIES', '1000')),
+    },
+}
+# Сколько секунд значение свежее и сколько ещё отдаётся, пока пересобирается
+VERSIONED_CACHE_TIMEOUT = int(os.getenv('VERSIONED_CACHE_TIMEOUT', '300'))
+VERSIONED_CACHE_STALE_SECONDS = int(
+    os.getenv('VERSIONED_CACHE_STALE_SECONDS', '30')
+)
+
+# Ограничение частоты публичных эндпоинтов (core.throttling): token bucket,
+# 'число/период' (s, min, hour, day); число - и допустимый всплеск,
+# пустое значение - без ограничения
+THROTTLE_RATES = {
+    # на IP анонимного клиента
+    'anon': os.getenv('THROTTLE_ANON_RATE', '60/min'),
+    # на пользователя
+    'user': os.getenv('THROTTLE_USER_RATE', '120/min'),
+    # на эндпоинт для всех клиентов вместе
+    'endpoint': os.getenv('THROTTLE_ENDPOINT_RATE', '200/s'),
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -147,9 +238,120 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Защищённая выдача документов заказов.
+# nginx - X-Accel-Redirect, xsendfile - X-Sendfile (Apache/lighttpd),
+# simple - потоковая отдача из Django (только для локального запуска)
+SENDFILE_BACKEND = os.getenv('SENDFILE_BACKEND', 'simple')
+# internal location в nginx, указывающий на MEDIA_ROOT
+SENDFILE_URL = os.getenv('SENDFILE_URL', '/protected-media/')
+
+# Метрики запросов в формате Prometheus (/metrics, см. core.metrics).
+# METRICS_TOKEN - требуется заголовок Authorization: Bearer <token>; без
+# токена эндпоинт открыт только при DEBUG=True, иначе отвечает 403
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Запросы дольше порога (мс) пишутся в лог вместе с SQL; пусто - выключено
+SLOW_REQUEST_THRESHOLD_MS = (
+    int(os.getenv('SLOW_REQUEST_THRESHOLD_MS'))
+    if os.getenv('SLOW_REQUEST_THRESHOLD_MS') else None
+)
+
+# Ключи идемпотентности (заголовок Idempotency-Key, см. core.idempotency):
+# сколько хранится ответ, сколько ждёт повтор выполняющегося запроса и
+# через сколько зависший запрос считается прерванным
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', str(24 * 3600)))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '60'))
+
+# Публичная лента отзывов (см. orders.reviews): время жизни кэша страниц,
+# при изменении отзывов кэш сбрасывается сразу
+REVIEW_FEED_CACHE_TIMEOUT = int(os.getenv('REVIEW_FEED_CACHE_TIMEOUT', '600'))
+REVIEW_FEED_PAGE_SIZE = 20
+
+# Стартовый набор публичных данных витрины (см. core.bootstrap): собирается
+# заново при изменении данных и не реже, чем раз в столько секунд
+BOOTSTRAP_CACHE_TIMEOUT = int(os.getenv('BOOTSTRAP_CACHE_TIMEOUT', '3600'))
+
+# Transactional outbox событий заказов (см. orders.outbox).
+# Обработчики: {'status_changed': ['dotted.path.to.handler'], ...}
+ORDER_EVENT_HANDLERS = {
+    'order_created': [
+        'reports.rollups.handle_order_event',
+        'reports.sla.handle_order_event',
+    ],
+    'status_changed': [
+        'orders.notifications.handle_status_changed',
+        'reports.rollups.handle_order_event',
+        'reports.sla.handle_order_event',
+    ],
+    'office_changed': [
+        'reports.rollups.handle_order_event',
+        'reports.sla.handle_order_event',
+    ],
+}
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10'))
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '300'))
+
+# Фоновые задачи в БД (см. core.jobs, воркер run_jobs). Попытки до ошибки,
+# аренда выполняемой задачи, сек (задача дольше аренды запустится повторно),
+# сколько задач воркер забирает за раз и сколько дней хранить выполненные
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '600'))
+JOB_BATCH_SIZE = int(os.getenv('JOB_BATCH_SIZE', '1'))
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+# Периодические задачи: {'имя': {'task': 'dotted.path', 'every': секунды,
+# необязательно 'args', 'kwargs', 'queue', 'priority', 'max_attempts'}}
+JOB_SCHEDULE = {
+    'purge-idempotency-keys': {
+        'task': 'core.idempotency.purge_expired',
+        'every': 3600,
+    },
+    'purge-finished-jobs': {
+        'task': 'core.jobs.purge_finished',
+        'every': 24 * 3600,
+    },
+}
+
+# Webhook-уведомления клиентов о смене статуса заказа
+# (см. orders.notifications). Канал без URL отключён.
+ORDER_NOTIFICATION_WEBHOOKS = {
+    'telegram': {
+        'url': os.getenv('TELEGRAM_WEBHOOK_URL'),
+        'token': os.getenv('TELEGRAM_WEBHOOK_TOKEN'),
+        'rate_per_second': float(os.getenv('TELEGRAM_WEBHOOK_RATE', '25')),
+    },
+    'whatsapp': {
+        'url': os.getenv('WHATSAPP_WEBHOOK_URL'),
+        'token': os.getenv('WHATSAPP_WEBHOOK_TOKEN'),
+        'rate_per_second': float(os.getenv('WHATSAPP_WEBHOOK_RATE', '25')),
+    },
+}
+NOTIFICATION_CONCURRENCY = int(os.getenv('NOTIFICATION_CONCURRENCY', '100'))
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', '5'))
+NOTIFICATION_LEASE_SECONDS = 300
+
+# Выполненные и отменённые заказы старше N дней переносятся в архив
+# командой archive_orders
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv('ORDER_ARCHIVE_AFTER_DAYS', '180'))
+
 # URL фронтенда для генерации реферальных ссылок
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
 
+# Реферальные бонусы (users.bonuses, команда accrue_bonuses): начисление на
+# bonus_balance за каждый выполненный заказ приглашённого, по уровням сети
+# через запятую - первое значение прямому рефереру, второе его рефереру...
+REFERRAL_BONUS_AMOUNTS = [
+    amount.strip()
+    for amount in os.getenv('REFERRAL_BONUS_AMOUNTS', '100,50').split(',')
+    if amount.strip()
+]
+# Заказы, выполненные позже чем N секунд назад, ждут следующего запуска:
+# транзакции, которые их изменили, могли ещё не завершиться
+BONUS_ACCRUAL_DELAY_SECONDS = int(
+    os.getenv('BONUS_ACCRUAL_DELAY_SECONDS', '60')
+)
+BONUS_ACCRUAL_BATCH_SIZE = int(os.getenv('BONUS_ACCRUAL_BATCH_SIZE', '1000'))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -229,6 +431,10 @@ CORS_ALLOWED_ORIGINS = (
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Заголовок повторных запросов (см. core.idempotency)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'Retry-After']
+
 # Разрешаем все источники **только** когда DEBUG=True и явно установлена переменная ALLOW_ALL_CORS
 # IMPORTANT: Всегда устанавливайте ALLOW_ALL_CORS=False в .env для production/staging
 ALLOW_ALL_CORS = os.getenv('ALLOW_ALL_CORS', 'False') == 'True'
@@ -240,8 +446,17 @@ elif not DEBUG and ALLOW_ALL_CORS:
     raise ValueError("ALLOW_ALL_CORS cannot be True in production environment")
 
 # Email settings
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # выводит письма в консоль
-# EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Письма только ставятся в очередь (core.mail), отправляет их воркер
+# send_queued_mail через QUEUED_EMAIL_BACKEND
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+QUEUED_EMAIL_BACKEND = os.getenv(
+    'QUEUED_EMAIL_BACKEND',
+    'django.core.mail.backends.console.EmailBackend'  # выводит письма в консоль
+)
+# QUEUED_EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+MAIL_QUEUE_BATCH_SIZE = int(os.getenv('MAIL_QUEUE_BATCH_SIZE', '50'))
+MAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv('MAIL_QUEUE_MAX_ATTEMPTS', '5'))
+MAIL_QUEUE_LEASE_SECONDS = int(os.getenv('MAIL_QUEUE_LEASE_SECONDS', '300'))
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -1,15 +1,32 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
+
+from core.bootstrap import bootstrap_view
+from core.metrics import metrics_view
+from exchange.urls import async_urlpatterns as exchange_async_urls
+from orders.urls import async_urlpatterns as orders_async_urls
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     # Auth URLs
     path('api/auth/', include('djoser.urls')),
     path('api/auth/', include('djoser.urls.jwt')),
+]
+if settings.ASYNC_HOT_ENDPOINTS:
+    # Асинхронные версии должны идти раньше маршрутов роутеров
+    urlpatterns += [
+        path('api/v1/', include(exchange_async_urls)),
+        path('api/v1/', include(orders_async_urls)),
+    ]
+urlpatterns += [
     # API URLs
+    path('api/v1/bootstrap/', bootstrap_view, name='bootstrap'),
     path('api/v1/', include('users.urls')),
     path('api/v1/', include('orders.urls')),
+    path('api/v1/', include('reports.urls')),
     path('api/v1/', include('exchange.urls')),  # добавим позже
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+# Медиафайлы не раздаются напрямую: документы заказов доступны только
+# через orders/{id}/documents/{document_id}/download/ с проверкой прав
@@ -0,0 +1,86 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from core.models import IdempotencyKey, Job, JobQueue, QueuedEmail
+
+
+@admin.register(QueuedEmail)
+class QueuedEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'status', 'attempts',
+                    'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'to')
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'sent_at')
+    ordering = ('-id',)
+    actions = ['retry_emails']
+
+    @admin.action(description='Повторить отправку')
+    def retry_emails(self, request, queryset):
+        queryset.exclude(status=QueuedEmail.SENT).update(
+            status=QueuedEmail.PENDING,
+            attempts=0,
+            available_at=timezone.now(),
+        )
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'method', 'path', 'status', 'response_status',
+                    'created_at', 'expires_at')
+    list_filter = ('status', 'method')
+    search_fields = ('key', 'path')
+    readonly_fields = ('scope', 'key', 'fingerprint', 'method', 'path',
+                       'status', 'locked_until', 'response_status',
+                       'response_headers', 'created_at', 'expires_at')
+    exclude = ('response_body',)
+    ordering = ('-id',)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'queue', 'priority', 'status', 'attempts',
+                    'available_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'queue')
+    search_fields = ('task', 'key')
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'started_at',
+                       'finished_at')
+    ordering = ('-id',)
+    actions = ['retry_jobs', 'cancel_jobs']
+
+    @admin.action(description='Запустить заново')
+    def retry_jobs(self, request, queryset):
+        queryset.filter(
+            status__in=[Job.FAILED, Job.CANCELLED]
+        ).update(
+            status=Job.PENDING,
+            attempts=0,
+            available_at=timezone.now(),
+            finished_at=None,
+        )
+
+    @admin.action(description='Отменить')
+    def cancel_jobs(self, request, queryset):
+        queryset.filter(status=Job.PENDING).update(
+            status=Job.CANCELLED,
+            finished_at=timezone.now(),
+        )
+
+
+@admin.register(JobQueue)
+class JobQueueAdmin(admin.ModelAdmin):
+    list_display = ('name', 'concurrency', 'paused', 'pending_jobs',
+                    'running_jobs', 'claimed_at')
+    list_editable = ('concurrency', 'paused')
+    readonly_fields = ('claimed_at',)
+
+    @admin.display(description='Ожидают')
+    def pending_jobs(self, obj):
+        return Job.objects.filter(queue=obj.name, status=Job.PENDING).count()
+
+    @admin.display(description='Выполняются')
+    def running_jobs(self, obj):
+        return Job.objects.filter(
+            queue=obj.name,
+            status=Job.RUNNING,
+            available_at__gt=timezone.now(),
+        ).count()
@@ -0,0 +1,158 @@
+"""Async fast path for read-heavy DRF endpoints.
+
+Under ASGI an async view does not hold a worker thread while it waits for
+the database, the cache or a slow client, so one worker serves many
+concurrent requests. DRF views are synchronous; `hot_path` wraps an async
+handler for the common case and falls back to the regular DRF view for
+everything else (other methods, browsable API, errors), so responses stay
+exactly the same as those of the sync view.
+
+The routes are enabled by `settings.ASYNC_HOT_ENDPOINTS` (see config.urls).
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import APIException, Throttled
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from core.fieldsets import requested_fieldset
+from core.throttling import ADMITTED
+
+HTML = 'text/html'
+
+
+def hot_path(sync_view, methods=('GET',)):
+    """Serve `methods` with the decorated async handler.
+
+    The handler gets a DRF `Request` and returns a response or None;
+    None, other methods, non-JSON requests and requests with `?fields=` or
+    `?expand=` (core.fieldsets) are passed to `sync_view`. The throttles of
+    `sync_view` (core.throttling) run before the handler; a refused request
+    is passed to `sync_view` as well, which answers 429.
+    """
+    sync_call = sync_to_async(sync_view)
+    headers = default_headers(sync_view)
+    throttled = {
+        method for method in methods
+        if view_instance(sync_view, method).get_throttles()
+    }
+
+    def decorator(handler):
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            response = None
+            if (
+                request.method in methods
+                and wants_json(request)
+                and requested_fieldset(request) == (None, None)
+            ):
+                # Тело читается заранее: при откате на синхронный view
+                # DRF разберёт его ещё раз
+                request.body
+                drf_request = api_request(request)
+                try:
+                    if request.method not in throttled or await admit(
+                        sync_view, drf_request, *args, **kwargs
+                    ):
+                        response = await handler(drf_request, *args, **kwargs)
+                except APIException:
+                    response = None
+            if response is None:
+                return await sync_call(request, *args, **kwargs)
+            response['Allow'] = headers['Allow']
+            if 'Vary' in headers:
+                patch_vary_headers(response, [headers['Vary']])
+            return response
+
+        # Как у DRF: CSRF проверяют классы аутентификации, а не middleware
+        view.csrf_exempt = True
+        # Для метрик и маршрутизации чтений (core.metrics, core.db_routers)
+        view.actions = getattr(sync_view, 'actions', None)
+        return view
+
+    return decorator
+
+
+def router_view(router, name):
+    """The DRF view the router serves under the URL name."""
+    return next(
+        pattern.callback for pattern in router.urls
+        if getattr(pattern, 'name', None) == name
+    )
+
+
+def api_request(request):
+    return Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[
+            auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ],
+    )
+
+
+def wants_json(request):
+    """False when DRF could choose another renderer (browsable API)."""
+    if api_settings.URL_FORMAT_OVERRIDE in request.GET:
+        return False
+    return HTML not in request.headers.get('Accept', '')
+
+
+async def authenticated_user(request):
+    """User authenticated by the DRF classes, or None on any failure."""
+    def authenticate():
+        try:
+            user = request.user
+        except Exception:
+            return None
+        return user if user.is_authenticated else None
+
+    return await sync_to_async(authenticate)()
+
+
+def json_response(data, status=200):
+    """Same bytes as a DRF `Response` rendered by JSONRenderer."""
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status,
+        content_type='application/json',
+    )
+
+
+def default_headers(sync_view):
+    """`Allow` and `Vary` headers that the DRF view adds to responses."""
+    view = sync_view.cls(**sync_view.initkwargs)
+    for method, action in (getattr(sync_view, 'actions', None) or {}).items():
+        setattr(view, method, getattr(view, action))
+    if hasattr(view, 'get') and not hasattr(view, 'head'):
+        view.head = view.get
+    return view.default_response_headers
+
+
+def view_instance(sync_view, method):
+    """DRF view instance set up for a request with `method`."""
+    view = sync_view.cls(**sync_view.initkwargs)
+    actions = getattr(sync_view, 'actions', None) or {}
+    view.action = actions.get(method.lower())
+    return view
+
+
+@sync_to_async
+def admit(sync_view, request, *args, **kwargs):
+    """Run the throttles of the DRF view, False when the request is refused.
+
+    An admitted request is marked, so the DRF view does not take a second
+    token when the handler passes the request on.
+    """
+    view = view_instance(sync_view, request.method)
+    view.request, view.args, view.kwargs = request, args, kwargs
+    try:
+        view.check_throttles(request)
+    except Throttled:
+        return False
+    setattr(request._request, ADMITTED, True)
+    return True
@@ -0,0 +1,270 @@
+"""Large synthetic data set for endpoint benchmarks (see core.benchmarks).
+
+Everything is inserted with `bulk_create` in batches, one transaction per
+batch, so millions of orders take minutes rather than hours. Signals are
+not sent by `bulk_create`: search entries are inserted directly, review
+stats and referral paths are recounted and cached data is invalidated
+(core.cache) at the end, rollups are built only on request.
+
+Generated rows are recognisable: users have `@bench.example.com` emails,
+currency codes start with `BX`, offices with `Bench` and tracking codes
+with `0`, which shortuuid never produces for real orders.
+"""
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.utils import timezone
+
+from core.cache import bump_models
+from exchange.models import (
+    Currency,
+    CurrencyBalance,
+    ExchangeOffice,
+    ExchangeRate,
+)
+from exchange.sync import reset_tables
+from orders.models import (
+    Order,
+    OrderItem,
+    OrderSearchEntry,
+    Review,
+)
+from orders.reviews import rebuild_stats
+from orders.search import build_content
+from users.referrals import rebuild_paths
+
+User = get_user_model()
+
+BENCH_DOMAIN = 'bench.example.com'
+BENCH_OPERATOR_EMAIL = f'operator@{BENCH_DOMAIN}'
+BENCH_OWNER_EMAIL = f'owner@{BENCH_DOMAIN}'
+
+STATUS_WEIGHTS = {
+    'new': 5,
+    'processing': 5,
+    'waiting_delivery': 5,
+    'completed': 70,
+    'cancelled': 15,
+}
+HISTORY_DAYS = 730
+
+
+def seed(
+    *,
+    currencies=2000,
+    rates=5000,
+    offices=300,
+    users=20000,
+    orders=1_000_000,
+    max_items_per_order=3,
+    review_share=0.1,
+    batch_size=5000,
+    random_seed=1,
+    progress=None,
+):
+    """Generate the data set. Returns row counts by model name."""
+    rng = random.Random(random_seed)
+    progress = progress or (lambda message: None)
+    counts = {}
+
+    with transaction.atomic():
+        currency_ids = _seed_currencies(currencies)
+        rate_rows = _seed_rates(rng, currency_ids, rates)
+        office_ids = _seed_offices(rng, offices, currency_ids)
+        user_rows = _seed_users(users, batch_size)
+        # Отдельный генератор: заказы не зависят от реферального дерева
+        _seed_referrals(random.Random(random_seed), user_rows, batch_size)
+    counts.update(
+        currencies=len(currency_ids), rates=len(rate_rows),
+        offices=len(office_ids), users=len(user_rows),
+    )
+    progress(f'Reference data: {counts}')
+
+    now = timezone.now()
+    created = items = reviews = 0
+    first_number = Order.objects.filter(tracking_code__startswith='0').count()
+    status_values = list(STATUS_WEIGHTS)
+    status_weights = list(STATUS_WEIGHTS.values())
+    while created < orders:
+        size = min(batch_size, orders - created)
+        with transaction.atomic(), _keep_timestamps(Order, Review):
+            batch = []
+            for number in range(first_number + created,
+                                first_number + created + size):
+                user = rng.choice(user_rows)
+                created_at = now - timedelta(
+                    seconds=rng.randrange(HISTORY_DAYS * 86400)
+                )
+                batch.append(Order(
+                    user=user,
+                    office_id=rng.choice(office_ids),
+                    tracking_code=f'0{number:09d}',
+                    status=rng.choices(status_values, status_weights)[0],
+                    telegram=f'@bench_{user.pk}',
+                    whatsapp=f'+7999{user.pk:07d}'[:20],
+                    comment=rng.choice(['', '', 'Наличными', 'Позвонить']),
+                    created_at=created_at,
+                    updated_at=created_at + timedelta(hours=rng.randrange(72)),
+                ))
+            Order.objects.bulk_create(batch)
+
+            item_rows = []
+            review_rows = []
+            for order in batch:
+                for _ in range(rng.randint(1, max_items_per_order)):
+                    from_id, to_id, rate = rng.choice(rate_rows)
+                    amount_from = Decimal(rng.randrange(10, 100000))
+                    item_rows.append(OrderItem(
+                        order=order,
+                        from_currency_id=from_id,
+                        to_currency_id=to_id,
+                        amount_from=amount_from,
+                        amount_to=amount_from * rate,
+                        rate=rate,
+                    ))
+                if order.status == 'completed' and rng.random() < review_share:
+                    review_rows.append(Review(
+                        order=order,
+                        rating=rng.choices(range(1, 6), (2, 3, 10, 35, 50))[0],
+                        text='Всё прошло быстро',
+                        created_at=order.updated_at,
+                    ))
+            OrderItem.objects.bulk_create(item_rows)
+            Review.objects.bulk_create(review_rows)
+            OrderSearchEntry.objects.bulk_create([
+                OrderSearchEntry(order=order, content=build_content(order))
+                for order in batch
+            ])
+
+        created += size
+        items += len(item_rows)
+        reviews += len(review_rows)
+        progress(f'Orders: {created}/{orders}')
+
+    rebuild_stats()
+    rebuild_paths()
+    bump_models(Currency, ExchangeRate, ExchangeOffice, CurrencyBalance)
+    reset_tables(Currency, ExchangeRate, ExchangeOffice, CurrencyBalance)
+    counts.update(orders=created, items=items, reviews=reviews)
+    return counts
+
+
+def _seed_currencies(count):
+    existing = Currency.objects.filter(code__startswith='BX').count()
+    Currency.objects.bulk_create([
+        Currency(code=f'BX{number:05d}', name=f'Валюта {number}', symbol='¤')
+        for number in range(existing, count)
+    ])
+    return list(
+        Currency.objects.filter(code__startswith='BX')
+        .order_by('id').values_list('id', flat=True)[:count]
+    )
+
+
+def _seed_rates(rng, currency_ids, count):
+    pairs = set(
+        ExchangeRate.objects.values_list('from_currency_id', 'to_currency_id')
+    )
+    limit = len(currency_ids) * (len(currency_ids) - 1)
+    new_rates = []
+    while len(new_rates) < count and len(pairs) < limit:
+        pair = tuple(rng.sample(currency_ids, 2))
+        if pair in pairs:
+            continue
+        pairs.add(pair)
+        new_rates.append(ExchangeRate(
+            from_currency_id=pair[0],
+            to_currency_id=pair[1],
+            rate=Decimal(rng.randrange(1, 1_000_000)) / 10000,
+            min_amount=Decimal('10.00'),
+        ))
+    ExchangeRate.objects.bulk_create(new_rates)
+    return list(
+        ExchangeRate.objects.filter(from_currency_id__in=currency_ids)
+        .values_list('from_currency_id', 'to_currency_id', 'rate')
+    )
+
+
+def _seed_offices(rng, count, currency_ids):
+    offices = ExchangeOffice.objects.bulk_create([
+        ExchangeOffice(name=f'Bench {number}', address=f'Тестовая ул., {number}')
+        for number in range(count)
+    ])
+    CurrencyBalance.objects.bulk_create([
+        CurrencyBalance(
+            office=office,
+            currency_id=currency_id,
+            balance=Decimal(rng.randrange(0, 10_000_000)),
+        )
+        for office in offices
+        for currency_id in rng.sample(currency_ids, min(10, len(currency_ids)))
+    ])
+    return [office.pk for office in offices]
+
+
+def _seed_users(count, batch_size):
+    start = User.objects.filter(email__endswith=f'@{BENCH_DOMAIN}').count()
+    User.objects.bulk_create(
+        [
+            User(
+                email=f'user{number}@{BENCH_DOMAIN}',
+                username=f'bench_user{number}',
+                supabase_user_id=uuid.uuid4(),
+                referral_code=f'BU{number:08d}',
+                password='!',
+            )
+            for number in range(start, count)
+        ],
+        batch_size=batch_size,
+    )
+
+    for email, group in [(BENCH_OPERATOR_EMAIL, 'Operators'),
+                         (BENCH_OWNER_EMAIL, 'Owners')]:
+        user, _ = User.objects.get_or_create(
+            email=email,
+            defaults={
+                'username': email.replace('@', '_'),
+                'supabase_user_id': uuid.uuid4(),
+            },
+        )
+        user.groups.add(Group.objects.get_or_create(name=group)[0])
+
+    return list(
+        User.objects.filter(email__startswith='user',
+                            email__endswith=f'@{BENCH_DOMAIN}')
+        .only('id', 'email').order_by('id')[:count]
+    )
+
+
+def _seed_referrals(rng, user_rows, batch_size):
+    # Каждого пользователя пригласил один из созданных раньше: дерево
+    # глубиной около ln(N) с корнем в первом пользователе
+    for number, user in enumerate(user_rows[1:], 1):
+        user.referred_by_id = user_rows[rng.randrange(number)].pk
+    User.objects.bulk_update(user_rows, ['referred_by'], batch_size=batch_size)
+
+
+@contextmanager
+def _keep_timestamps(*models):
+    """Let bulk_create store the given created_at/updated_at values."""
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
@@ -0,0 +1,394 @@
+"""Endpoint benchmarks against the data set from core.benchmark_data.
+
+Every scenario is a request made through `django.test.Client` with a real
+Supabase JWT, so authentication, middleware, permissions and serializers
+are all measured. For each scenario the runner records latency percentiles
+and the number of SQL queries of the last iteration.
+
+Results are stored as JSON and can be compared with a saved baseline:
+a scenario regresses when its p50 or p90 latency grows by more than the
+tolerance, or when it makes more queries than before.
+
+`run_concurrency` compares throughput of the sync DRF views (WSGI handler,
+one thread per concurrent client) with the async versions of the hot
+endpoints (ASGI handler, one event loop), see core.asyncviews.
+
+`run_serialization` measures CPU time per returned row of the list
+endpoints with the fast read path (core.fastpath) switched off and on.
+"""
+import asyncio
+import importlib
+import json
+import math
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+import jwt
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import clear_url_caches, reverse
+from django.utils import timezone
+
+from core.benchmark_data import (
+    BENCH_DOMAIN,
+    BENCH_OPERATOR_EMAIL,
+    BENCH_OWNER_EMAIL,
+)
+from exchange.models import ExchangeRate, ReferenceVersion
+from orders.models import Order
+
+User = get_user_model()
+
+PERCENTILES = (50, 90, 99)
+# Сценарии эндпоинтов, у которых есть асинхронные версии
+HOT_SCENARIOS = (
+    'currency-list',
+    'rate-list',
+    'rate-calculate',
+    'order-tracking',
+    'review-list-public',
+)
+# Списки с быстрой сборкой ответа (core.fastpath)
+FAST_LIST_SCENARIOS = (
+    'rate-list',
+    'balance-by-office',
+    'order-list-operator',
+)
+DEFAULT_TOLERANCE = 0.2
+TOKEN_TTL = timedelta(hours=1)
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    role: str = None
+    data: dict = field(default_factory=dict)
+    # Тяжёлые сценарии (полные выборки) запускаются только по запросу
+    heavy: bool = False
+
+
+def default_scenarios(context):
+    """Scenarios for every public endpoint; `context` from `bench_context`."""
+    order = context['order']
+    return [
+        Scenario('bootstrap', 'get', reverse('bootstrap')),
+        Scenario('currency-list', 'get', reverse('currency-list')),
+        Scenario('rate-list', 'get', reverse('rate-list')),
+        Scenario(
+            'rate-calculate', 'post',
+            reverse('rate-calculate', args=[context['rate'].pk]),
+            role='customer', data={'amount_from': '100'},
+        ),
+        Scenario('office-list', 'get', reverse('office-list'),
+                 role='customer'),
+        Scenario('balance-list', 'get', reverse('balance-list'),
+                 role='owner'),
+        Scenario('balance-by-office', 'get', reverse('balance-by-office'),
+                 role='owner', data={'office_id': order.office_id}),
+        Scenario('sync-delta', 'get', reverse('sync-list'),
+                 role='owner', data=context['versions']),
+        Scenario('user-me', 'get', reverse('user-me'), role='customer'),
+        Scenario('user-referrals', 'get', reverse('user-referrals'),
+                 role='referrer'),
+        Scenario('user-referral-stats', 'get', reverse('user-referral-stats'),
+                 role='referrer'),
+        Scenario('order-list', 'get', reverse('order-list'),
+                 role='customer'),
+        Scenario('order-detail', 'get',
+                 reverse('order-detail', args=[order.pk]), role='customer'),
+        Scenario('order-documents', 'get',
+                 reverse('order-documents', args=[order.pk]),
+                 role='customer'),
+        Scenario('order-tracking', 'get',
+                 reverse('order-tracking', args=[order.tracking_code])),
+        Scenario('order-search', 'get', reverse('order-search'),
+                 role='operator', data={'q': order.tracking_code}),
+        Scenario('review-list-public', 'get',
+                 reverse('review-list-public')),
+        Scenario('review-stats', 'get', reverse('review-stats')),
+        Scenario('report-volume', 'get', reverse('report-volume'),
+                 role='owner'),
+        Scenario('report-sla', 'get', reverse('report-sla'),
+                 role='owner'),
+        Scenario('order-list-operator', 'get', reverse('order-list'),
+                 role='operator', heavy=True),
+        Scenario('order-export', 'get', reverse('order-export'),
+                 role='owner', data={'file_format': 'csv'}, heavy=True),
+        Scenario('sync-full', 'get', reverse('sync-list'),
+                 role='owner', heavy=True),
+    ]
+
+
+def bench_context():
+    """Users and objects the scenarios are built around."""
+    order = (
+        Order.objects.filter(user__email__endswith=f'@{BENCH_DOMAIN}')
+        .select_related('user').order_by('-id').first()
+    )
+    if order is None:
+        raise LookupError(
+            'Benchmark data not found, run seed_benchmark_data first'
+        )
+    return {
+        'order': order,
+        'rate': ExchangeRate.objects.filter(is_active=True)
+        .order_by('id').first(),
+        # Клиент, у которого уже есть текущие версии справочников
+        'versions': dict(
+            ReferenceVersion.objects.values_list('table', 'version')
+        ),
+        'users': {
+            'customer': order.user,
+            'operator': User.objects.get(email=BENCH_OPERATOR_EMAIL),
+            'owner': User.objects.get(email=BENCH_OWNER_EMAIL),
+            # Корень реферального дерева: в его сети все пользователи
+            'referrer': User.objects.get(email=f'user0@{BENCH_DOMAIN}'),
+        },
+    }
+
+
+def make_token(user, secret):
+    """HS256 token in the format issued by Supabase."""
+    return jwt.encode(
+        {
+            'sub': str(user.supabase_user_id),
+            'email': user.email,
+            'aud': 'authenticated',
+            'exp': timezone.now() + TOKEN_TTL,
+        },
+        secret,
+        algorithm='HS256',
+    )
+
+
+def bench_settings(secret):
+    # Все запросы идут с одного адреса: без ограничения частоты
+    # (core.throttling) они упирались бы в лимит анонимного клиента
+    return override_settings(
+        SUPABASE_JWT_SECRET=secret, ALLOWED_HOSTS=['*'], THROTTLE_RATES={}
+    )
+
+
+def run(scenarios, users, *, iterations=20, warmup=2, progress=None):
+    """Run the scenarios and return their results keyed by name."""
+    progress = progress or (lambda message: None)
+    secret = uuid.uuid4().hex
+    client = Client()
+    results = {}
+
+    with bench_settings(secret):
+        headers = {
+            role: {'Authorization': f'Bearer {make_token(user, secret)}'}
+            for role, user in users.items()
+        }
+        for scenario in scenarios:
+            request = _request(client, scenario, headers.get(scenario.role, {}))
+            for _ in range(warmup):
+                request()
+
+            timings = []
+            for _ in range(iterations):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = request()
+                    timings.append((time.perf_counter() - start) * 1000)
+
+            results[scenario.name] = {
+                'status': response.status_code,
+                'queries': len(queries),
+                **summarize(timings),
+            }
+            progress(format_result(scenario.name, results[scenario.name]))
+    return results
+
+
+def run_concurrency(scenarios, users, *, concurrency=50, requests=500):
+    """Requests per second of sync and async views, keyed by scenario."""
+    secret = uuid.uuid4().hex
+    per_worker = max(requests // concurrency, 1)
+    results = {}
+
+    with bench_settings(secret):
+        headers = {
+            role: {'Authorization': f'Bearer {make_token(user, secret)}'}
+            for role, user in users.items()
+        }
+        for scenario in scenarios:
+            extra = headers.get(scenario.role, {})
+
+            def sync_worker():
+                request = _request(Client(), scenario, extra)
+                try:
+                    for _ in range(per_worker):
+                        request()
+                finally:
+                    connections.close_all()
+
+            async def async_workers():
+                async def worker():
+                    request = _async_request(AsyncClient(), scenario, extra)
+                    for _ in range(per_worker):
+                        await request()
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+            with async_hot_endpoints(False):
+                start = time.perf_counter()
+                with ThreadPoolExecutor(concurrency) as executor:
+                    for future in [executor.submit(sync_worker)
+                                   for _ in range(concurrency)]:
+                        future.result()
+                sync_time = time.perf_counter() - start
+
+            with async_hot_endpoints(True):
+                start = time.perf_counter()
+                asyncio.run(async_workers())
+                async_time = time.perf_counter() - start
+
+            total = per_worker * concurrency
+            results[scenario.name] = {
+                'sync_rps': round(total / sync_time, 1),
+                'async_rps': round(total / async_time, 1),
+            }
+    return results
+
+
+def run_serialization(scenarios, users, *, iterations=10):
+    """CPU microseconds per row with FAST_LIST_RESPONSES off and on."""
+    secret = uuid.uuid4().hex
+    client = Client()
+    results = {}
+
+    with bench_settings(secret):
+        headers = {
+            role: {'Authorization': f'Bearer {make_token(user, secret)}'}
+            for role, user in users.items()
+        }
+        for scenario in scenarios:
+            request = _request(client, scenario, headers.get(scenario.role, {}))
+            result = {}
+            bodies = []
+            for mode, enabled in (('serializer', False), ('fast', True)):
+                with override_settings(FAST_LIST_RESPONSES=enabled):
+                    request()
+                    start = time.process_time()
+                    for _ in range(iterations):
+                        response = request()
+                    cpu = (time.process_time() - start) / iterations
+                rows = max(len(json.loads(response.content)), 1)
+                result[f'{mode}_us_per_row'] = round(cpu / rows * 1e6, 1)
+                bodies.append(response.content)
+            result['rows'] = rows
+            # Быстрый путь обязан отдавать те же байты
+            result['identical'] = bodies[0] == bodies[1]
+            results[scenario.name] = result
+    return results
+
+
+@contextmanager
+def async_hot_endpoints(enabled):
+    """Serve the URLconf with ASYNC_HOT_ENDPOINTS set to `enabled`."""
+    try:
+        with override_settings(ASYNC_HOT_ENDPOINTS=enabled):
+            _reload_urlconf()
+            yield
+    finally:
+        _reload_urlconf()
+
+
+def _reload_urlconf():
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+def _async_request(client, scenario, headers):
+    async def request():
+        if scenario.method == 'get':
+            return await client.get(
+                scenario.path, scenario.data, headers=headers
+            )
+        return await client.generic(
+            scenario.method.upper(), scenario.path,
+            json.dumps(scenario.data),
+            content_type='application/json', headers=headers,
+        )
+    return request
+
+
+def _request(client, scenario, headers):
+    def request():
+        if scenario.method == 'get':
+            response = client.get(
+                scenario.path, scenario.data, headers=headers
+            )
+        else:
+            response = client.generic(
+                scenario.method.upper(), scenario.path,
+                json.dumps(scenario.data),
+                content_type='application/json', headers=headers,
+            )
+        if response.streaming:
+            # Время выгрузки включает чтение всего файла
+            for _ in response.streaming_content:
+                pass
+        return response
+    return request
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    summary = {
+        f'p{percentile}': round(_percentile(ordered, percentile), 2)
+        for percentile in PERCENTILES
+    }
+    summary.update(
+        mean=round(statistics.fmean(ordered), 2),
+        max=round(ordered[-1], 2),
+        iterations=len(ordered),
+    )
+    return summary
+
+
+def _percentile(ordered, percentile):
+    """Nearest-rank percentile of a sorted list."""
+    rank = max(math.ceil(percentile / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Return regressions of `results` against `baseline` as strings."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ('p50', 'p90'):
+            if result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: {metric} {previous[metric]} -> '
+                    f'{result[metric]} ms'
+                )
+        if result['queries'] > previous['queries']:
+            regressions.append(
+                f"{name}: queries {previous['queries']} -> "
+                f"{result['queries']}"
+            )
+    return regressions
+
+
+def format_result(name, result):
+    return (
+        f"{name:<22} {result['status']}  "
+        f"p50 {result['p50']:>8.2f}  p90 {result['p90']:>8.2f}  "
+        f"p99 {result['p99']:>8.2f}  max {result['max']:>8.2f} ms  "
+        f"queries {result['queries']}"
+    )
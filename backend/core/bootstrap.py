@@ -0,0 +1,158 @@
+"""Public bootstrap bundle of the storefront.
+
+On load the storefront needs the active currencies, rates and offices and
+the latest public reviews with the overall rating. `bootstrap_view` serves
+them in one anonymous request, without DRF authentication, permissions or
+serializers on the way: the bundle is built once, rendered to JSON and
+compressed (gzip, and brotli when the `brotli` package is installed), and
+the bytes are kept in the 'bootstrap' namespace of core.cache.
+
+The cache key includes the versions of the namespaces the bundle is built
+from, so any change of currencies, rates, offices or reviews makes the next
+request rebuild it; otherwise it is rebuilt every
+`settings.BOOTSTRAP_CACHE_TIMEOUT` seconds. The ETag is the hash of the
+JSON: clients revalidate with If-None-Match and get 304 while the data is
+the same.
+
+Tables are compact: `{'fields': [...], 'rows': [[...], ...]}` with values
+formatted as in the list endpoints; rates refer to currencies by id.
+"""
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.http import require_safe
+
+from core.cache import cached, version
+from core.fastpath import ORJSONRenderer, serializer_columns
+from exchange.models import Currency, ExchangeOffice, ExchangeRate
+from exchange.serializers import (
+    CurrencySerializer,
+    ExchangeOfficeSerializer,
+    ExchangeRateSerializer,
+)
+from orders.reviews import REVIEWS_NAMESPACE, review_statistics
+from orders.selectors import reviews_for_user
+from orders.serializers import ReviewPublicSerializer
+
+try:
+    import brotli
+except ImportError:
+    # Без brotli отдаются gzip и несжатая версия
+    brotli = None
+
+BOOTSTRAP_NAMESPACE = 'bootstrap'
+# Пространства core.cache, из данных которых собирается набор
+SOURCE_NAMESPACES = ('currencies', 'rates', 'offices', REVIEWS_NAMESPACE)
+
+IDENTITY = 'identity'
+# Кодировки в порядке предпочтения
+ENCODINGS = ('br', 'gzip')
+
+
+def table(queryset, serializer, omit=()):
+    """Compact table of the serializer's fields, read with `values_list()`."""
+    columns = serializer_columns(serializer, computed=omit)
+    rows = [
+        [
+            value if value is None or column.convert is None
+            else column.convert(value)
+            for column, value in zip(columns, record)
+        ]
+        for record in queryset.values_list(
+            *[column.lookup for column in columns]
+        )
+    ]
+    return {'fields': [column.name for column in columns], 'rows': rows}
+
+
+def bundle_data():
+    reviews = ReviewPublicSerializer(
+        reviews_for_user('list_public', None)[:settings.REVIEW_FEED_PAGE_SIZE],
+        many=True,
+    ).data
+    return {
+        'currencies': table(
+            Currency.objects.filter(is_active=True).order_by('code'),
+            CurrencySerializer(),
+            omit={'is_active'},
+        ),
+        'rates': table(
+            ExchangeRate.objects.filter(is_active=True).order_by('id'),
+            ExchangeRateSerializer(),
+            omit={'from_currency_code', 'to_currency_code', 'is_active'},
+        ),
+        'offices': table(
+            ExchangeOffice.objects.filter(is_active=True).order_by('id'),
+            ExchangeOfficeSerializer(),
+            omit={'is_active'},
+        ),
+        'reviews': {
+            'fields': list(ReviewPublicSerializer().fields),
+            'rows': [list(review.values()) for review in reviews],
+        },
+        'rating': review_statistics()['overall'],
+    }
+
+
+def build_bundle():
+    """Rendered and compressed bundle with its ETag."""
+    body = ORJSONRenderer().render(bundle_data())
+    bundle = {
+        'etag': f'W/"{hashlib.sha256(body).hexdigest()[:32]}"',
+        IDENTITY: body,
+        'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        bundle['br'] = brotli.compress(body, quality=11)
+    return bundle
+
+
+def get_bundle():
+    return cached(
+        BOOTSTRAP_NAMESPACE,
+        *[version(namespace) for namespace in SOURCE_NAMESPACES],
+        build=build_bundle,
+        timeout=settings.BOOTSTRAP_CACHE_TIMEOUT,
+    )
+
+
+def accepted_encodings(request):
+    """Content codings from Accept-Encoding, except those with q=0."""
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = item.partition(';')
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+@require_safe
+def bootstrap_view(request):
+    """Public reference data for the storefront in one request."""
+    bundle = get_bundle()
+    response = get_conditional_response(request, etag=bundle['etag'])
+    if response is None:
+        accepted = accepted_encodings(request)
+        encoding = next(
+            (name for name in ENCODINGS if name in bundle and name in accepted),
+            None,
+        )
+        response = HttpResponse(
+            bundle[encoding or IDENTITY], content_type='application/json'
+        )
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = bundle['etag']
+    # Промежуточные кэши хранят ответ, но каждый раз сверяют ETag
+    response['Cache-Control'] = 'public, no-cache'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,320 @@
+"""Versioned read-through cache.
+
+Cached values live in namespaces (currencies, rates, reviews, ...). Every
+namespace has a version number in the default cache; keys include it, so
+bumping the version makes all values of the namespace unreachable at once
+and nothing has to be deleted. `register_namespace` bumps a namespace after
+the commit of any `post_save`/`post_delete` of the listed models; code that
+changes rows in bulk (`update()`, `bulk_create()`) calls `bump_models`.
+
+`cached` reads through the cache:
+
+* single flight - on a miss one caller builds the value while concurrent
+  callers wait for it instead of running the same queries;
+* stale-while-revalidate - a value is fresh for `timeout` seconds and kept
+  for `stale` seconds more; during that time one caller rebuilds it and
+  the others are served the previous value without waiting.
+
+Values are stored in the cache named by `settings.VERSIONED_CACHE_BACKEND`:
+'shared' is the default cache (Redis when REDIS_URL is set), 'local' is an
+LRU in the memory of every process (`LRUCache`). Versions are always kept in
+the default cache, so invalidation reaches every process.
+
+Values are always built from the primary database: after a bump a lagging
+replica (core.db_routers) would put old data under the new version.
+
+Hits, misses and evictions are exported to /metrics (core.metrics).
+"""
+import asyncio
+import hashlib
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+
+from core.db_routers import routing
+from core.metrics import Counter, register_collector
+
+VERSION_KEY = 'cache:version:{}'
+VALUE_KEY = 'cache:{}:{}:{}'
+LOCK_KEY = 'cache:lock:{}'
+
+# Сколько держится блокировка сборки значения и сколько её ждут
+BUILD_LOCK_SECONDS = 30
+BUILD_WAIT_SECONDS = 2.0
+BUILD_POLL_SECONDS = 0.02
+
+LOCAL = 'local'
+
+REQUESTS = Counter(
+    'cache_requests_total',
+    'Versioned cache reads by namespace and result '
+    '(hit, stale, miss, coalesced).',
+    ('namespace', 'result'),
+)
+EVICTIONS = Counter(
+    'cache_evictions_total',
+    'Entries evicted from in-process LRU caches.',
+    ('cache',),
+)
+register_collector(REQUESTS.collect)
+register_collector(EVICTIONS.collect)
+
+_model_namespaces = defaultdict(set)
+
+
+class LRUCache(LocMemCache):
+    """LocMemCache evicting the least recently used entry, one at a time.
+
+    LocMemCache drops a third of all entries when it is full; here only the
+    entry needed for the new one goes, and every eviction is counted.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self.location = name
+
+    def _cull(self):
+        # Последний элемент - давно не читавшийся (см. LocMemCache.get)
+        while self._cache and len(self._cache) >= self._max_entries:
+            key, _ = self._cache.popitem()
+            del self._expire_info[key]
+            EVICTIONS.inc(self.location)
+
+
+def value_cache():
+    if settings.VERSIONED_CACHE_BACKEND == LOCAL:
+        return caches[LOCAL]
+    return caches[DEFAULT_CACHE_ALIAS]
+
+
+# ----- Namespaces and invalidation -----
+
+def register_namespace(namespace, *models):
+    """Bump `namespace` whenever a row of one of `models` changes."""
+    for model in models:
+        _model_namespaces[model].add(namespace)
+        uid = f'core_cache_{model._meta.label_lower}'
+        post_save.connect(model_changed, sender=model, dispatch_uid=uid)
+        post_delete.connect(model_changed, sender=model, dispatch_uid=uid)
+
+
+def model_changed(sender, **kwargs):
+    bump_models(sender)
+
+
+def bump_models(*models):
+    """Invalidate the namespaces of the models (after bulk changes)."""
+    bump(*{
+        namespace
+        for model in models
+        for namespace in _model_namespaces.get(model, ())
+    })
+
+
+def bump(*namespaces):
+    """Invalidate the namespaces once the current transaction commits."""
+    def bump_versions():
+        for namespace in namespaces:
+            key = VERSION_KEY.format(namespace)
+            try:
+                cache.incr(key)
+            except ValueError:
+                _init_version(key)
+
+    if namespaces:
+        transaction.on_commit(bump_versions)
+
+
+def version(namespace):
+    key = VERSION_KEY.format(namespace)
+    value = cache.get(key)
+    if value is None:
+        _init_version(key)
+        value = cache.get(key)
+    return value
+
+
+def _init_version(key):
+    # Начальная версия - время в миллисекундах: если ключ версии вытеснен
+    # из кэша, версия не вернётся к значению, под которым лежат старые данные
+    cache.add(key, int(time.time() * 1000), timeout=None)
+
+
+async def aversion(namespace):
+    key = VERSION_KEY.format(namespace)
+    value = await cache.aget(key)
+    if value is None:
+        await cache.aadd(key, int(time.time() * 1000), timeout=None)
+        value = await cache.aget(key)
+    return value
+
+
+def cache_key(namespace, *parts, version_number=None):
+    if version_number is None:
+        version_number = version(namespace)
+    suffix = ':'.join(str(part) for part in parts)
+    return VALUE_KEY.format(namespace, version_number, suffix)
+
+
+def query_key(request):
+    """Short key part for the query string of a request."""
+    params = sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        for value in values
+    )
+    if not params:
+        return '-'
+    return hashlib.md5(
+        repr(params).encode(), usedforsecurity=False
+    ).hexdigest()
+
+
+# ----- Read-through -----
+
+def cached(namespace, *parts, build, timeout=None, stale=None):
+    """Value for the key built from `parts`, built by `build` on a miss."""
+    store = value_cache()
+    key = cache_key(namespace, *parts)
+    lock = LOCK_KEY.format(key)
+
+    entry = store.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until:
+            REQUESTS.inc(namespace, 'hit')
+            return value
+        if not store.add(lock, 1, BUILD_LOCK_SECONDS):
+            # Значение уже пересобирается
+            REQUESTS.inc(namespace, 'stale')
+            return value
+    elif not store.add(lock, 1, BUILD_LOCK_SECONDS):
+        entry = _wait(store, key)
+        if entry is not None:
+            REQUESTS.inc(namespace, 'coalesced')
+            return entry[0]
+        # Сборка не закончилась вовремя: собираем сами
+        lock = None
+
+    REQUESTS.inc(namespace, 'miss')
+    try:
+        with routing(use_replica=False):
+            value = build()
+        store.set(key, *_entry(value, timeout, stale))
+    finally:
+        if lock is not None:
+            store.delete(lock)
+    return value
+
+
+async def acached(namespace, *parts, build, timeout=None, stale=None):
+    """`cached` for async views; `build` is a coroutine function."""
+    store = value_cache()
+    key = cache_key(
+        namespace, *parts, version_number=await aversion(namespace)
+    )
+    lock = LOCK_KEY.format(key)
+
+    entry = await store.aget(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until:
+            REQUESTS.inc(namespace, 'hit')
+            return value
+        if not await store.aadd(lock, 1, BUILD_LOCK_SECONDS):
+            REQUESTS.inc(namespace, 'stale')
+            return value
+    elif not await store.aadd(lock, 1, BUILD_LOCK_SECONDS):
+        entry = await _await(store, key)
+        if entry is not None:
+            REQUESTS.inc(namespace, 'coalesced')
+            return entry[0]
+        lock = None
+
+    REQUESTS.inc(namespace, 'miss')
+    try:
+        with routing(use_replica=False):
+            value = await build()
+        await store.aset(key, *_entry(value, timeout, stale))
+    finally:
+        if lock is not None:
+            await store.adelete(lock)
+    return value
+
+
+class CachedListMixin:
+    """ViewSet serving `list` from the `cache_namespace` namespace.
+
+    The key is built from the query string only, so the mixin is for lists
+    that are the same for every user allowed to see them; permissions are
+    still checked on every request.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        parent = super()
+        return self.cached_response(
+            'list', lambda: parent.list(request, *args, **kwargs)
+        )
+
+    def cached_response(self, name, respond, *parts):
+        """Response with the cached data of `respond()`."""
+        data = cached(
+            self.cache_namespace, name, *parts, query_key(self.request),
+            build=lambda: respond().data,
+        )
+        return Response(data)
+
+
+def _entry(value, timeout, stale):
+    """Stored entry and its lifetime in the cache."""
+    if timeout is None:
+        timeout = settings.VERSIONED_CACHE_TIMEOUT
+    if stale is None:
+        stale = settings.VERSIONED_CACHE_STALE_SECONDS
+    return (value, time.time() + timeout), timeout + stale
+
+
+def _wait(store, key):
+    deadline = time.monotonic() + BUILD_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(BUILD_POLL_SECONDS)
+        entry = store.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+async def _await(store, key):
+    deadline = time.monotonic() + BUILD_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(BUILD_POLL_SECONDS)
+        entry = await store.aget(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+@register_collector
+def redis_evictions():
+    """Evictions reported by a Redis value cache."""
+    store = value_cache()
+    if not isinstance(store, RedisCache):
+        return []
+    try:
+        info = store._cache.get_client().info('stats')
+    except Exception:
+        # Недоступный Redis не должен ломать /metrics
+        return []
+    return [
+        '# HELP cache_redis_evicted_keys Keys evicted by Redis.',
+        '# TYPE cache_redis_evicted_keys counter',
+        f"cache_redis_evicted_keys {info.get('evicted_keys', 0)}",
+    ]
@@ -0,0 +1,143 @@
+"""Routing of reads to database replicas.
+
+Replicas are listed in `settings.DATABASE_REPLICAS` (built from
+`DATABASE_REPLICA_URLS`). Reads go to a random replica only inside a request
+that `ReplicaRoutingMiddleware` marked as a read:
+
+* a GET or HEAD request to a `list`/`retrieve` action of a ViewSet or to a
+  route from `settings.REPLICA_ROUTES` (tracking, public reviews);
+* the client has not written anything during the last
+  `settings.REPLICA_STICKY_SECONDS` seconds, so it reads its own writes.
+
+Everything else uses the primary: writes, reads inside `transaction.atomic`
+and reads after a write within the same request. Code outside requests
+(commands, the outbox) always works with the primary unless it enters
+`routing(use_replica=True)` itself.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.idempotency import request_scope
+
+READ_METHODS = ('GET', 'HEAD')
+READ_ACTIONS = ('list', 'retrieve')
+
+STICKY_KEY = 'db:sticky:{}'
+
+
+class RoutingState:
+    def __init__(self, use_replica=False):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+@contextmanager
+def routing(use_replica=False):
+    """Route reads of the enclosed code; yields the mutable state."""
+    state = RoutingState(use_replica)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state is None
+            or not state.use_replica
+            or state.wrote
+            or not settings.DATABASE_REPLICAS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной БД
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing() as state:
+            request._db_routing = state
+            response = self.get_response(request)
+        if state.wrote:
+            mark_sticky(request)
+        return response
+
+    async def __acall__(self, request):
+        # Асинхронный ORM выполняет запросы в потоке с копией контекста,
+        # поэтому состояние маршрутизации видно и там
+        with routing() as state:
+            request._db_routing = state
+            response = await self.get_response(request)
+        if state.wrote:
+            await sync_to_async(mark_sticky)(request)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._db_routing.use_replica = (
+            request.method in READ_METHODS
+            and bool(settings.DATABASE_REPLICAS)
+            and is_read_view(request, view_func)
+            and not is_sticky(request)
+        )
+
+
+def is_read_view(request, view_func):
+    # HEAD обслуживается тем же действием, что и GET
+    actions = getattr(view_func, 'actions', None) or {}
+    if actions.get('get') in READ_ACTIONS:
+        return True
+    return request.resolver_match.url_name in settings.REPLICA_ROUTES
+
+
+def mark_sticky(request):
+    scope = request_scope(request)
+    if scope is not None and settings.REPLICA_STICKY_SECONDS:
+        cache.set(
+            STICKY_KEY.format(scope), True, settings.REPLICA_STICKY_SECONDS
+        )
+
+
+def is_sticky(request):
+    scope = request_scope(request)
+    return scope is not None and cache.get(STICKY_KEY.format(scope), False)
@@ -0,0 +1,160 @@
+"""Fast read path for large list responses.
+
+A DRF `ModelSerializer` creates a model instance per row and walks its
+fields through `get_attribute`/`to_representation`; for lists of thousands
+of rows this dominates CPU time. `FastListMixin` reads the same fields with
+`values_list()`, converts only the values that need it (decimals and dates
+with the serializer's own field objects) and renders the result with
+orjson. The JSON is byte-for-byte the one the serializer would produce.
+
+A viewset opts in by adding the mixin; fields that are not plain model
+fields or lookups (nested serializers, methods, properties) are listed in
+`fast_list_computed` and filled by `fast_list_complete`. The path is used
+only when `settings.FAST_LIST_RESPONSES` is on (off by default).
+"""
+import decimal
+from collections import namedtuple
+
+import orjson
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+Column = namedtuple('Column', ['name', 'lookup', 'convert'])
+
+
+def _default(value):
+    # Как rest_framework.utils.encoders.JSONEncoder для Decimal вне полей
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer output for plain data (dicts, lists, str, numbers)."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=_default)
+        # JSONRenderer экранирует разделители строк, недопустимые в JS
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028')
+            ret = ret.replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+def serializer_columns(serializer, computed=()):
+    """Columns for the readable fields of a ModelSerializer instance.
+
+    Fields named in `computed` get no column; any other field must map to
+    a model field or a lookup through relations.
+    """
+    model = serializer.Meta.model
+    columns = []
+    for name, field in serializer.fields.items():
+        if field.write_only or name in computed:
+            continue
+        lookup = '__'.join(field.source_attrs)
+        if (
+            isinstance(field, serializers.BaseSerializer)
+            or not is_model_lookup(model, field.source_attrs)
+        ):
+            raise ImproperlyConfigured(
+                f'{type(serializer).__name__}.{name} is not a model field, '
+                f'add it to fast_list_computed'
+            )
+        if isinstance(field, serializers.RelatedField):
+            # values_list() уже возвращает первичный ключ
+            convert = None
+        else:
+            convert = field.to_representation
+        columns.append(Column(name, lookup, convert))
+    return columns
+
+
+def is_model_lookup(model, attrs):
+    """True when `attrs` is a path of model fields and relations."""
+    if not attrs:
+        return False
+    for attr in attrs:
+        if model is None:
+            return False
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return False
+        model = field.related_model
+    return True
+
+
+def plain_rows(queryset, serializer, computed=(), extra=()):
+    """Serializer output built from `values_list()`.
+
+    Returns `(rows, extra_values)`: rows have every readable field of the
+    serializer in its order, computed ones set to None; `extra_values` are
+    tuples with the values of the `extra` lookups for each row.
+    """
+    columns = serializer_columns(serializer, computed)
+    names = [
+        name for name, field in serializer.fields.items()
+        if not field.write_only
+    ]
+    lookups = [column.lookup for column in columns]
+    rows = []
+    extra_values = []
+    # prefetch_related с values_list() не работает и здесь не нужен
+    values = queryset.prefetch_related(None).values_list(*lookups, *extra)
+    for record in values:
+        row = dict.fromkeys(names)
+        for column, value in zip(columns, record):
+            if value is not None and column.convert is not None:
+                value = column.convert(value)
+            row[column.name] = value
+        rows.append(row)
+        extra_values.append(record[len(columns):])
+    return rows, extra_values
+
+
+class FastListMixin:
+    """Opt-in fast JSON responses for `list` (see module docstring)."""
+    # Поля сериализатора, которые заполняет fast_list_complete
+    fast_list_computed = ()
+    # Дополнительные значения для fast_list_complete
+    fast_list_extra = ()
+
+    def list(self, request, *args, **kwargs):
+        # Queryset строится один раз: обычный list() собирает свой
+        if not self.fast_list_applies():
+            return super().list(request, *args, **kwargs)
+        return self.fast_list_response(
+            self.filter_queryset(self.get_queryset())
+        )
+
+    def fast_list_response(self, queryset):
+        """Fast response for the queryset or None when it doesn't apply."""
+        if not self.fast_list_applies():
+            return None
+        rows, extra_values = plain_rows(
+            queryset,
+            self.get_serializer(),
+            computed=self.fast_list_computed,
+            extra=self.fast_list_extra,
+        )
+        self.fast_list_complete(queryset, rows, extra_values)
+        self.request.accepted_renderer = ORJSONRenderer()
+        return Response(rows)
+
+    def fast_list_applies(self):
+        return (
+            settings.FAST_LIST_RESPONSES
+            and self.paginator is None
+            and type(self.request.accepted_renderer) is JSONRenderer
+        )
+
+    def fast_list_complete(self, queryset, rows, extra_values):
+        """Fill the `fast_list_computed` fields of the queryset rows."""
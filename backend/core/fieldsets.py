@@ -0,0 +1,193 @@
+"""Sparse fieldsets: `?fields=` and `?expand=` on read endpoints.
+
+`?fields=id,status` returns only the listed fields. `?expand=items` keeps
+only the listed fields from the serializer's `Meta.expandable_fields`
+(nested objects and values computed from related rows); `?expand=` with
+an empty value drops all of them. Without the parameters responses are
+unchanged. Both apply to the top-level serializer of GET and HEAD requests;
+unknown names are a 400 error.
+
+`SparseFieldsetMixin` prunes the serializer. `SparseFieldsetViewMixin`
+prunes the queryset of the viewset as well: joins (`select_related`),
+prefetches and columns (`only()`) that none of the remaining fields needs
+are not loaded. Fields that are not model fields or lookups (properties,
+methods) declare the lookups they read in `Meta.field_dependencies`;
+without that the queryset is left as it is.
+"""
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from core.fastpath import is_model_lookup
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def requested_fieldset(request):
+    """`(fields, expand)` sets from the query string, None when absent."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None, None
+    params = getattr(request, 'query_params', request.GET)
+    return _names(params, FIELDS_PARAM), _names(params, EXPAND_PARAM)
+
+
+def _names(params, param):
+    if param not in params:
+        return None
+    return {name.strip() for name in params[param].split(',') if name.strip()}
+
+
+def fieldset_key(request):
+    """Part of a cache key for responses that depend on the fieldset."""
+    return ':'.join(
+        '*' if names is None else ','.join(sorted(names))
+        for names in requested_fieldset(request)
+    )
+
+
+class SparseFieldsetMixin:
+    """Serializer that honours `?fields=` and `?expand=`."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_root():
+            return fields
+        wanted = self.wanted_fields(fields)
+        if wanted is None:
+            return fields
+        return {
+            name: field for name, field in fields.items() if name in wanted
+        }
+
+    def is_root(self):
+        # Вложенные сериализаторы отдаются целиком
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def wanted_fields(self, fields):
+        """Names of the fields to keep, or None to keep all of them."""
+        requested, expand = requested_fieldset(self.context.get('request'))
+        if requested is None and expand is None:
+            return None
+
+        readable = {
+            name for name, field in fields.items() if not field.write_only
+        }
+        expandable = set(getattr(self.Meta, 'expandable_fields', ()))
+        errors = {}
+        if requested is not None and requested - readable:
+            errors[FIELDS_PARAM] = [
+                f"Неизвестные поля: {', '.join(sorted(requested - readable))}"
+            ]
+        if expand is not None and expand - expandable:
+            errors[EXPAND_PARAM] = [
+                f"Эти поля нельзя раскрыть: "
+                f"{', '.join(sorted(expand - expandable))}"
+            ]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        wanted = readable if requested is None else requested
+        if expand is not None:
+            wanted = wanted - (expandable - expand)
+        return wanted
+
+    def field_dependencies(self):
+        """Model lookups the readable fields read, None when unknown."""
+        declared = getattr(self.Meta, 'field_dependencies', {})
+        model = self.Meta.model
+        lookups = set()
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in declared:
+                lookups.update(declared[name])
+            elif is_model_lookup(model, field.source_attrs):
+                lookups.add(LOOKUP_SEP.join(field.source_attrs))
+            else:
+                return None
+        return lookups
+
+
+class SparseFieldsetViewMixin:
+    """ViewSet that loads only what the requested fields need."""
+    # Действия, queryset которых сериализуется get_serializer()
+    fieldset_actions = ('list', 'retrieve')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if (
+            self.action not in self.fieldset_actions
+            or requested_fieldset(self.request) == (None, None)
+        ):
+            return queryset
+        lookups = self.get_serializer().field_dependencies()
+        if lookups is None:
+            return queryset
+        return prune_queryset(queryset, lookups)
+
+
+def prune_queryset(queryset, lookups):
+    """Drop joins, prefetches and columns that none of `lookups` reads."""
+    paths = [tuple(lookup.split(LOOKUP_SEP)) for lookup in lookups]
+
+    def traversed(path):
+        # Связь нужна, если через неё читается хотя бы одно поле
+        return any(p[:len(path)] == path and len(p) > len(path)
+                   for p in paths)
+
+    def reached(path):
+        return any(p[:len(path)] == path for p in paths)
+
+    select_related = queryset.query.select_related
+    if select_related is True:
+        # select_related() без аргументов: набор связей заранее неизвестен
+        return queryset
+    joined = set()
+    if select_related:
+        joined = {
+            path for path in _select_paths(select_related) if traversed(path)
+        }
+        queryset = queryset.select_related(None)
+        if joined:
+            queryset = queryset.select_related(
+                *(LOOKUP_SEP.join(path) for path in joined)
+            )
+
+    prefetches = queryset._prefetch_related_lookups
+    if prefetches:
+        kept = [
+            lookup for lookup in prefetches
+            if reached(tuple(
+                getattr(lookup, 'prefetch_to', lookup).split(LOOKUP_SEP)
+            ))
+        ]
+        queryset = queryset.prefetch_related(None).prefetch_related(*kept)
+
+    columns = set()
+    for path in paths:
+        # Поля присоединённых таблиц тоже ограничиваются, остальные
+        # связи читаются как внешний ключ
+        depth = 1
+        while depth < len(path) and path[:depth] in joined:
+            depth += 1
+        if _is_column(queryset.model, path[:depth]):
+            columns.add(LOOKUP_SEP.join(path[:depth]))
+    return queryset.only(queryset.model._meta.pk.name, *columns)
+
+
+def _is_column(model, path):
+    for name in path:
+        field = model._meta.get_field(name)
+        model = field.related_model
+    return field.concrete and not field.many_to_many
+
+
+def _select_paths(select_related, prefix=()):
+    for name, nested in select_related.items():
+        path = prefix + (name,)
+        yield path
+        yield from _select_paths(nested, path)
@@ -0,0 +1,295 @@
+"""`Idempotency-Key` support for unsafe requests.
+
+A client sends the same `Idempotency-Key` header when it retries a POST,
+PUT, PATCH or DELETE. The first request is executed and its response is
+stored in `IdempotencyKey` for `settings.IDEMPOTENCY_KEY_TTL` seconds;
+retries get the stored response back with `Idempotent-Replayed: true`.
+
+* Keys are scoped by the authenticated user (authenticated the way the
+  API views do it), so different clients may use the same key and a retry
+  after a token refresh still finds it. Requests without a user are
+  scoped by a hash of their credentials (service key or session);
+  requests without credentials are executed as usual.
+* Reusing a key with a different method, path or body returns 422.
+* A duplicate arriving while the first request is still running waits up
+  to `settings.IDEMPOTENCY_WAIT_SECONDS` for its result, then gets 409.
+* 5xx responses are not stored: the client may retry with the same key.
+
+The lookup is a single query on the unique (scope, key) index.
+"""
+import hashlib
+import time
+from datetime import timedelta
+
+from asgiref.sync import (
+    async_to_sync,
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from core.models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+UNSAFE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+MAX_KEY_LENGTH = 255
+
+# Заголовки ответа, которые сохраняются для повтора
+REPLAYED_HEADERS = ('Content-Type', 'Location', 'Content-Language')
+
+POLL_INTERVAL = 0.1
+
+
+class IdempotencyMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.META.get(HEADER) is None or (
+            request.method not in UNSAFE_METHODS
+        ):
+            return self.get_response(request)
+        return self.handle(request, self.get_response)
+
+    async def __acall__(self, request):
+        if request.META.get(HEADER) is None or (
+            request.method not in UNSAFE_METHODS
+        ):
+            return await self.get_response(request)
+        # Работа с ключом синхронная: выполняем её в потоке целиком
+        return await sync_to_async(self.handle)(
+            request, async_to_sync(self.get_response)
+        )
+
+    def handle(self, request, get_response):
+        key = request.META.get(HEADER)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return JsonResponse(
+                {'detail': (
+                    f'Idempotency-Key должен содержать от 1 до '
+                    f'{MAX_KEY_LENGTH} символов'
+                )},
+                status=400,
+            )
+
+        scope = request_scope(request)
+        if scope is None:
+            return get_response(request)
+
+        record, created = acquire(
+            scope, key, request, request_fingerprint(request)
+        )
+        if not created:
+            return duplicate_response(record, request)
+
+        try:
+            response = get_response(request)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500 or response.streaming:
+            record.delete()
+        else:
+            store_response(record, response)
+        return response
+
+
+def request_scope(request):
+    """Scope of the request's keys: its user or its credentials, if any."""
+    user = request_user(request)
+    if user is not None:
+        credentials = f'user:{user.pk}'
+    else:
+        credentials = request.META.get('HTTP_AUTHORIZATION')
+        if not credentials and hasattr(request, 'session'):
+            credentials = request.session.session_key
+    if not credentials:
+        return None
+    return hashlib.sha256(credentials.encode()).hexdigest()
+
+
+def request_user(request):
+    """Authenticated user of the request, None for anonymous requests.
+
+    The user is resolved once per request and kept on the `HttpRequest`.
+    A user authenticated by a token is passed on to the API view, so the
+    token is not checked again there.
+    """
+    if hasattr(request, '_resolved_user'):
+        return request._resolved_user
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        # Токены проверяются так же, как в API view
+        drf_request = Request(request, authenticators=[
+            authenticator()
+            for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ])
+        try:
+            user = drf_request.user
+        except APIException:
+            # Неверный токен: view сам вернёт 401
+            user = None
+        else:
+            if user is not None and user.is_authenticated:
+                # Request во view берёт пользователя и токен отсюда
+                request._force_auth_user = user
+                request._force_auth_token = drf_request.auth
+    if user is None or not user.is_authenticated:
+        user = None
+    request._resolved_user = user
+    return user
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(b'\0')
+    digest.update(request.get_full_path().encode())
+    digest.update(b'\0')
+    try:
+        digest.update(request.body)
+    except RequestDataTooBig:
+        # Большие загрузки файлов не читаются в память целиком
+        digest.update(request.META.get('CONTENT_LENGTH', '').encode())
+    return digest.hexdigest()
+
+
+def acquire(scope, key, request, fingerprint):
+    """Create the key record or return the existing one.
+
+    Returns `(record, created)`. Expired records and records left in
+    progress by a crashed worker are taken over.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                scope=scope,
+                key=key,
+                fingerprint=fingerprint,
+                method=request.method,
+                path=request.path[:2048],
+                locked_until=now + timedelta(
+                    seconds=settings.IDEMPOTENCY_LOCK_SECONDS
+                ),
+                expires_at=now + timedelta(
+                    seconds=settings.IDEMPOTENCY_KEY_TTL
+                ),
+            )
+        return record, True
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+    if record is None:
+        # Запись только что удалили (ошибка 5xx или очистка), пробуем снова
+        return acquire(scope, key, request, fingerprint)
+
+    stale = record.expires_at <= now or (
+        record.status == IdempotencyKey.IN_PROGRESS
+        and record.locked_until <= now
+    )
+    if stale:
+        # Условие по id и старому locked_until: запись забирает один запрос
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, locked_until=record.locked_until
+        ).update(
+            fingerprint=fingerprint,
+            method=request.method,
+            path=request.path[:2048],
+            status=IdempotencyKey.IN_PROGRESS,
+            locked_until=now + timedelta(
+                seconds=settings.IDEMPOTENCY_LOCK_SECONDS
+            ),
+            response_status=None,
+            response_headers={},
+            response_body=b'',
+            expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+        )
+        if taken:
+            record.refresh_from_db()
+            return record, True
+        record.refresh_from_db()
+    return record, False
+
+
+def duplicate_response(record, request):
+    if record.fingerprint != request_fingerprint(request):
+        return JsonResponse(
+            {'detail': (
+                'Idempotency-Key уже использован для другого запроса'
+            )},
+            status=422,
+        )
+
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while record.status == IdempotencyKey.IN_PROGRESS:
+        if time.monotonic() >= deadline:
+            response = JsonResponse(
+                {'detail': 'Запрос с этим Idempotency-Key ещё выполняется'},
+                status=409,
+            )
+            response['Retry-After'] = '1'
+            return response
+        time.sleep(POLL_INTERVAL)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            # Первый запрос завершился ошибкой: клиенту стоит повторить
+            response = JsonResponse(
+                {'detail': 'Запрос с этим Idempotency-Key не выполнен, '
+                           'повторите его'},
+                status=409,
+            )
+            response['Retry-After'] = '0'
+            return response
+
+    return replay_response(record)
+
+
+def store_response(record, response):
+    IdempotencyKey.objects.filter(pk=record.pk).update(
+        status=IdempotencyKey.COMPLETED,
+        response_status=response.status_code,
+        response_headers={
+            name: response[name]
+            for name in REPLAYED_HEADERS
+            if response.has_header(name)
+        },
+        response_body=response.content,
+    )
+
+
+def replay_response(record):
+    response = HttpResponse(
+        bytes(record.response_body),
+        status=record.response_status,
+    )
+    for name, value in record.response_headers.items():
+        response[name] = value
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def purge_expired():
+    """Delete expired keys. Returns the number of deleted keys."""
+    deleted, _ = IdempotencyKey.objects.filter(
+        expires_at__lte=timezone.now()
+    ).delete()
+    return deleted
@@ -0,0 +1,265 @@
+"""Background jobs stored in the project database.
+
+`enqueue()` adds a `Job`: the dotted path of a function with JSON
+arguments, a queue, a priority and the time to run it. Inside a transaction
+the job is committed together with the change it belongs to. Workers (the
+`run_jobs` command) run `work()`:
+
+* jobs are claimed with `core.queues.claim_batch` (`SKIP LOCKED` on
+  PostgreSQL, conditional UPDATEs on SQLite), higher priority first, then
+  by time. A claimed job is `running` under a lease of
+  `settings.JOB_LEASE_SECONDS`: if its worker dies, the job is claimed
+  again when the lease expires;
+* a `JobQueue` row limits how many jobs of the queue run at once across
+  all workers, and can pause the queue. Claims of one queue go one at a
+  time behind an UPDATE of that row, so the limit holds on both databases;
+* a failed job is retried with backoff until `max_attempts`, then it is
+  `failed`. Delivery is at-least-once, so jobs must be idempotent;
+* recurring jobs come from `settings.JOB_SCHEDULE`. A job is added for the
+  current period of each entry under the key `schedule:<name>:<start>`, so
+  workers adding it at the same time create it once.
+"""
+import logging
+import time
+import traceback
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Job, JobQueue
+from core.queues import backoff_delay, claim_batch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = 'default'
+
+# Ключи периодических задач, уже добавленных этим процессом
+_scheduled_keys = set()
+
+
+def task_path(task):
+    """Dotted path of a task given as a function or a path."""
+    if isinstance(task, str):
+        return task
+    return f'{task.__module__}.{task.__qualname__}'
+
+
+def enqueue(task, args=(), kwargs=None, *, queue=DEFAULT_QUEUE, priority=0,
+            run_at=None, key=None, max_attempts=None):
+    """Add a job running `task(*args, **kwargs)`. Returns the `Job`.
+
+    `task` is a module-level function or its dotted path; arguments must be
+    JSON serializable. With `key` the job is added only if there is no job
+    with that key yet, and the existing one is returned otherwise.
+    """
+    path = task_path(task)
+    # Ошибка в пути видна сразу, а не в воркере
+    import_string(path)
+    fields = {
+        'task': path,
+        'args': list(args),
+        'kwargs': kwargs or {},
+        'queue': queue,
+        'priority': priority,
+        'available_at': run_at or timezone.now(),
+        'max_attempts': max_attempts or settings.JOB_MAX_ATTEMPTS,
+    }
+    if key is None:
+        return Job.objects.create(**fields)
+    job, _ = Job.objects.get_or_create(key=key, defaults=fields)
+    return job
+
+
+def pending_jobs(queue):
+    """Jobs of the queue due to run, and running jobs with expired lease."""
+    return Job.objects.filter(
+        queue=queue,
+        status__in=[Job.PENDING, Job.RUNNING],
+        available_at__lte=timezone.now(),
+    ).order_by('-priority', 'available_at', 'id')
+
+
+def claim_jobs(queue, limit):
+    """Claim up to `limit` jobs of the queue within its limits."""
+    if not pending_jobs(queue).exists():
+        return []
+    JobQueue.objects.get_or_create(name=queue)
+
+    now = timezone.now()
+    with transaction.atomic():
+        # UPDATE блокирует строку очереди (в SQLite - всю БД) до конца
+        # транзакции: подсчёт выполняемых и забор не пересекаются
+        JobQueue.objects.filter(name=queue).update(claimed_at=now)
+        job_queue = JobQueue.objects.get(name=queue)
+        if job_queue.paused:
+            return []
+        if job_queue.concurrency is not None:
+            running = Job.objects.filter(
+                queue=queue, status=Job.RUNNING, available_at__gt=now
+            ).count()
+            limit = min(limit, job_queue.concurrency - running)
+            if limit <= 0:
+                return []
+
+        jobs = claim_batch(
+            pending_jobs(queue),
+            limit=limit,
+            lease_seconds=settings.JOB_LEASE_SECONDS,
+        )
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            started_at=now,
+        )
+
+    for job in jobs:
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.started_at = now
+    return jobs
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome."""
+    if job.attempts > job.max_attempts:
+        # Последняя попытка не завершилась: воркер остановлен или упал
+        _finish(job, Job.FAILED, 'Lease expired on the last attempt')
+        logger.error("Job %s (%s) lost after %s attempts",
+                     job.pk, job.task, job.max_attempts)
+        return False
+
+    try:
+        import_string(job.task)(*job.args, **job.kwargs)
+    except Exception as exc:  # noqa: BLE001 - any job error is retried
+        _schedule_retry(job, exc)
+        return False
+    _finish(job, Job.SUCCEEDED)
+    return True
+
+
+def run_batch(queues, batch_size=None):
+    """Claim and run one batch of each queue in turn.
+
+    Returns the number of claimed jobs, zero means the queues are empty.
+    """
+    batch_size = batch_size or settings.JOB_BATCH_SIZE
+    claimed = 0
+    for queue in queues:
+        jobs = claim_jobs(queue, batch_size)
+        for job in jobs:
+            run_job(job)
+        claimed += len(jobs)
+    return claimed
+
+
+def work(queues, batch_size=None, sleep=1.0, once=False, stop=None):
+    """Worker loop. Returns the number of jobs claimed.
+
+    Runs until the queues are empty (`once`), `stop` (a threading.Event)
+    is set or the process is interrupted.
+    """
+    total = 0
+    try:
+        while stop is None or not stop.is_set():
+            schedule_recurring()
+            claimed = run_batch(queues, batch_size)
+            total += claimed
+            if claimed:
+                continue
+            if once:
+                break
+            if stop is None:
+                time.sleep(sleep)
+            else:
+                stop.wait(sleep)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Соединения потока не переходят другим потокам
+        connections.close_all()
+    return total
+
+
+# ----- Recurring jobs -----
+
+def scheduled_jobs(now=None):
+    """Jobs of the current period of every `JOB_SCHEDULE` entry."""
+    now = now or timezone.now()
+    jobs = []
+    for name, entry in settings.JOB_SCHEDULE.items():
+        every = int(entry['every'])
+        start = int(now.timestamp()) // every * every
+        jobs.append(Job(
+            task=entry['task'],
+            args=list(entry.get('args', [])),
+            kwargs=entry.get('kwargs', {}),
+            queue=entry.get('queue', DEFAULT_QUEUE),
+            priority=entry.get('priority', 0),
+            max_attempts=entry.get('max_attempts', settings.JOB_MAX_ATTEMPTS),
+            key=f'schedule:{name}:{start}',
+            available_at=datetime.fromtimestamp(start, tz=dt_timezone.utc),
+        ))
+    return jobs
+
+
+def schedule_recurring(now=None):
+    """Add the recurring jobs of the current periods. Returns their number."""
+    jobs = [
+        job for job in scheduled_jobs(now) if job.key not in _scheduled_keys
+    ]
+    if jobs:
+        Job.objects.bulk_create(jobs, ignore_conflicts=True)
+        _scheduled_keys.update(job.key for job in jobs)
+    return len(jobs)
+
+
+def purge_finished(days=None):
+    """Delete jobs finished more than `days` ago. Returns their number.
+
+    Jobs of the current periods of `JOB_SCHEDULE` are kept: deleting them
+    would make workers add and run them again.
+    """
+    days = settings.JOB_RETENTION_DAYS if days is None else days
+    deleted, _ = Job.objects.filter(
+        status__in=Job.FINISHED_STATUSES,
+        finished_at__lt=timezone.now() - timedelta(days=days),
+    ).exclude(
+        key__in=[job.key for job in scheduled_jobs()]
+    ).delete()
+    return deleted
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.finished_at = timezone.now()
+    job.last_error = error
+    job.save(update_fields=['status', 'finished_at', 'last_error'])
+
+
+def _schedule_retry(job, exc):
+    error = ''.join(
+        traceback.format_exception_only(type(exc), exc)
+    ).strip()
+
+    if job.attempts >= job.max_attempts:
+        _finish(job, Job.FAILED, error)
+        logger.error(
+            "Job %s (%s) failed after %s attempts: %s",
+            job.pk, job.task, job.attempts, error
+        )
+        return
+
+    job.status = Job.PENDING
+    job.last_error = error
+    job.available_at = timezone.now() + timedelta(
+        seconds=backoff_delay(job.attempts, base=10)
+    )
+    logger.warning(
+        "Job %s (%s) failed (attempt %s), retrying: %s",
+        job.pk, job.task, job.attempts, error
+    )
+    job.save(update_fields=['status', 'last_error', 'available_at'])
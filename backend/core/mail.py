@@ -0,0 +1,165 @@
+"""Queued email delivery.
+
+`QueuedEmailBackend` is used as `EMAIL_BACKEND`: it only stores messages
+in the `QueuedEmail` table, so request threads never talk to the mail
+server. The `send_queued_mail` command delivers them in batches through
+`settings.QUEUED_EMAIL_BACKEND` (SMTP in production, console or locmem
+locally), reusing one connection per batch and retrying failures.
+
+The queue stores no files: messages with attachments are sent right away
+through `settings.QUEUED_EMAIL_BACKEND`, as before the queue.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.utils import timezone
+
+from core.models import QueuedEmail
+from core.queues import backoff_delay, claim_batch
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Email backend that puts messages into the database queue."""
+
+    def send_messages(self, email_messages):
+        direct = [message for message in email_messages if message.attachments]
+        rows = [
+            to_queued_email(message)
+            for message in email_messages if not message.attachments
+        ]
+        QueuedEmail.objects.bulk_create(rows)
+        sent = len(rows)
+        if direct:
+            connection = get_connection(
+                settings.QUEUED_EMAIL_BACKEND,
+                fail_silently=self.fail_silently,
+            )
+            sent += connection.send_messages(direct) or 0
+        return sent
+
+
+def to_queued_email(message):
+    if message.attachments:
+        raise ValueError('Attachments are not supported by the mail queue')
+
+    html_body = ''
+    for content, mimetype in getattr(message, 'alternatives', []):
+        if mimetype == 'text/html':
+            html_body = content
+
+    body = message.body
+    if message.content_subtype == 'html' and not html_body:
+        html_body, body = body, ''
+
+    return QueuedEmail(
+        subject=message.subject,
+        body=body,
+        html_body=html_body,
+        from_email=message.from_email or '',
+        to=list(message.to),
+        cc=list(message.cc),
+        bcc=list(message.bcc),
+        reply_to=list(message.reply_to),
+        headers=dict(message.extra_headers),
+    )
+
+
+def to_email_message(queued, connection=None):
+    message = EmailMultiAlternatives(
+        subject=queued.subject,
+        body=queued.body,
+        from_email=queued.from_email or None,
+        to=queued.to,
+        cc=queued.cc,
+        bcc=queued.bcc,
+        reply_to=queued.reply_to,
+        headers=queued.headers,
+        connection=connection,
+    )
+    if queued.html_body and queued.body:
+        message.attach_alternative(queued.html_body, 'text/html')
+    elif queued.html_body:
+        message.body = queued.html_body
+        message.content_subtype = 'html'
+    return message
+
+
+def pending_emails():
+    return QueuedEmail.objects.filter(
+        status=QueuedEmail.PENDING,
+        available_at__lte=timezone.now(),
+    ).order_by('id')
+
+
+def send_batch(batch_size=None):
+    """Send one batch of queued emails over a single connection.
+
+    Returns the number of claimed emails, zero means the queue is empty.
+    """
+    batch_size = batch_size or settings.MAIL_QUEUE_BATCH_SIZE
+    emails = claim_batch(
+        pending_emails(),
+        limit=batch_size,
+        lease_seconds=settings.MAIL_QUEUE_LEASE_SECONDS,
+    )
+    if not emails:
+        return 0
+
+    sent = []
+    connection = get_connection(settings.QUEUED_EMAIL_BACKEND)
+    try:
+        connection.open()
+    except Exception as exc:  # noqa: BLE001 - the whole batch is retried
+        for queued in emails:
+            _schedule_retry(queued, exc)
+        return len(emails)
+
+    try:
+        for queued in emails:
+            try:
+                connection.send_messages([to_email_message(queued)])
+            except Exception as exc:  # noqa: BLE001
+                _schedule_retry(queued, exc)
+            else:
+                sent.append(queued.pk)
+    finally:
+        connection.close()
+
+    if sent:
+        QueuedEmail.objects.filter(pk__in=sent).update(
+            status=QueuedEmail.SENT,
+            sent_at=timezone.now(),
+        )
+    return len(emails)
+
+
+def _schedule_retry(queued, exc):
+    queued.attempts += 1
+    queued.last_error = ''.join(
+        traceback.format_exception_only(type(exc), exc)
+    ).strip()
+
+    if queued.attempts >= settings.MAIL_QUEUE_MAX_ATTEMPTS:
+        queued.status = QueuedEmail.FAILED
+        logger.error(
+            "Email %s to %s failed after %s attempts: %s",
+            queued.pk, queued.to, queued.attempts, queued.last_error
+        )
+    else:
+        queued.available_at = timezone.now() + timedelta(
+            seconds=backoff_delay(queued.attempts, base=30)
+        )
+        logger.warning(
+            "Email %s to %s failed (attempt %s), retrying: %s",
+            queued.pk, queued.to, queued.attempts, queued.last_error
+        )
+
+    queued.save(update_fields=[
+        'attempts', 'last_error', 'status', 'available_at'
+    ])
@@ -0,0 +1,169 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import (
+    DEFAULT_TOLERANCE,
+    FAST_LIST_SCENARIOS,
+    HOT_SCENARIOS,
+    bench_context,
+    compare,
+    default_scenarios,
+    run,
+    run_concurrency,
+    run_serialization,
+)
+
+
+class Command(BaseCommand):
+    help = 'Measure API endpoint latency and query counts on benchmark data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            help='Run only the scenarios with these names',
+        )
+        parser.add_argument(
+            '--include-heavy',
+            action='store_true',
+            help='Also run full listings and exports',
+        )
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument(
+            '--baseline',
+            default='benchmarks/baseline.json',
+            help='Results to compare with',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Store the results as the new baseline',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=DEFAULT_TOLERANCE,
+            help='Allowed relative growth of p50 and p90 latency',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Compare throughput of sync and async views of the hot '
+                 'endpoints with this many concurrent clients',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Total number of requests per scenario with --concurrency',
+        )
+        parser.add_argument(
+            '--serialization',
+            action='store_true',
+            help='Compare CPU time per row of list endpoints with and '
+                 'without the fast read path',
+        )
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Exit with an error when a scenario regresses',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            context = bench_context()
+        except LookupError as exc:
+            raise CommandError(str(exc))
+
+        scenarios = [
+            scenario for scenario in default_scenarios(context)
+            if not options['only'] or scenario.name in options['only']
+        ]
+        if options['serialization']:
+            self.compare_serialization(context, scenarios, options)
+            return
+        scenarios = [
+            scenario for scenario in scenarios
+            if options['include_heavy'] or not scenario.heavy
+        ]
+        if options['concurrency']:
+            self.compare_concurrency(context, scenarios, options)
+            return
+
+        results = run(
+            scenarios,
+            context['users'],
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            progress=self.stdout.write,
+        )
+
+        if options['output']:
+            _write(Path(options['output']), results)
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            _write(baseline_path, results)
+            self.stdout.write(
+                self.style.SUCCESS(f'Baseline saved to {baseline_path}')
+            )
+            return
+        if not baseline_path.exists():
+            self.stdout.write(f'No baseline at {baseline_path}')
+            return
+
+        regressions = compare(
+            results,
+            json.loads(baseline_path.read_text()),
+            tolerance=options['tolerance'],
+        )
+        for regression in regressions:
+            self.stdout.write(self.style.WARNING(regression))
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} regressions')
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('No regressions'))
+
+    def compare_concurrency(self, context, scenarios, options):
+        results = run_concurrency(
+            [s for s in scenarios if s.name in HOT_SCENARIOS],
+            context['users'],
+            concurrency=options['concurrency'],
+            requests=options['requests'],
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<22} sync {result['sync_rps']:>8.1f} req/s  "
+                f"async {result['async_rps']:>8.1f} req/s"
+            )
+        if options['output']:
+            _write(Path(options['output']), results)
+
+    def compare_serialization(self, context, scenarios, options):
+        # Полные списки нужны здесь всегда, поэтому heavy не учитывается
+        results = run_serialization(
+            [s for s in scenarios if s.name in FAST_LIST_SCENARIOS],
+            context['users'],
+            iterations=options['iterations'],
+        )
+        for name, result in results.items():
+            line = (
+                f"{name:<22} {result['rows']:>6} rows  "
+                f"serializer {result['serializer_us_per_row']:>8.1f}  "
+                f"fast {result['fast_us_per_row']:>8.1f} us/row"
+            )
+            if result['identical']:
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.ERROR(f'{line}  DIFFERENT BODY'))
+        if options['output']:
+            _write(Path(options['output']), results)
+
+
+def _write(path, results):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, sort_keys=True))
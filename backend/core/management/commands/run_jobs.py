@@ -0,0 +1,97 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.jobs import DEFAULT_QUEUE, work
+
+THREAD = 'thread'
+PROCESS = 'process'
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue',
+            action='append',
+            dest='queues',
+            help='Queue to take jobs from, may be repeated (default: default)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of jobs run in parallel by this command',
+        )
+        parser.add_argument(
+            '--pool',
+            choices=[THREAD, PROCESS],
+            default=THREAD,
+            help='Run workers in threads (I/O-bound jobs) or processes',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.JOB_BATCH_SIZE,
+            help='Number of jobs a worker claims at once',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queues are empty',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the due jobs and exit instead of polling forever',
+        )
+
+    def handle(self, *args, **options):
+        worker_options = {
+            'queues': options['queues'] or [DEFAULT_QUEUE],
+            'batch_size': options['batch_size'],
+            'sleep': options['sleep'],
+            'once': options['once'],
+        }
+        workers = options['workers']
+        if workers <= 1:
+            total = work(**worker_options)
+        elif options['pool'] == THREAD:
+            total = self.run_threads(workers, worker_options)
+        else:
+            total = self.run_processes(workers, worker_options)
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} jobs'))
+
+    def run_threads(self, workers, worker_options):
+        stop = threading.Event()
+        with ThreadPoolExecutor(workers) as pool:
+            futures = [
+                pool.submit(work, stop=stop, **worker_options)
+                for _ in range(workers)
+            ]
+            try:
+                return sum(future.result() for future in futures)
+            except KeyboardInterrupt:
+                # Потоки завершают текущие задачи и выходят
+                stop.set()
+                return sum(future.result() for future in futures)
+
+    def run_processes(self, workers, worker_options):
+        # Открытые соединения не должны достаться дочерним процессам
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+            futures = [
+                pool.submit(work, **worker_options) for _ in range(workers)
+            ]
+            try:
+                return sum(future.result() for future in futures)
+            except KeyboardInterrupt:
+                # Ctrl+C получает вся группа процессов, воркеры выходят сами
+                return sum(future.result() for future in futures)
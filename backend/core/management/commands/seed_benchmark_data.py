@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark_data import seed
+from reports.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a large synthetic data set for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currencies', type=int, default=2000)
+        parser.add_argument('--rates', type=int, default=5000)
+        parser.add_argument('--offices', type=int, default=300)
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of orders inserted in one transaction',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed; the same seed gives the same data set',
+        )
+        parser.add_argument(
+            '--rollups',
+            action='store_true',
+            help='Build exchange volume rollups for the generated orders',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Allow running with DEBUG=False',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError(
+                'Refusing to generate benchmark data with DEBUG=False, '
+                'use --force if this database is not production'
+            )
+
+        counts = seed(
+            currencies=options['currencies'],
+            rates=options['rates'],
+            offices=options['offices'],
+            users=options['users'],
+            orders=options['orders'],
+            batch_size=options['batch_size'],
+            random_seed=options['seed'],
+            progress=self.stdout.write,
+        )
+        if options['rollups']:
+            backfill(chunk_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Generated {counts}'))
@@ -0,0 +1,336 @@
+"""Request metrics in Prometheus format.
+
+`MetricsMiddleware` records for every request, labelled by resolved view
+name and action:
+
+* latency, number of DB queries and time spent in the database;
+* render time - rendering of the DRF response by its renderer (building
+  `serializer.data` happens in the view and counts towards latency);
+* response size.
+
+Values go into in-process histograms with fixed buckets (a lock and a
+`bisect` per observation), exposed by `metrics_view` at `/metrics`. Every
+worker process keeps its own histograms, Prometheus aggregates them.
+
+Requests slower than `settings.SLOW_REQUEST_THRESHOLD_MS` are logged
+together with their SQL queries.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Сколько SQL-запросов сохраняется для лога медленного запроса
+SLOW_QUERY_LOG_LIMIT = 50
+
+UNRESOLVED = '<unresolved>'
+
+
+class Histogram:
+    """Prometheus histogram with a fixed set of label names."""
+
+    def __init__(self, name, documentation, buckets, labels):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [
+                    [0] * (len(self.buckets) + 1), 0, 0
+                ]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = [
+                (labels, list(counts), total, count)
+                for labels, (counts, total, count) in self._series.items()
+            ]
+        for label_values, counts, total, count in sorted(series):
+            labels = _format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield (
+                    f'{self.name}_bucket'
+                    f'{_format_labels(self.labels, label_values, le=bound)}'
+                    f' {cumulative}'
+                )
+            yield (
+                f'{self.name}_bucket'
+                f'{_format_labels(self.labels, label_values, le="+Inf")}'
+                f' {count}'
+            )
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+class Counter:
+    """Prometheus counter with a fixed set of label names."""
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = (
+                self._values.get(label_values, 0) + amount
+            )
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            labels = _format_labels(self.labels, label_values)
+            yield f'{self.name}{labels} {_format_value(value)}'
+
+
+REQUEST_LABELS = ('view', 'action', 'method')
+
+REQUESTS = Counter(
+    'http_requests_total',
+    'Requests by view, action, method and status code.',
+    REQUEST_LABELS + ('status',),
+)
+LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Request latency.',
+    LATENCY_BUCKETS,
+    REQUEST_LABELS,
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Database queries per request.',
+    QUERY_BUCKETS,
+    REQUEST_LABELS,
+)
+DB_TIME = Histogram(
+    'http_request_db_duration_seconds',
+    'Time spent in database queries per request.',
+    LATENCY_BUCKETS,
+    REQUEST_LABELS,
+)
+RENDER_TIME = Histogram(
+    'http_request_render_seconds',
+    'Time spent rendering the response body.',
+    LATENCY_BUCKETS,
+    REQUEST_LABELS,
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Response body size.',
+    SIZE_BUCKETS,
+    REQUEST_LABELS,
+)
+
+REGISTRY = [REQUESTS, LATENCY, DB_QUERIES, DB_TIME, RENDER_TIME,
+            RESPONSE_SIZE]
+
+# Дополнительные источники метрик: callables, возвращающие строки
+# в формате Prometheus
+COLLECTORS = []
+
+
+def register_collector(collector):
+    COLLECTORS.append(collector)
+    return collector
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    for collector in COLLECTORS:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
+
+
+class QueryRecorder:
+    """`connection.execute_wrapper` counting queries and their time."""
+
+    def __init__(self, keep_sql):
+        self.count = 0
+        self.duration = 0.0
+        self.keep_sql = keep_sql
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if self.keep_sql and len(self.queries) < SLOW_QUERY_LOG_LIMIT:
+                self.queries.append((elapsed, sql))
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = self.start(request)
+        start = time.perf_counter()
+        with self.recording(recorder):
+            response = self.get_response(request)
+        self.finish(request, response, time.perf_counter() - start, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = self.start(request)
+        start = time.perf_counter()
+        with self.recording(recorder):
+            response = await self.get_response(request)
+        self.finish(request, response, time.perf_counter() - start, recorder)
+        return response
+
+    @staticmethod
+    def start(request):
+        request._metrics_render_time = 0.0
+        return QueryRecorder(
+            keep_sql=settings.SLOW_REQUEST_THRESHOLD_MS is not None
+        )
+
+    @staticmethod
+    def recording(recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def finish(self, request, response, duration, recorder):
+        threshold = settings.SLOW_REQUEST_THRESHOLD_MS
+        labels = self.labels(request)
+        REQUESTS.inc(*labels, str(response.status_code))
+        LATENCY.observe(duration, *labels)
+        DB_QUERIES.observe(recorder.count, *labels)
+        DB_TIME.observe(recorder.duration, *labels)
+        RENDER_TIME.observe(request._metrics_render_time, *labels)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(len(response.content), *labels)
+
+        if threshold is not None and duration * 1000 >= threshold:
+            log_slow_request(request, response, duration, recorder)
+
+    def process_template_response(self, request, response):
+        # DRF Response рендерится после middleware: засекаем время рендера
+        start = time.perf_counter()
+
+        def rendered(response):
+            request._metrics_render_time = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def labels(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return (UNRESOLVED, '', request.method)
+        # Для ViewSet: {'get': 'list', 'post': 'create'}. Без process_view:
+        # под ASGI каждый синхронный process_view - переход в другой поток
+        actions = getattr(match.func, 'actions', None) or {}
+        return (match.view_name or match._func_path,
+                actions.get(request.method.lower(), ''), request.method)
+
+
+def log_slow_request(request, response, duration, recorder):
+    queries = '\n'.join(
+        f'  {elapsed * 1000:.1f} ms: {sql}'
+        for elapsed, sql in recorder.queries
+    )
+    logger.warning(
+        "Slow request %s %s (%s): %.0f ms, %s queries in %.0f ms\n%s",
+        request.method, request.get_full_path(), response.status_code,
+        duration * 1000, recorder.count, recorder.duration * 1000, queries,
+    )
+
+
+def metrics_view(request):
+    """Prometheus endpoint, protected by METRICS_TOKEN.
+
+    Without a token the endpoint is open only with DEBUG: the metrics show
+    view latencies, office queues and cache statistics.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        provided = request.META.get('HTTP_AUTHORIZATION', '')
+        if not constant_time_compare(provided, f'Bearer {token}'):
+            return HttpResponse(status=403)
+    elif not settings.DEBUG:
+        return HttpResponse(status=403)
+    return HttpResponse(
+        render_metrics(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+def _format_labels(names, values, **extra):
+    pairs = list(zip(names, values)) + [
+        (name, value) for name, value in extra.items()
+    ]
+    if not pairs:
+        return ''
+    body = ','.join(
+        f'{name}="{_escape(_format_value(value))}"' for name, value in pairs
+    )
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return (
+        value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+    )
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.14 on 2026-10-19 19:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobQueue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Очередь')),
+                ('concurrency', models.PositiveIntegerField(blank=True, help_text='Пусто - без ограничения', null=True, verbose_name='Параллельно задач')),
+                ('paused', models.BooleanField(default=False, verbose_name='Приостановлена')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний забор задач')),
+            ],
+            options={
+                'verbose_name': 'Очередь задач',
+                'verbose_name_plural': 'Очереди задач',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=255, verbose_name='Задача')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='Аргументы')),
+                ('kwargs', models.JSONField(blank=True, default=dict, verbose_name='Именованные аргументы')),
+                ('queue', models.CharField(default='default', max_length=50, verbose_name='Очередь')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='Приоритет')),
+                ('key', models.CharField(blank=True, max_length=255, null=True, unique=True, verbose_name='Ключ')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('running', 'Выполняется'), ('succeeded', 'Выполнена'), ('failed', 'Ошибка'), ('cancelled', 'Отменена')], default='pending', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='Максимум попыток')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Доступна для запуска')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Запущена')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['queue', 'status', '-priority', 'available_at'], name='core_job_pending_idx'), models.Index(fields=['status', 'finished_at'], name='core_job_finished_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,190 @@
+from django.db import models
+from django.utils import timezone
+
+
+class QueuedEmail(models.Model):
+    """Письмо в очереди на отправку (см. core.mail)."""
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает отправки'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    subject = models.CharField('Тема', max_length=998)
+    body = models.TextField('Текст', blank=True)
+    html_body = models.TextField('HTML', blank=True)
+    from_email = models.CharField('Отправитель', max_length=254, blank=True)
+    to = models.JSONField('Кому', default=list)
+    cc = models.JSONField('Копия', default=list, blank=True)
+    bcc = models.JSONField('Скрытая копия', default=list, blank=True)
+    reply_to = models.JSONField('Ответить', default=list, blank=True)
+    headers = models.JSONField('Заголовки', default=dict, blank=True)
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    available_at = models.DateTimeField(
+        'Доступно для отправки',
+        default=timezone.now
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    sent_at = models.DateTimeField('Отправлено', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Письмо в очереди'
+        verbose_name_plural = 'Очередь писем'
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['status', 'available_at'],
+                name='core_email_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
+
+
+class IdempotencyKey(models.Model):
+    """Ответ на запрос с заголовком Idempotency-Key (см. core.idempotency)."""
+    IN_PROGRESS = 'in_progress'
+    COMPLETED = 'completed'
+    STATUS_CHOICES = [
+        (IN_PROGRESS, 'Выполняется'),
+        (COMPLETED, 'Выполнен'),
+    ]
+
+    # Хэш учётных данных клиента: ключи разных клиентов не пересекаются
+    scope = models.CharField('Клиент', max_length=64)
+    key = models.CharField('Ключ', max_length=255)
+    fingerprint = models.CharField('Отпечаток запроса', max_length=64)
+    method = models.CharField('Метод', max_length=10)
+    path = models.CharField('Путь', max_length=2048)
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=IN_PROGRESS
+    )
+    locked_until = models.DateTimeField('Заблокирован до')
+    response_status = models.PositiveSmallIntegerField(
+        'Код ответа', null=True, blank=True
+    )
+    response_headers = models.JSONField(
+        'Заголовки ответа', default=dict, blank=True
+    )
+    response_body = models.BinaryField('Тело ответа', default=bytes)
+    created_at = models.DateTimeField('Создан', auto_now_add=True)
+    expires_at = models.DateTimeField('Истекает')
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'key'],
+                name='core_idempotency_scope_key_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['expires_at'],
+                name='core_idempotency_expires_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.key})"
+
+
+class JobQueue(models.Model):
+    """Очередь фоновых задач и её ограничения (см. core.jobs)."""
+    name = models.CharField('Очередь', max_length=50, unique=True)
+    # Сколько задач очереди выполняется одновременно всеми воркерами
+    concurrency = models.PositiveIntegerField(
+        'Параллельно задач', null=True, blank=True,
+        help_text='Пусто - без ограничения'
+    )
+    paused = models.BooleanField('Приостановлена', default=False)
+    claimed_at = models.DateTimeField(
+        'Последний забор задач', null=True, blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Очередь задач'
+        verbose_name_plural = 'Очереди задач'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class Job(models.Model):
+    """Фоновая задача (см. core.jobs)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (SUCCEEDED, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+        (CANCELLED, 'Отменена'),
+    ]
+    FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+    task = models.CharField('Задача', max_length=255)
+    args = models.JSONField('Аргументы', default=list, blank=True)
+    kwargs = models.JSONField('Именованные аргументы', default=dict,
+                              blank=True)
+    queue = models.CharField('Очередь', max_length=50, default='default')
+    # Из доступных задач очереди первой берётся задача с большим приоритетом
+    priority = models.SmallIntegerField('Приоритет', default=0)
+    # Повторная постановка с тем же ключом не создаёт вторую задачу
+    key = models.CharField(
+        'Ключ', max_length=255, null=True, blank=True, unique=True
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveIntegerField('Максимум попыток', default=5)
+    # Для ожидающей задачи - время запуска, для выполняемой - конец аренды
+    available_at = models.DateTimeField(
+        'Доступна для запуска',
+        default=timezone.now
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+    started_at = models.DateTimeField('Запущена', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['queue', 'status', '-priority', 'available_at'],
+                name='core_job_pending_idx'
+            ),
+            models.Index(
+                fields=['status', 'finished_at'],
+                name='core_job_finished_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.queue}, {self.get_status_display()})"
@@ -0,0 +1,53 @@
+"""Helpers shared by the database-backed queues (outbox, mail, jobs)."""
+import random
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+
+def claim_batch(queryset, *, limit, lease_seconds, lease_field='available_at'):
+    """Claim up to `limit` rows of an ordered `queryset` for processing.
+
+    Claimed rows get their `lease_field` moved `lease_seconds` into the
+    future, so other workers skip them until the lease expires. A worker
+    that dies mid-batch only delays its rows, it never loses them.
+
+    On databases with `SELECT ... FOR UPDATE SKIP LOCKED` (PostgreSQL)
+    concurrent workers never block each other. Elsewhere (SQLite) every
+    row is claimed by a conditional UPDATE, so two workers can't take the
+    same row either.
+    """
+    model = queryset.model
+    lease_until = timezone.now() + timedelta(seconds=lease_seconds)
+    features = connections[queryset.db].features
+
+    with transaction.atomic(using=queryset.db):
+        if features.has_select_for_update_skip_locked:
+            rows = list(queryset.select_for_update(skip_locked=True)[:limit])
+            model.objects.using(queryset.db).filter(
+                pk__in=[row.pk for row in rows]
+            ).update(**{lease_field: lease_until})
+        else:
+            rows = []
+            for row in queryset[:limit]:
+                claimed = model.objects.using(queryset.db).filter(
+                    pk=row.pk,
+                    **{lease_field: getattr(row, lease_field)}
+                ).update(**{lease_field: lease_until})
+                if claimed:
+                    rows.append(row)
+
+    for row in rows:
+        setattr(row, lease_field, lease_until)
+    return rows
+
+
+def backoff_delay(attempts, *, base=5, cap=3600):
+    """Exponential backoff with jitter, in seconds.
+
+    Half of the delay is fixed and half is random, so retries of events
+    that failed together spread out instead of hitting the target at once.
+    """
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -0,0 +1,117 @@
+"""Serving protected files.
+
+The Django view only checks permissions and returns a response with
+`X-Accel-Redirect` (nginx) or `X-Sendfile` (Apache / lighttpd) header,
+the front web server then streams the file itself. The `simple` backend
+streams the file from Python and is meant for local runs only.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def sendfile_response(request, field_file, *, as_attachment=True):
+    """Return a response that delivers `field_file` to the client.
+
+    The delivery method is chosen by `settings.SENDFILE_BACKEND`:
+    `nginx`, `xsendfile` or `simple`.
+    """
+    backend = getattr(settings, 'SENDFILE_BACKEND', 'simple')
+    filename = os.path.basename(field_file.name)
+    content_type = (
+        mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    )
+
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(
+            settings.SENDFILE_URL + field_file.name
+        )
+    elif backend == 'xsendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = field_file.path
+    elif backend == 'simple':
+        response = ranged_file_response(
+            request, field_file.path, content_type
+        )
+    else:
+        raise ValueError(f'Unknown SENDFILE_BACKEND: {backend!r}')
+
+    response['Content-Disposition'] = content_disposition_header(
+        as_attachment, filename
+    )
+    return response
+
+
+def ranged_file_response(request, path, content_type):
+    """Stream a local file honoring a single `Range: bytes=...` header."""
+    size = os.path.getsize(path)
+    byte_range = parse_range_header(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    elif byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _iter_file_range(path, start, length),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def parse_range_header(header, size):
+    """Parse a single byte range.
+
+    Returns `(start, end)` inclusive, `None` when the whole file should be
+    sent (no header, unsupported or multi-range header) and `False` when
+    the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        # Suffix range: the last N bytes of the file
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        return None
+
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _iter_file_range(path, start, length):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,76 @@
+"""Streaming quantile sketch.
+
+`QuantileSketch` is a DDSketch: a value is counted in the bucket
+`(gamma^(k-1), gamma^k]`, where `gamma` follows from the relative accuracy,
+so any quantile is returned within that relative error (1% by default)
+without keeping the values. The number of buckets grows with the logarithm
+of the value range, not with the number of values: durations from a second
+to a month fit in about 750 buckets at 1%. Sketches are merged by adding
+bucket counts and are stored as JSON (`to_dict`/`from_dict`).
+"""
+import math
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Значения меньше считаются нулём: логарифм от них не нужен
+MIN_VALUE = 1e-9
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error guarantees."""
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        if value < MIN_VALUE:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Sketches with different accuracy')
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q):
+        """Value at quantile `q` (0..1), None for an empty sketch."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                # Середина корзины по относительной ошибке
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {
+            'accuracy': self.relative_accuracy,
+            'zero': self.zero_count,
+            'bins': {str(key): count for key, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        sketch = cls(data['accuracy'])
+        sketch.zero_count = data['zero']
+        sketch.bins = {int(key): count for key, count in data['bins'].items()}
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
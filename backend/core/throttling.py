@@ -0,0 +1,191 @@
+"""Token-bucket throttling for public and cheap-to-call endpoints.
+
+Every request takes a token from two buckets: its client's (the IP address
+of an anonymous request, the user of an authenticated one) and the
+endpoint's, shared by all clients. A bucket holds up to N tokens and gets
+N back per period (`settings.THROTTLE_RATES`, e.g. '60/min'), so short
+bursts pass while a steady stream above the rate gets 429 with
+`Retry-After`. A request that is refused takes no tokens.
+
+With Redis (REDIS_URL) all buckets of a request are checked and taken by
+one Lua script: atomic across workers and one round trip. Without Redis, or
+while it is unavailable, buckets live in the memory of the process.
+
+Views opt in with `throttle_classes = [TokenBucketThrottle]` (or
+`get_throttles()` for some actions of a viewset).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import BaseThrottle
+
+from core.metrics import Counter, register_collector
+
+BUCKET_KEY = 'throttle:{}:{}'
+
+# Атрибут запроса, который уже пропустил асинхронный view (core.asyncviews)
+ADMITTED = 'throttle_admitted'
+
+# Сколько корзин хранится в памяти процесса; вытесненная корзина
+# снова считается полной
+LOCAL_MAX_BUCKETS = 10000
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# KEYS - корзины, ARGV - ёмкость и пополнение в секунду для каждой.
+# Время берётся у Redis, чтобы часы воркеров не влияли на результат
+TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local value = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    value = math.min(capacity, value + math.max(0, now - updated) * rate)
+    tokens[i] = value
+    if value < 1 then
+        wait = math.max(wait, (1 - value) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'updated', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return '0'
+"""
+
+THROTTLED = Counter(
+    'throttled_requests_total',
+    'Requests refused by token-bucket throttling, by endpoint.',
+    ('endpoint',),
+)
+register_collector(THROTTLED.collect)
+
+
+def parse_rate(rate):
+    """`(capacity, tokens per second)` for '60/min', None for no limit."""
+    if not rate:
+        return None
+    number, period = rate.split('/')
+    capacity = int(number)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class LocalBuckets:
+    """Buckets in process memory, least recently used evicted first."""
+
+    def __init__(self, max_buckets=LOCAL_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, buckets):
+        """Take a token from every bucket; seconds to wait when refused."""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            wait = 0
+            for key, capacity, rate in buckets:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                levels.append(tokens)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+            if wait:
+                return wait
+            for (key, _, _), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens - 1, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return 0
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+local_buckets = LocalBuckets()
+_scripts = {}
+
+
+def take(buckets):
+    """Take a token from each `(key, capacity, rate)` bucket.
+
+    Returns 0 when the request may go on, otherwise seconds until it may.
+    """
+    if not buckets:
+        return 0
+    store = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(store, RedisCache):
+        try:
+            return _redis_take(store, buckets)
+        except Exception:
+            # Недоступный Redis не должен останавливать API
+            pass
+    return local_buckets.take(buckets)
+
+
+def _redis_take(store, buckets):
+    client = store._cache.get_client(write=True)
+    script = _scripts.get(id(client))
+    if script is None:
+        script = _scripts[id(client)] = client.register_script(TAKE_SCRIPT)
+    args = []
+    for _, capacity, rate in buckets:
+        args += [capacity, rate]
+    keys = [store.make_key(key) for key, _, _ in buckets]
+    return float(script(keys=keys, args=args, client=client))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Client and endpoint buckets (see module docstring)."""
+
+    def allow_request(self, request, view):
+        if getattr(request, ADMITTED, False):
+            # Уже пропущен асинхронным view, второй токен не берётся
+            return True
+        endpoint = self.get_endpoint(request, view)
+        self.wait_seconds = take(self.get_buckets(request, endpoint))
+        if self.wait_seconds:
+            THROTTLED.inc(endpoint)
+            return False
+        return True
+
+    def get_endpoint(self, request, view):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.view_name:
+            return match.view_name
+        return type(view).__name__
+
+    def get_buckets(self, request, endpoint):
+        rates = settings.THROTTLE_RATES
+        if request.user and request.user.is_authenticated:
+            scope, client = 'user', request.user.pk
+        else:
+            scope, client = 'anon', self.get_ident(request)
+        buckets = []
+        for scope, key in (
+            (scope, f'{endpoint}:{client}'),
+            ('endpoint', endpoint),
+        ):
+            rate = parse_rate(rates.get(scope))
+            if rate is not None:
+                buckets.append((BUCKET_KEY.format(scope, key), *rate))
+        return buckets
+
+    def wait(self):
+        return self.wait_seconds
@@ -4,3 +4,50 @@ from django.apps import AppConfig
 class ExchangeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exchange'
+
+    def ready(self):
+        from rest_framework.permissions import IsAuthenticated
+
+        from core.cache import register_namespace
+        from exchange.models import (
+            Currency,
+            CurrencyBalance,
+            ExchangeOffice,
+            ExchangeRate,
+        )
+        from exchange.serializers import (
+            CurrencyBalanceSerializer,
+            CurrencySerializer,
+            ExchangeOfficeSerializer,
+            ExchangeRateSerializer,
+        )
+        from exchange.sync import register_table
+        from users.permissions import IsOwner
+
+        # Курсы и балансы показывают коды и названия валют
+        register_namespace('currencies', Currency)
+        register_namespace('rates', ExchangeRate, Currency)
+        register_namespace('offices', ExchangeOffice)
+        register_namespace('balances', CurrencyBalance, Currency)
+
+        # Справочники для синхронизации: те же выборки и права на чтение,
+        # что у списков; курсы и балансы меняются вместе с валютами
+        register_table('currencies', Currency.objects.all(),
+                       CurrencySerializer)
+        register_table(
+            'rates',
+            ExchangeRate.objects.filter(is_active=True).select_related(
+                'from_currency', 'to_currency'
+            ),
+            ExchangeRateSerializer,
+            depends_on={Currency: ['from_currency', 'to_currency']},
+        )
+        register_table('offices', ExchangeOffice.objects.all(),
+                       ExchangeOfficeSerializer, IsAuthenticated)
+        register_table(
+            'balances',
+            CurrencyBalance.objects.select_related('currency', 'office'),
+            CurrencyBalanceSerializer,
+            IsOwner,
+            depends_on={Currency: ['currency'], ExchangeOffice: ['office']},
+        )
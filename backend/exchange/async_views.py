@@ -0,0 +1,53 @@
+"""Async versions of the busiest exchange endpoints (see core.asyncviews).
+
+Handlers return None when the regular DRF view should answer instead.
+"""
+from django.core.exceptions import ValidationError
+from rest_framework import status
+
+from core.asyncviews import authenticated_user, json_response
+from core.cache import acached, query_key
+from exchange.models import Currency
+from exchange.serializers import CurrencySerializer, ExchangeRateSerializer
+from exchange.services import calculate_exchange
+from exchange.views import ExchangeRateViewSet
+
+
+async def currency_list(request):
+    async def build():
+        currencies = [currency async for currency in Currency.objects.all()]
+        return CurrencySerializer(currencies, many=True).data
+
+    # Тот же ключ, что у CurrencyViewSet.list (core.cache.CachedListMixin)
+    return json_response(
+        await acached('currencies', 'list', query_key(request), build=build)
+    )
+
+
+async def rate_list(request):
+    async def build():
+        rates = [rate async for rate in ExchangeRateViewSet.queryset.all()]
+        return ExchangeRateSerializer(rates, many=True).data
+
+    return json_response(
+        await acached('rates', 'list', query_key(request), build=build)
+    )
+
+
+async def rate_calculate(request, pk):
+    if await authenticated_user(request) is None:
+        return None
+    rate = await ExchangeRateViewSet.queryset.filter(pk=pk).afirst()
+    if rate is None:
+        return None
+    try:
+        result = calculate_exchange(
+            rate,
+            amount_from=request.data.get('amount_from'),
+            amount_to=request.data.get('amount_to'),
+        )
+    except ValidationError as exc:
+        return json_response(
+            {'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST
+        )
+    return json_response(result)
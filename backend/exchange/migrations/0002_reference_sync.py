@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-19 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=50, unique=True, verbose_name='Таблица')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+                ('reset_version', models.PositiveBigIntegerField(default=0, help_text='Клиенты с более старой версией получают таблицу целиком', verbose_name='Версия полной выгрузки')),
+            ],
+            options={
+                'verbose_name': 'Версия справочника',
+                'verbose_name_plural': 'Версии справочников',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReferenceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=50, verbose_name='Таблица')),
+                ('object_id', models.BigIntegerField(verbose_name='ID строки')),
+                ('version', models.PositiveBigIntegerField(verbose_name='Версия')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удалена')),
+            ],
+            options={
+                'verbose_name': 'Изменение справочника',
+                'verbose_name_plural': 'Изменения справочников',
+                'indexes': [models.Index(fields=['table', 'version'], name='exchange_reference_change_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='referencechange',
+            constraint=models.UniqueConstraint(fields=('table', 'object_id'), name='exchange_reference_change_uniq'),
+        ),
+    ]
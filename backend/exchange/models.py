@@ -129,3 +129,48 @@ class CurrencyBalance(models.Model):
 
     def __str__(self):
         return f"{self.office.name} - {self.currency.code}: {self.balance}"
+
+
+class ReferenceVersion(models.Model):
+    """Версия справочной таблицы для синхронизации (см. exchange.sync)."""
+    table = models.CharField('Таблица', max_length=50, unique=True)
+    version = models.PositiveBigIntegerField('Версия', default=0)
+    reset_version = models.PositiveBigIntegerField(
+        'Версия полной выгрузки',
+        default=0,
+        help_text='Клиенты с более старой версией получают таблицу целиком'
+    )
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f"{self.table}: {self.version}"
+
+
+class ReferenceChange(models.Model):
+    """Последнее изменение строки справочной таблицы."""
+    table = models.CharField('Таблица', max_length=50)
+    object_id = models.BigIntegerField('ID строки')
+    version = models.PositiveBigIntegerField('Версия')
+    deleted = models.BooleanField('Удалена', default=False)
+
+    class Meta:
+        verbose_name = 'Изменение справочника'
+        verbose_name_plural = 'Изменения справочников'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['table', 'object_id'],
+                name='exchange_reference_change_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['table', 'version'],
+                name='exchange_reference_change_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.table} #{self.object_id}: {self.version}"
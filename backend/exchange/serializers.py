@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from core.fieldsets import SparseFieldsetMixin
 from exchange.models import (
     Currency,
     ExchangeRate,
@@ -7,13 +8,13 @@ from exchange.models import (
 )
 
 
-class CurrencySerializer(serializers.ModelSerializer):
+class CurrencySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Currency
         fields = ['id', 'code', 'name', 'symbol', 'is_active']
 
 
-class ExchangeRateSerializer(serializers.ModelSerializer):
+class ExchangeRateSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     from_currency_code = serializers.CharField(
         source='from_currency.code', read_only=True
     )
@@ -26,6 +27,8 @@ class ExchangeRateSerializer(serializers.ModelSerializer):
         fields = ['id', 'from_currency', 'to_currency',
                   'from_currency_code', 'to_currency_code',
                   'rate', 'min_amount', 'is_active', 'updated_at']
+        # Коды валют требуют соединения с таблицей валют
+        expandable_fields = ['from_currency_code', 'to_currency_code']
 
     def validate(self, data):
         """Проверка валютной пары"""
@@ -34,14 +37,16 @@ class ExchangeRateSerializer(serializers.ModelSerializer):
         return data
 
 
-class ExchangeOfficeSerializer(serializers.ModelSerializer):
+class ExchangeOfficeSerializer(SparseFieldsetMixin,
+                               serializers.ModelSerializer):
     class Meta:
         model = ExchangeOffice
         fields = ['id', 'name', 'address',
                   'latitude', 'longitude', 'is_active']
 
 
-class CurrencyBalanceSerializer(serializers.ModelSerializer):
+class CurrencyBalanceSerializer(SparseFieldsetMixin,
+                                serializers.ModelSerializer):
     currency_code = serializers.CharField(
         source='currency.code', read_only=True
     )
@@ -53,3 +58,12 @@ class CurrencyBalanceSerializer(serializers.ModelSerializer):
         model = CurrencyBalance
         fields = ['id', 'office', 'currency', 'currency_code',
                   'currency_name', 'balance']
+        expandable_fields = ['currency_code', 'currency_name']
+
+
+class ReferenceSyncSerializer(serializers.Serializer):
+    """Версии справочников, которые уже есть у клиента"""
+    currencies = serializers.IntegerField(min_value=0, required=False)
+    rates = serializers.IntegerField(min_value=0, required=False)
+    offices = serializers.IntegerField(min_value=0, required=False)
+    balances = serializers.IntegerField(min_value=0, required=False)
@@ -1,3 +1,4 @@
+from decimal import Decimal, InvalidOperation
 from typing import Dict, Union
 
 from django.core.exceptions import ValidationError
@@ -8,9 +9,9 @@ from exchange.models import ExchangeRate
 def calculate_exchange(
     rate: ExchangeRate,
     *,
-    amount_from: Union[float, None] = None,
-    amount_to: Union[float, None] = None,
-) -> Dict[str, Union[str, float]]:
+    amount_from: Union[str, float, Decimal, None] = None,
+    amount_to: Union[str, float, Decimal, None] = None,
+) -> Dict[str, Union[str, Decimal]]:
     """Calculate exchange amounts based on provided parameters.
 
     Exactly one of `amount_from` or `amount_to` must be provided.
@@ -26,12 +27,13 @@ def calculate_exchange(
 
     try:
         if amount_from is not None:
-            amount_from = float(amount_from)
+            # Decimal, а не float: курс хранится как Decimal
+            amount_from = Decimal(str(amount_from))
             amount_to = rate.calculate_to_receive(amount_from)
         else:
-            amount_to = float(amount_to)  # type: ignore[arg-type]
+            amount_to = Decimal(str(amount_to))
             amount_from = rate.calculate_to_exchange(amount_to)
-    except (TypeError, ValueError) as exc:
+    except (TypeError, ValueError, InvalidOperation) as exc:
         raise ValidationError(str(exc)) from exc
 
     return {
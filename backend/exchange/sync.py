@@ -0,0 +1,200 @@
+"""Delta sync of reference data: currencies, rates, offices and balances.
+
+Every table has a version (`ReferenceVersion`) that grows by one with every
+change; `ReferenceChange` keeps, for every row ever changed, the version of
+its last change and whether it was deleted. A client sends the version of
+each table it has seen and gets only the rows changed since then plus the
+ids of deleted rows (tombstones), instead of reloading the tables.
+
+* Changes are recorded by `post_save`/`post_delete` in the transaction of
+  the change. The version row is locked until that transaction commits, so
+  versions of a table commit in order and a client that has seen version N
+  has seen every change up to N.
+* A row that no longer matches the table's queryset (an inactive rate) is
+  sent as deleted, like a deleted row.
+* Code that changes rows in bulk (`update()`, `bulk_create()`) calls
+  `reset_tables`: clients older than the reset get the table in full.
+  Version 0, or a version the server never issued, gets it in full too.
+"""
+from dataclasses import dataclass
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+
+from exchange.models import ReferenceChange, ReferenceVersion
+
+BATCH_SIZE = 1000
+
+
+@dataclass
+class SyncTable:
+    name: str
+    queryset: object
+    serializer_class: type
+    # Право чтения таблицы (класс DRF), None - публичная
+    permission_class: type = None
+
+    def allowed(self, request):
+        if self.permission_class is None:
+            return True
+        return self.permission_class().has_permission(request, None)
+
+
+_tables = {}
+_model_tables = {}
+_dependents = {}
+
+
+def register_table(name, queryset, serializer_class, permission_class=None,
+                   depends_on=None):
+    """Sync `queryset` as table `name` and record changes of its model.
+
+    `depends_on` maps other models to the lookups of the rows that show
+    their data (`{Currency: ['currency']}`): saving such a model changes
+    those rows too.
+    """
+    model = queryset.model
+    _tables[name] = SyncTable(
+        name, queryset, serializer_class, permission_class
+    )
+    _model_tables[model] = name
+    _connect(model, delete=True)
+    for related, lookups in (depends_on or {}).items():
+        _dependents.setdefault(related, []).append((model, lookups))
+        _connect(related)
+
+
+def _connect(model, delete=False):
+    uid = f'exchange_sync_{model._meta.label_lower}'
+    post_save.connect(row_saved, sender=model, dispatch_uid=uid)
+    if delete:
+        post_delete.connect(row_deleted, sender=model, dispatch_uid=uid)
+
+
+# ----- Recording -----
+
+def row_saved(sender, instance, **kwargs):
+    if sender in _model_tables:
+        record_changes(sender, [instance.pk])
+    for model, lookups in _dependents.get(sender, ()):
+        ids = list(
+            model.objects.filter(
+                reduce(or_, (Q(**{lookup: instance.pk}) for lookup in lookups))
+            ).values_list('pk', flat=True)
+        )
+        if ids:
+            record_changes(model, ids)
+
+
+def row_deleted(sender, instance, **kwargs):
+    record_changes(sender, [instance.pk], deleted=True)
+
+
+def record_changes(model, ids, deleted=False):
+    """Record a change of the rows `ids` of `model` under a new version."""
+    table = _model_tables[model]
+    with transaction.atomic():
+        version = _next_version(table)
+        ReferenceChange.objects.bulk_create(
+            [
+                ReferenceChange(
+                    table=table,
+                    object_id=object_id,
+                    version=version.version,
+                    deleted=deleted,
+                )
+                for object_id in ids
+            ],
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['table', 'object_id'],
+            update_fields=['version', 'deleted'],
+        )
+
+
+def reset_tables(*models):
+    """Send the tables in full to all clients (after bulk changes)."""
+    with transaction.atomic():
+        for table in sorted({_model_tables[model] for model in models}):
+            version = _next_version(table)
+            version.reset_version = version.version
+            version.save(update_fields=['reset_version'])
+
+
+def _next_version(table):
+    # Блокировка держится до фиксации транзакции изменения
+    version, _ = ReferenceVersion.objects.select_for_update().get_or_create(
+        table=table
+    )
+    version.version += 1
+    version.save(update_fields=['version'])
+    return version
+
+
+# ----- Reading -----
+
+def changes_since(request, seen):
+    """Changes of the tables readable by the request's user.
+
+    `seen` maps table names to the versions the client has; tables missing
+    from it are sent in full. Returns, by table, the current `version`,
+    whether the table is sent in `full`, the `updated` rows and the ids of
+    `deleted` ones.
+    """
+    tables = [table for table in _tables.values() if table.allowed(request)]
+    versions = {
+        table: (version, reset_version)
+        for table, version, reset_version in ReferenceVersion.objects.filter(
+            table__in=[table.name for table in tables]
+        ).values_list('table', 'version', 'reset_version')
+    }
+
+    full = {}
+    for table in tables:
+        version, reset_version = versions.get(table.name, (0, 0))
+        since = seen.get(table.name, 0)
+        full[table.name] = (
+            since == 0 or since < reset_version or since > version
+        )
+
+    # Изменения всех таблиц одним запросом; версии новее прочитанных
+    # ещё могут быть не зафиксированы и ждут следующей синхронизации
+    changed = {table.name: {} for table in tables}
+    ranges = [
+        Q(
+            table=table.name,
+            version__gt=seen[table.name],
+            version__lte=versions[table.name][0],
+        )
+        for table in tables
+        if not full[table.name] and seen[table.name] < versions[table.name][0]
+    ]
+    if ranges:
+        for table, object_id, deleted in ReferenceChange.objects.filter(
+            reduce(or_, ranges)
+        ).values_list('table', 'object_id', 'deleted'):
+            changed[table][object_id] = deleted
+
+    result = {}
+    for table in tables:
+        ids = changed[table.name]
+        if full[table.name]:
+            rows = list(table.queryset.all())
+        elif ids:
+            live = [
+                object_id for object_id, deleted in ids.items() if not deleted
+            ]
+            rows = list(table.queryset.filter(pk__in=live)) if live else []
+        else:
+            rows = []
+        present = {row.pk for row in rows}
+        result[table.name] = {
+            'version': versions.get(table.name, (0, 0))[0],
+            'full': full[table.name],
+            'updated': table.serializer_class(rows, many=True).data,
+            'deleted': sorted(set(ids) - present),
+        }
+    return result
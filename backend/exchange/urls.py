@@ -1,10 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from core.asyncviews import hot_path, router_view
+from exchange import async_views
 from exchange.views import (
     CurrencyViewSet,
     ExchangeRateViewSet,
     ExchangeOfficeViewSet,
-    CurrencyBalanceViewSet
+    CurrencyBalanceViewSet,
+    ReferenceSyncViewSet,
 )
 
 router = DefaultRouter()
@@ -12,7 +15,25 @@ router.register('currencies', CurrencyViewSet, basename='currency')
 router.register('rates', ExchangeRateViewSet, basename='rate')
 router.register('offices', ExchangeOfficeViewSet, basename='office')
 router.register('balances', CurrencyBalanceViewSet, basename='balance')
+router.register('sync', ReferenceSyncViewSet, basename='sync')
 
 urlpatterns = [
     path('', include(router.urls)),
 ]
+
+# Асинхронные версии для ASGI, подключаются при ASYNC_HOT_ENDPOINTS
+async_urlpatterns = [
+    path('currencies/',
+         hot_path(router_view(router, 'currency-list'))(
+             async_views.currency_list
+         ),
+         name='currency-list'),
+    path('rates/',
+         hot_path(router_view(router, 'rate-list'))(async_views.rate_list),
+         name='rate-list'),
+    path('rates/<int:pk>/calculate/',
+         hot_path(router_view(router, 'rate-calculate'), methods=['POST'])(
+             async_views.rate_calculate
+         ),
+         name='rate-calculate'),
+]
@@ -2,6 +2,10 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from core.cache import CachedListMixin
+from core.fastpath import FastListMixin
+from core.fieldsets import SparseFieldsetViewMixin
+from core.throttling import TokenBucketThrottle
 from users.permissions import IsAdministrator, IsOwner
 from exchange.models import (
     Currency,
@@ -13,14 +17,18 @@ from exchange.serializers import (
     CurrencySerializer,
     ExchangeRateSerializer,
     ExchangeOfficeSerializer,
-    CurrencyBalanceSerializer
+    CurrencyBalanceSerializer,
+    ReferenceSyncSerializer,
 )
 from exchange.services import calculate_exchange
+from exchange.sync import changes_since
 
 
-class CurrencyViewSet(viewsets.ModelViewSet):
+class CurrencyViewSet(SparseFieldsetViewMixin, CachedListMixin,
+                      viewsets.ModelViewSet):
     queryset = Currency.objects.all()
     serializer_class = CurrencySerializer
+    cache_namespace = 'currencies'
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -31,10 +39,20 @@ class CurrencyViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def get_throttles(self):
+        # Публичный список, его опрашивают чаще всего
+        if self.action == 'list':
+            return [TokenBucketThrottle()]
+        return []
 
-class ExchangeRateViewSet(viewsets.ModelViewSet):
-    queryset = ExchangeRate.objects.filter(is_active=True)
+
+class ExchangeRateViewSet(SparseFieldsetViewMixin, CachedListMixin,
+                          FastListMixin, viewsets.ModelViewSet):
+    queryset = ExchangeRate.objects.filter(is_active=True).select_related(
+        'from_currency', 'to_currency'
+    )
     serializer_class = ExchangeRateSerializer
+    cache_namespace = 'rates'
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -45,6 +63,12 @@ class ExchangeRateViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def get_throttles(self):
+        # Публичный список и расчёт, их опрашивают чаще всего
+        if self.action in ['list', 'calculate']:
+            return [TokenBucketThrottle()]
+        return []
+
     @action(detail=True, methods=['post'])
     def calculate(self, request, pk=None):
         """Расчет суммы обмена"""
@@ -64,9 +88,11 @@ class ExchangeRateViewSet(viewsets.ModelViewSet):
             )
 
 
-class ExchangeOfficeViewSet(viewsets.ModelViewSet):
+class ExchangeOfficeViewSet(SparseFieldsetViewMixin, CachedListMixin,
+                            viewsets.ModelViewSet):
     queryset = ExchangeOffice.objects.all()
     serializer_class = ExchangeOfficeSerializer
+    cache_namespace = 'offices'
 
     def get_permissions(self):
         """Только владелец может управлять обменными пунктами"""
@@ -80,14 +106,19 @@ class ExchangeOfficeViewSet(viewsets.ModelViewSet):
     def balances(self, request, pk=None):
         """Получение всех балансов для конкретного обменного пункта"""
         office = self.get_object()
-        balances = office.balances.all()
-        serializer = CurrencyBalanceSerializer(balances, many=True)
+        balances = office.balances.select_related('currency')
+        serializer = CurrencyBalanceSerializer(
+            balances, many=True, context=self.get_serializer_context()
+        )
         return Response(serializer.data)
 
 
-class CurrencyBalanceViewSet(viewsets.ModelViewSet):
+class CurrencyBalanceViewSet(SparseFieldsetViewMixin, CachedListMixin,
+                             FastListMixin, viewsets.ModelViewSet):
     serializer_class = CurrencyBalanceSerializer
+    cache_namespace = 'balances'
     permission_classes = [IsOwner]  # Только владелец может управлять балансами
+    fieldset_actions = ('list', 'retrieve', 'by_office')
 
     def get_queryset(self):
         return CurrencyBalance.objects.select_related('currency', 'office')
@@ -97,7 +128,33 @@ class CurrencyBalanceViewSet(viewsets.ModelViewSet):
         """Получение балансов по ID обменного пункта"""
         office_id = request.query_params.get('office_id')
         if office_id:
-            balances = self.get_queryset().filter(office_id=office_id)
-            serializer = self.get_serializer(balances, many=True)
-            return Response(serializer.data)
+            return self.cached_response(
+                'by_office', lambda: self.office_balances(office_id)
+            )
         return Response({"error": "Требуется параметр office_id"}, status=400)
+
+    def office_balances(self, office_id):
+        balances = self.filter_queryset(self.get_queryset()).filter(
+            office_id=office_id
+        )
+        response = self.fast_list_response(balances)
+        if response is not None:
+            return response
+        serializer = self.get_serializer(balances, many=True)
+        return Response(serializer.data)
+
+
+class ReferenceSyncViewSet(viewsets.ViewSet):
+    """Изменения справочников с версии, которая есть у клиента.
+
+    `?currencies=12&rates=40` - последние полученные версии таблиц; таблицы
+    без версии отдаются целиком. Клиент видит те таблицы, которые может
+    читать: офисы - после входа, балансы - владелец.
+    """
+    permission_classes = []
+    throttle_classes = [TokenBucketThrottle]
+
+    def list(self, request):
+        seen = ReferenceSyncSerializer(data=request.query_params)
+        seen.is_valid(raise_exception=True)
+        return Response(changes_since(request, seen.validated_data))
@@ -1,5 +1,20 @@
+from urllib.parse import urlencode
+
 from django.contrib import admin
-from orders.models import Order, OrderDocument, OrderItem, Review
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+from orders.models import (
+    ArchivedOrder,
+    ArchivedOrderDocument,
+    ArchivedOrderItem,
+    Order,
+    OrderDocument,
+    OrderEvent,
+    OrderItem,
+    OrderNotification,
+    Review,
+)
 
 
 class OrderItemInline(admin.TabularInline):
@@ -19,10 +34,29 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'office',
                     'status', 'created_at', 'has_delivery')
     list_filter = ('status', 'office', 'created_at')
-    search_fields = ('id', 'user__username', 'user__email')
+    search_fields = ('id', 'tracking_code', 'telegram', 'whatsapp',
+                     'user__username', 'user__email')
     inlines = [OrderItemInline, OrderDocumentInline]
     ordering = ('-created_at',)
 
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        # Старые заказы перенесены в архив: предлагаем тот же поиск там
+        if search_term and not queryset.exists():
+            archived = ArchivedOrderAdmin(ArchivedOrder, self.admin_site)
+            found, _ = archived.get_search_results(
+                request, ArchivedOrder.objects.all(), search_term
+            )
+            if found.exists():
+                url = reverse('admin:orders_archivedorder_changelist')
+                self.message_user(request, format_html(
+                    'Найдены архивные заказы: <a href="{}?{}">открыть</a>',
+                    url, urlencode({'q': search_term}),
+                ))
+        return queryset, may_have_duplicates
+
     def has_delivery(self, obj):
         return bool(obj.delivery_address)
     has_delivery.short_description = 'Доставка'
@@ -35,3 +69,66 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ('rating', 'is_visible')
     search_fields = ('order__id', 'text')
     ordering = ('-created_at',)
+
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'order_id', 'status',
+                    'attempts', 'available_at', 'created_at')
+    list_filter = ('status', 'event_type')
+    search_fields = ('order_id',)
+    readonly_fields = ('event_type', 'order_id', 'payload', 'attempts',
+                       'last_error', 'created_at', 'processed_at')
+    ordering = ('-id',)
+    actions = ['retry_events']
+
+    @admin.action(description='Повторить обработку')
+    def retry_events(self, request, queryset):
+        queryset.exclude(status=OrderEvent.PROCESSED).update(
+            status=OrderEvent.PENDING,
+            attempts=0,
+            available_at=timezone.now(),
+        )
+
+
+@admin.register(OrderNotification)
+class OrderNotificationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order_id', 'channel', 'recipient', 'status',
+                    'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'channel')
+    search_fields = ('order_id', 'recipient')
+    readonly_fields = ('order_id', 'event_id', 'payload', 'attempts',
+                       'last_error', 'created_at', 'sent_at')
+    ordering = ('-id',)
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    fields = ('from_currency', 'amount_from',
+              'to_currency', 'amount_to', 'rate')
+    readonly_fields = fields
+    can_delete = False
+
+
+class ArchivedOrderDocumentInline(admin.TabularInline):
+    model = ArchivedOrderDocument
+    extra = 0
+    readonly_fields = ('document_type', 'file', 'uploaded_at', 'uploaded_by')
+    can_delete = False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'office', 'status',
+                    'created_at', 'archived_at')
+    list_filter = ('status', 'office')
+    search_fields = OrderAdmin.search_fields
+    inlines = [ArchivedOrderItemInline, ArchivedOrderDocumentInline]
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
+
+    def ready(self):
+        from core.cache import register_namespace
+        from orders import signals  # noqa: F401
+        from orders.models import Review, ReviewStats
+        from orders.reviews import REVIEWS_NAMESPACE
+
+        register_namespace(REVIEWS_NAMESPACE, Review, ReviewStats)
@@ -0,0 +1,86 @@
+"""Archival of completed and cancelled orders.
+
+Orders in a final status that haven't changed for
+`settings.ORDER_ARCHIVE_AFTER_DAYS` are moved, together with their items,
+documents and review, into the `Archived*` tables. Each batch is a single
+transaction and copies rows with `ignore_conflicts`, so an interrupted run
+is simply resumed by starting the command again.
+
+Archived reviews still count in the rating statistics (`ReviewStats`,
+`orders.reviews.rebuild_stats`) but leave the public feed, which shows
+reviews of live orders only.
+"""
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from orders.models import (
+    ArchivedOrder,
+    ArchivedOrderDocument,
+    ArchivedOrderItem,
+    ArchivedReview,
+    Order,
+    OrderDocument,
+    OrderItem,
+    Review,
+)
+from orders.reviews import invalidate_feed
+
+ARCHIVABLE_STATUSES = ('completed', 'cancelled')
+
+
+def archivable_orders(older_than_days):
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Order.objects.filter(
+        status__in=ARCHIVABLE_STATUSES,
+        updated_at__lt=cutoff,
+    ).order_by('id')
+
+
+def archive_batch(older_than_days, batch_size=500):
+    """Move one batch of orders to the archive. Returns the batch size."""
+    queryset = archivable_orders(older_than_days)
+
+    with transaction.atomic():
+        if connections[queryset.db].features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        order_ids = list(queryset.values_list('id', flat=True)[:batch_size])
+        if not order_ids:
+            return 0
+
+        _copy_rows(Order.objects.filter(id__in=order_ids), ArchivedOrder)
+        _copy_rows(
+            OrderItem.objects.filter(order_id__in=order_ids),
+            ArchivedOrderItem
+        )
+        _copy_rows(
+            OrderDocument.objects.filter(order_id__in=order_ids),
+            ArchivedOrderDocument
+        )
+        _copy_rows(
+            Review.objects.filter(order_id__in=order_ids),
+            ArchivedReview
+        )
+
+        # Документы удаляются без сигналов: иначе django-cleanup удалит
+        # файлы, на которые теперь ссылается архив
+        documents = OrderDocument.objects.filter(order_id__in=order_ids)
+        documents._raw_delete(documents.db)
+        # Отзывы тоже: сигнал удаления вычел бы их из статистики рейтинга,
+        # а она учитывает и архивные отзывы
+        reviews = Review.objects.filter(order_id__in=order_ids)
+        if reviews._raw_delete(reviews.db):
+            transaction.on_commit(invalidate_feed)
+        Order.objects.filter(id__in=order_ids).delete()
+
+    return len(order_ids)
+
+
+def _copy_rows(queryset, archive_model):
+    """Copy rows column by column into the archive table."""
+    columns = [field.attname for field in queryset.model._meta.concrete_fields]
+    archive_model.objects.bulk_create(
+        [archive_model(**row) for row in queryset.values(*columns)],
+        ignore_conflicts=True,
+    )
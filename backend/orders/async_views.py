@@ -0,0 +1,42 @@
+"""Async versions of the busiest public order endpoints (see core.asyncviews).
+
+Handlers return None when the regular DRF view should answer instead.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+
+from core.asyncviews import json_response
+from orders.reviews import acached_feed
+from orders.selectors import order_by_tracking_code, reviews_for_user
+from orders.serializers import OrderTrackingSerializer, ReviewPublicSerializer
+from orders.views import PublicReviewPagination
+
+
+async def order_tracking(request, tracking_code):
+    order = await sync_to_async(order_by_tracking_code)(tracking_code)
+    if order is None:
+        return None
+    return json_response(OrderTrackingSerializer(order).data)
+
+
+async def review_list_public(request):
+    paginator = PublicReviewPagination()
+    page_number = request.query_params.get(paginator.page_query_param, '1')
+    if not page_number.isdigit():
+        return None
+
+    def build():
+        # Тот же ключ и то же содержимое, что у ReviewViewSet.list_public
+        page = paginator.paginate_queryset(
+            reviews_for_user('list_public', AnonymousUser()), request
+        )
+        serializer = ReviewPublicSerializer(
+            page, many=True, context={'request': request}
+        )
+        return paginator.cached_page(serializer.data)
+
+    cached = await acached_feed(
+        'page', page_number, paginator.get_page_size(request), build=build
+    )
+    return json_response(paginator.page_data(request, page_number, cached))
+
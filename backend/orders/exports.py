@@ -0,0 +1,181 @@
+"""Streaming export of orders with their items.
+
+Rows are read with `QuerySet.iterator(chunk_size=...)` over `values_list()`,
+which uses a server-side cursor on PostgreSQL, so memory use does not depend
+on the number of exported rows. CSV is produced line by line; XLSX is
+written by openpyxl in write-only mode, which keeps rows in a temporary
+file on disk until the workbook is saved.
+
+Archived orders (orders.archive) are exported together with live ones:
+the rows of `OrderItem` and `ArchivedOrderItem` are read in one UNION ALL
+query.
+
+Text cells starting with `=`, `+`, `-`, `@`, tab or CR get a leading `'`,
+so spreadsheets don't run client-controlled values as formulas.
+
+Server-side cursors don't work behind pgbouncer in transaction pooling
+mode, set `DISABLE_SERVER_SIDE_CURSORS` for such a database.
+"""
+import codecs
+import csv
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from orders.models import ArchivedOrderItem, Order, OrderItem
+
+CSV = 'csv'
+XLSX = 'xlsx'
+FORMAT_CHOICES = [
+    (CSV, 'CSV'),
+    (XLSX, 'Excel'),
+]
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    XLSX: (
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    ),
+}
+
+EXPORT_CHUNK_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024
+
+# (поле values_list, заголовок колонки)
+EXPORT_COLUMNS = [
+    ('order_id', 'Заказ'),
+    ('order__tracking_code', 'Код отслеживания'),
+    ('order__created_at', 'Создан'),
+    ('order__status', 'Статус'),
+    ('order__office__name', 'Обменный пункт'),
+    ('order__user__email', 'Email клиента'),
+    ('order__telegram', 'Telegram'),
+    ('order__whatsapp', 'WhatsApp'),
+    ('from_currency__code', 'Из валюты'),
+    ('amount_from', 'Сумма обмена'),
+    ('to_currency__code', 'В валюту'),
+    ('amount_to', 'Сумма к получению'),
+    ('rate', 'Курс'),
+]
+# Служебные поля для форматирования сумм и порядка строк, в файл не попадают
+_EXTRA_FIELDS = [
+    'from_currency__decimal_places',
+    'to_currency__decimal_places',
+    'id',
+]
+
+# Начала ячеек, которые табличные редакторы считают формулой
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def export_items(status=None, office=None, date_from=None, date_to=None):
+    """Return rows of live and archived order items to export.
+
+    Dates filter by order creation. The result is a `values_list()` union
+    for `export_rows`.
+    """
+    filters = {
+        'status': status, 'office': office,
+        'date_from': date_from, 'date_to': date_to,
+    }
+    fields = [field for field, _ in EXPORT_COLUMNS] + _EXTRA_FIELDS
+    live = _filter_items(OrderItem.objects.all(), **filters)
+    archived = _filter_items(ArchivedOrderItem.objects.all(), **filters)
+    return live.values_list(*fields).union(
+        archived.values_list(*fields), all=True
+    ).order_by('order_id', 'id')
+
+
+def _filter_items(queryset, status, office, date_from, date_to):
+    if status:
+        queryset = queryset.filter(order__status=status)
+    if office:
+        queryset = queryset.filter(order__office_id=office)
+    if date_from:
+        queryset = queryset.filter(
+            order__created_at__gte=_start_of_day(date_from)
+        )
+    if date_to:
+        queryset = queryset.filter(
+            order__created_at__lt=_start_of_day(date_to + timedelta(days=1))
+        )
+    return queryset
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield rows of plain values in the order of EXPORT_COLUMNS."""
+    fields = [field for field, _ in EXPORT_COLUMNS]
+    statuses = dict(Order.STATUS_CHOICES)
+    index = {field: position for position, field in enumerate(fields)}
+
+    for values in queryset.iterator(chunk_size=chunk_size):
+        row = [escape_formula(value) for value in values[:len(fields)]]
+        from_places, to_places, _ = values[len(fields):]
+        row[index['order__created_at']] = timezone.localtime(
+            row[index['order__created_at']]
+        ).replace(tzinfo=None, microsecond=0)
+        row[index['order__status']] = statuses.get(
+            row[index['order__status']], row[index['order__status']]
+        )
+        row[index['amount_from']] = round(row[index['amount_from']],
+                                          from_places)
+        row[index['amount_to']] = round(row[index['amount_to']], to_places)
+        yield row
+
+
+def iter_csv(rows):
+    """Yield the CSV file chunk by chunk."""
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открыл файл в UTF-8
+    yield codecs.BOM_UTF8
+    yield writer.writerow([title for _, title in EXPORT_COLUMNS]).encode()
+    for row in rows:
+        yield writer.writerow(
+            ['' if value is None else value for value in row]
+        ).encode()
+
+
+def iter_xlsx(rows):
+    """Build the workbook in write-only mode and yield the file."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Заказы')
+    sheet.append([title for _, title in EXPORT_COLUMNS])
+    for row in rows:
+        sheet.append(row)
+
+    with tempfile.TemporaryFile() as file:
+        workbook.save(file)
+        file.seek(0)
+        while chunk := file.read(FILE_CHUNK_SIZE):
+            yield chunk
+
+
+def iter_export(file_format, rows):
+    if file_format == XLSX:
+        return iter_xlsx(rows)
+    return iter_csv(rows)
+
+
+def export_filename(file_format):
+    return f"orders-{timezone.localdate():%Y%m%d}.{file_format}"
+
+
+def escape_formula(value):
+    """Prefix text that a spreadsheet would treat as a formula with `'`."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+class _LineBuffer:
+    """File-like object returning what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def _start_of_day(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
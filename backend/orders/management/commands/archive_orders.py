@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.archive import archive_batch
+
+
+class Command(BaseCommand):
+    help = 'Move old completed and cancelled orders to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help='Archive orders not updated for this many days',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of orders moved in one transaction',
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Stop after this many batches (the next run resumes)',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            moved = archive_batch(
+                options['older_than_days'], options['batch_size']
+            )
+            if not moved:
+                break
+            total += moved
+            batches += 1
+            self.stdout.write(f'Archived {total} orders')
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} orders'))
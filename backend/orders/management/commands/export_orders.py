@@ -0,0 +1,57 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from orders.exports import CSV, XLSX, export_items, export_rows, iter_export
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Export orders with their items to CSV or XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', required=True, help='File to write')
+        parser.add_argument(
+            '--file-format',
+            choices=[CSV, XLSX],
+            default=CSV,
+        )
+        parser.add_argument(
+            '--status',
+            choices=[value for value, _ in Order.STATUS_CHOICES],
+        )
+        parser.add_argument('--office', type=int, help='Exchange office id')
+        parser.add_argument(
+            '--date-from',
+            type=date.fromisoformat,
+            help='First day of order creation, YYYY-MM-DD',
+        )
+        parser.add_argument(
+            '--date-to',
+            type=date.fromisoformat,
+            help='Last day of order creation, YYYY-MM-DD',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched from the database at a time',
+        )
+
+    def handle(self, *args, **options):
+        queryset = export_items(
+            status=options['status'],
+            office=options['office'],
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+        )
+        chunks = iter_export(
+            options['file_format'],
+            export_rows(queryset, options['chunk_size'])
+        )
+        with open(options['output'], 'wb') as file:
+            for chunk in chunks:
+                file.write(chunk)
+        self.stdout.write(
+            self.style.SUCCESS(f"Exported orders to {options['output']}")
+        )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import Order
+from orders.search import index_orders
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the operator search index for all orders'
+
+    def handle(self, *args, **options):
+        total = index_orders(Order.objects.order_by('id'))
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} orders'))
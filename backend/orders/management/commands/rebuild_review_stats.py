@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from orders.reviews import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recount review rating statistics from visible reviews'
+
+    def handle(self, *args, **options):
+        offices = rebuild_stats()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt review stats for {offices} offices')
+        )
@@ -0,0 +1,67 @@
+import asyncio
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.notifications import (
+    WebhookDispatcher,
+    claim_notifications,
+    get_endpoints,
+    record_results,
+)
+
+
+class Command(BaseCommand):
+    help = 'Send queued order notifications to the messenger webhooks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of notifications claimed per batch',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.NOTIFICATION_CONCURRENCY,
+            help='Maximum number of requests in flight',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit instead of polling forever',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            total = async_to_sync(self.run)(**options)
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(
+            self.style.SUCCESS(f'Processed {total} notifications')
+        )
+
+    async def run(self, batch_size, concurrency, sleep, once, **options):
+        total = 0
+        dispatcher = WebhookDispatcher(
+            get_endpoints(), concurrency=concurrency
+        )
+        async with dispatcher:
+            while True:
+                batch = await sync_to_async(claim_notifications)(batch_size)
+                if batch:
+                    errors = await dispatcher.send_all(batch)
+                    await sync_to_async(record_results)(batch, errors)
+                    total += len(batch)
+                    continue
+                if once:
+                    return total
+                await asyncio.sleep(sleep)
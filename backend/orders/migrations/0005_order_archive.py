@@ -0,0 +1,126 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:33
+
+import django.db.models.deletion
+import orders.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0001_initial'),
+        ('orders', '0004_order_notification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('tracking_code', models.CharField(max_length=10, unique=True, verbose_name='Код отслеживания')),
+                ('status', models.CharField(choices=[('new', 'Новый'), ('processing', 'В обработке'), ('waiting_delivery', 'Ожидает выдачу'), ('completed', 'Выполнен'), ('cancelled', 'Отменён')], max_length=20, verbose_name='Статус')),
+                ('whatsapp', models.CharField(blank=True, max_length=20, verbose_name='WhatsApp')),
+                ('telegram', models.CharField(blank=True, max_length=50, verbose_name='Telegram')),
+                ('needs_delivery', models.BooleanField(default=False, verbose_name='Требуется доставка')),
+                ('delivery_address', models.TextField(blank=True, null=True, verbose_name='Адрес доставки')),
+                ('comment', models.TextField(blank=True, verbose_name='Комментарий')),
+                ('created_at', models.DateTimeField(verbose_name='Создан')),
+                ('updated_at', models.DateTimeField(verbose_name='Обновлён')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='В архиве с')),
+            ],
+            options={
+                'verbose_name': 'Архивный заказ',
+                'verbose_name_plural': 'Архив заказов',
+                'ordering': ['-created_at'],
+            },
+            bases=(orders.models.OrderTotalsMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderDocument',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('document_type', models.CharField(choices=[('receipt', 'Квитанция об оплате'), ('chat', 'Скриншот чата')], max_length=20, verbose_name='Тип документа')),
+                ('file', models.FileField(upload_to=orders.models.order_document_path, verbose_name='Файл')),
+                ('uploaded_at', models.DateTimeField(verbose_name='Время загрузки')),
+            ],
+            options={
+                'verbose_name': 'Документ архивного заказа',
+                'verbose_name_plural': 'Документы архивных заказов',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount_from', models.DecimalField(decimal_places=10, max_digits=20, verbose_name='Сумма обмена')),
+                ('amount_to', models.DecimalField(decimal_places=10, max_digits=20, verbose_name='Сумма к получению')),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=20, verbose_name='Курс обмена')),
+            ],
+            options={
+                'verbose_name': 'Элемент архивного заказа',
+                'verbose_name_plural': 'Элементы архивных заказов',
+            },
+            bases=(orders.models.OrderItemFormattingMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='ArchivedReview',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('rating', models.PositiveSmallIntegerField(verbose_name='Оценка')),
+                ('text', models.TextField(verbose_name='Текст отзыва')),
+                ('created_at', models.DateTimeField(verbose_name='Создан')),
+                ('is_visible', models.BooleanField(default=True, verbose_name='Отображать на сайте')),
+            ],
+            options={
+                'verbose_name': 'Архивный отзыв',
+                'verbose_name_plural': 'Архивные отзывы',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'updated_at'], name='orders_status_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='office',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='exchange.exchangeoffice', verbose_name='Обменный пункт'),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddField(
+            model_name='archivedorderdocument',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='orders.archivedorder', verbose_name='Заказ'),
+        ),
+        migrations.AddField(
+            model_name='archivedorderdocument',
+            name='uploaded_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Кто загрузил'),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='from_currency',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='exchange.currency', verbose_name='Из валюты'),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.archivedorder', verbose_name='Заказ'),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='to_currency',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='exchange.currency', verbose_name='В валюту'),
+        ),
+        migrations.AddField(
+            model_name='archivedreview',
+            name='order',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='review', to='orders.archivedorder', verbose_name='Заказ'),
+        ),
+    ]
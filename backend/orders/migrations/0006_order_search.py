@@ -0,0 +1,120 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:35
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+POSTGRESQL_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    "CREATE INDEX orders_search_tsv_idx ON orders_ordersearchentry "
+    "USING gin (to_tsvector('simple', content))",
+    'CREATE INDEX orders_search_trgm_idx ON orders_ordersearchentry '
+    'USING gin (content gin_trgm_ops)',
+]
+POSTGRESQL_REVERSE = [
+    'DROP INDEX IF EXISTS orders_search_trgm_idx',
+    'DROP INDEX IF EXISTS orders_search_tsv_idx',
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE orders_ordersearch_fts USING fts5("
+    "content, content='orders_ordersearchentry', "
+    "content_rowid='order_id', tokenize='trigram')",
+    'CREATE TRIGGER orders_ordersearch_ai AFTER INSERT '
+    'ON orders_ordersearchentry BEGIN '
+    'INSERT INTO orders_ordersearch_fts(rowid, content) '
+    'VALUES (new.order_id, new.content); END',
+    'CREATE TRIGGER orders_ordersearch_ad AFTER DELETE '
+    'ON orders_ordersearchentry BEGIN '
+    "INSERT INTO orders_ordersearch_fts(orders_ordersearch_fts, rowid, "
+    "content) VALUES ('delete', old.order_id, old.content); END",
+    'CREATE TRIGGER orders_ordersearch_au AFTER UPDATE '
+    'ON orders_ordersearchentry BEGIN '
+    "INSERT INTO orders_ordersearch_fts(orders_ordersearch_fts, rowid, "
+    "content) VALUES ('delete', old.order_id, old.content); "
+    'INSERT INTO orders_ordersearch_fts(rowid, content) '
+    'VALUES (new.order_id, new.content); END',
+]
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS orders_ordersearch_au',
+    'DROP TRIGGER IF EXISTS orders_ordersearch_ad',
+    'DROP TRIGGER IF EXISTS orders_ordersearch_ai',
+    'DROP TABLE IF EXISTS orders_ordersearch_fts',
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {
+        'postgresql': POSTGRESQL_FORWARD,
+        'sqlite': SQLITE_FORWARD,
+    }.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {
+        'postgresql': POSTGRESQL_REVERSE,
+        'sqlite': SQLITE_REVERSE,
+    }.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def build_content(order):
+    # Копия orders.search.build_content на момент миграции: миграция не
+    # должна зависеть от текущего кода приложения
+    parts = [
+        order.tracking_code,
+        order.telegram,
+        order.whatsapp,
+        order.comment,
+        order.delivery_address,
+        order.user.email if order.user_id else '',
+    ]
+    digits = re.sub(r'\D', '', order.whatsapp or '')
+    if digits and digits != order.whatsapp:
+        parts.append(digits)
+    return '\n'.join(part for part in parts if part)
+
+
+def index_existing_orders(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderSearchEntry = apps.get_model('orders', 'OrderSearchEntry')
+    orders = Order.objects.select_related('user').iterator(chunk_size=500)
+    batch = []
+    for order in orders:
+        batch.append(OrderSearchEntry(
+            order_id=order.pk, content=build_content(order)
+        ))
+        if len(batch) >= 500:
+            OrderSearchEntry.objects.bulk_create(batch)
+            batch = []
+    OrderSearchEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSearchEntry',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='orders.order', verbose_name='Заказ')),
+                ('content', models.TextField(verbose_name='Текст для поиска')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Поисковый индекс заказа',
+                'verbose_name_plural': 'Поисковый индекс заказов',
+            },
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(index_existing_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def count_existing_reviews(apps, schema_editor):
+    Review = apps.get_model('orders', 'Review')
+    ReviewStats = apps.get_model('orders', 'ReviewStats')
+    rows = (
+        Review.objects.filter(is_visible=True)
+        .values('order__office_id')
+        .annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{
+                f'rating_{rating}': Count('id', filter=Q(rating=rating))
+                for rating in range(1, 6)
+            },
+        )
+        .order_by()
+    )
+    ReviewStats.objects.bulk_create([
+        ReviewStats(office_id=row.pop('order__office_id'), **row)
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0001_initial'),
+        ('orders', '0006_order_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewStats',
+            fields=[
+                ('office', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stats', serialize=False, to='exchange.exchangeoffice', verbose_name='Обменный пункт')),
+                ('review_count', models.IntegerField(default=0, verbose_name='Отзывов')),
+                ('rating_sum', models.IntegerField(default=0, verbose_name='Сумма оценок')),
+                ('rating_1', models.IntegerField(default=0, verbose_name='Оценок 1')),
+                ('rating_2', models.IntegerField(default=0, verbose_name='Оценок 2')),
+                ('rating_3', models.IntegerField(default=0, verbose_name='Оценок 3')),
+                ('rating_4', models.IntegerField(default=0, verbose_name='Оценок 4')),
+                ('rating_5', models.IntegerField(default=0, verbose_name='Оценок 5')),
+            ],
+            options={
+                'verbose_name': 'Статистика отзывов',
+                'verbose_name_plural': 'Статистика отзывов',
+            },
+        ),
+        migrations.RunPython(count_existing_reviews, migrations.RunPython.noop),
+    ]
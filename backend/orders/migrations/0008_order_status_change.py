@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-19 19:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0002_reference_sync'),
+        ('orders', '0007_review_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField(verbose_name='ID заказа')),
+                ('old_status', models.CharField(blank=True, max_length=20, verbose_name='Прежний статус')),
+                ('new_status', models.CharField(blank=True, max_length=20, verbose_name='Новый статус')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменён')),
+                ('duration', models.DurationField(blank=True, null=True, verbose_name='Время в прежнем статусе')),
+                ('counted', models.BooleanField(default=False, verbose_name='Учтён в SLA')),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exchange.exchangeoffice', verbose_name='Обменный пункт')),
+            ],
+            options={
+                'verbose_name': 'Смена статуса заказа',
+                'verbose_name_plural': 'История статусов заказов',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['order_id', 'changed_at'], name='orders_status_change_order_idx'), models.Index(condition=models.Q(('counted', False)), fields=['id'], name='orders_status_change_new_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-19 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_status_change'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderevent',
+            name='event_type',
+            field=models.CharField(choices=[('order_created', 'Заказ создан'), ('status_changed', 'Статус изменён'), ('document_uploaded', 'Документ загружен'), ('office_changed', 'Пункт изменён')], max_length=30, verbose_name='Тип события'),
+        ),
+    ]
@@ -1,15 +1,55 @@
+from decimal import Decimal
+
 import shortuuid
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.core.validators import (
     MinValueValidator,
     MaxValueValidator,
     FileExtensionValidator
 )
-from django.db.models import Sum
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+
+class OrderTotalsMixin:
+    """Итоги заказа. Общие для Order и ArchivedOrder."""
+
+    @property
+    def total_from_amount(self):
+        """Общая сумма к обмену"""
+        return self._items_total('amount_from')
+
+    @property
+    def total_to_amount(self):
+        """Общая сумма к получению"""
+        return self._items_total('amount_to')
+
+    def _items_total(self, field):
+        # Для списков элементы загружены prefetch_related: считаем без запроса
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'items' in prefetched:
+            return sum(
+                (getattr(item, field) for item in prefetched['items']),
+                Decimal(0),
+            ) or 0
+        return self.items.aggregate(total=Sum(field))['total'] or 0
+
+
+class OrderItemFormattingMixin:
+    """Форматирование сумм. Общее для OrderItem и ArchivedOrderItem."""
+
+    def get_formatted_amount_from(self):
+        """Возвращает сумму с правильным количеством знаков после запятой"""
+        return round(self.amount_from, self.from_currency.decimal_places)
+
+    def get_formatted_amount_to(self):
+        """Возвращает сумму с правильным количеством знаков после запятой"""
+        return round(self.amount_to, self.to_currency.decimal_places)
 
 
-class Order(models.Model):
+class Order(OrderTotalsMixin, models.Model):
     """Модель заказа на обмен валюты."""
     STATUS_CHOICES = [
         ('new', 'Новый'),
@@ -68,6 +108,13 @@ class Order(models.Model):
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
         ordering = ['-created_at']
+        indexes = [
+            # Поиск заказов для архивации (см. orders.archive)
+            models.Index(
+                fields=['status', 'updated_at'],
+                name='orders_status_updated_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"Заказ #{self.id} ({self.get_status_display()})"
@@ -98,27 +145,16 @@ class Order(models.Model):
             )
 
         if self.can_transition_to(new_status):
-            self.status = new_status
-            self.save()
+            # История статусов и событие пишет сигнал post_save
+            # (orders.signals) в этой же транзакции
+            with transaction.atomic():
+                self.status = new_status
+                self.save(update_fields=['status', 'updated_at'])
             return True
         return False
 
-    @property
-    def total_from_amount(self):
-        """Общая сумма к обмену"""
-        return self.items.aggregate(
-            total=Sum('amount_from')
-        )['total'] or 0
-
-    @property
-    def total_to_amount(self):
-        """Общая сумма к получению"""
-        return self.items.aggregate(
-            total=Sum('amount_to')
-        )['total'] or 0
 
-
-class OrderItem(models.Model):
+class OrderItem(OrderItemFormattingMixin, models.Model):
     """Модель элемента заказа (конкретной операции обмена)."""
     order = models.ForeignKey(
         Order,
@@ -142,13 +178,13 @@ class OrderItem(models.Model):
         'Сумма обмена',
         max_digits=20,
         decimal_places=10,
-        validators=[MinValueValidator('0.00000001')]
+        validators=[MinValueValidator(Decimal('0.00000001'))]
     )
     amount_to = models.DecimalField(
         'Сумма к получению',
         max_digits=20,
         decimal_places=10,
-        validators=[MinValueValidator('0.00000001')]
+        validators=[MinValueValidator(Decimal('0.00000001'))]
     )
     rate = models.DecimalField(
         'Курс обмена',
@@ -164,14 +200,6 @@ class OrderItem(models.Model):
         return (f"{self.amount_from} {self.from_currency.code} -> "
                 f"{self.amount_to} {self.to_currency.code}")
 
-    def get_formatted_amount_from(self):
-        """Возвращает сумму с правильным количеством знаков после запятой"""
-        return round(self.amount_from, self.from_currency.decimal_places)
-
-    def get_formatted_amount_to(self):
-        """Возвращает сумму с правильным количеством знаков после запятой"""
-        return round(self.amount_to, self.to_currency.decimal_places)
-
 
 def order_document_path(instance, filename):
     """Генерация пути для сохранения документов заказа"""
@@ -255,6 +283,449 @@ class Review(models.Model):
     def display_name(self):
         """Возвращает имя для отображения на сайте"""
         user = self.order.user
+        if user is None:
+            return 'Клиент'
         if user.first_name:
             return user.first_name
         return user.username
+
+
+class ReviewStats(models.Model):
+    """Итоги видимых отзывов по обменному пункту (см. orders.reviews).
+
+    Обновляются сигналами при создании, скрытии и удалении отзывов.
+    """
+    office = models.OneToOneField(
+        'exchange.ExchangeOffice',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='review_stats',
+        verbose_name='Обменный пункт'
+    )
+    review_count = models.IntegerField('Отзывов', default=0)
+    rating_sum = models.IntegerField('Сумма оценок', default=0)
+    rating_1 = models.IntegerField('Оценок 1', default=0)
+    rating_2 = models.IntegerField('Оценок 2', default=0)
+    rating_3 = models.IntegerField('Оценок 3', default=0)
+    rating_4 = models.IntegerField('Оценок 4', default=0)
+    rating_5 = models.IntegerField('Оценок 5', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика отзывов'
+        verbose_name_plural = 'Статистика отзывов'
+
+
+class OrderEvent(models.Model):
+    """Событие жизненного цикла заказа (transactional outbox).
+
+    Пишется в той же транзакции, что и само изменение заказа, и
+    доставляется обработчикам командой `process_outbox`.
+    """
+    ORDER_CREATED = 'order_created'
+    STATUS_CHANGED = 'status_changed'
+    DOCUMENT_UPLOADED = 'document_uploaded'
+    OFFICE_CHANGED = 'office_changed'
+    TYPE_CHOICES = [
+        (ORDER_CREATED, 'Заказ создан'),
+        (STATUS_CHANGED, 'Статус изменён'),
+        (DOCUMENT_UPLOADED, 'Документ загружен'),
+        (OFFICE_CHANGED, 'Пункт изменён'),
+    ]
+
+    PENDING = 'pending'
+    PROCESSED = 'processed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает обработки'),
+        (PROCESSED, 'Обработано'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    event_type = models.CharField(
+        'Тип события',
+        max_length=30,
+        choices=TYPE_CHOICES
+    )
+    # Без внешнего ключа: событие должно пережить удаление заказа
+    order_id = models.BigIntegerField('ID заказа', db_index=True)
+    payload = models.JSONField(
+        'Данные',
+        default=dict,
+        encoder=DjangoJSONEncoder
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    available_at = models.DateTimeField(
+        'Доступно для обработки',
+        default=timezone.now
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    processed_at = models.DateTimeField('Обработано', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Событие заказа'
+        verbose_name_plural = 'События заказов'
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['status', 'available_at'],
+                name='orders_event_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_event_type_display()} (заказ #{self.order_id})"
+
+    @classmethod
+    def record(cls, order, event_type, **payload):
+        """Записывает событие. Вызывать внутри транзакции изменения."""
+        return cls.objects.create(
+            event_type=event_type,
+            order_id=order.pk,
+            payload=payload
+        )
+
+
+class OrderStatusChange(models.Model):
+    """Переход заказа в статус (история для SLA, см. reports.sla).
+
+    Пишется сигналами orders.signals при создании заказа (без прежнего
+    статуса), при любом сохранении с новым статусом и при удалении
+    незавершённого заказа (без нового статуса). Перенос незавершённого
+    заказа в другой пункт - пара строк: выход из статуса в прежнем пункте
+    и вход в него в новом.
+    """
+    # Без внешнего ключа: история переживает архивацию заказа
+    order_id = models.BigIntegerField('ID заказа')
+    office = models.ForeignKey(
+        'exchange.ExchangeOffice',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Обменный пункт'
+    )
+    old_status = models.CharField('Прежний статус', max_length=20, blank=True)
+    new_status = models.CharField('Новый статус', max_length=20, blank=True)
+    changed_at = models.DateTimeField('Изменён', default=timezone.now)
+    # Пусто, если неизвестно, когда заказ перешёл в прежний статус
+    duration = models.DurationField(
+        'Время в прежнем статусе',
+        null=True,
+        blank=True
+    )
+    counted = models.BooleanField('Учтён в SLA', default=False)
+
+    class Meta:
+        verbose_name = 'Смена статуса заказа'
+        verbose_name_plural = 'История статусов заказов'
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['order_id', 'changed_at'],
+                name='orders_status_change_order_idx'
+            ),
+            models.Index(
+                fields=['id'],
+                condition=Q(counted=False),
+                name='orders_status_change_new_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return (f"Заказ #{self.order_id}: "
+                f"{self.old_status or '-'} -> {self.new_status or '-'}")
+
+    @classmethod
+    def record(cls, order, old_status, new_status, office_id=None):
+        """Записывает переход. Вызывать внутри транзакции изменения.
+
+        `office_id` - пункт перехода, если заказ уже перенесён в другой.
+        """
+        now = timezone.now()
+        entered_at = None
+        # Время до удаления заказа в SLA не входит
+        if old_status and new_status:
+            entered_at = cls._entered_at(order, old_status)
+        return cls.objects.create(
+            order_id=order.pk,
+            office_id=office_id or order.office_id,
+            old_status=old_status,
+            new_status=new_status,
+            changed_at=now,
+            duration=now - entered_at if entered_at else None,
+        )
+
+    @classmethod
+    def record_office_change(cls, order, old_office_id):
+        """Записывает перенос заказа из пункта `old_office_id`.
+
+        Время в статусе до переноса относится к прежнему пункту, отсчёт
+        в новом пункте начинается с переноса.
+        """
+        now = timezone.now()
+        entered_at = cls._entered_at(order, order.status)
+        return cls.objects.bulk_create([
+            cls(
+                order_id=order.pk,
+                office_id=old_office_id,
+                old_status=order.status,
+                changed_at=now,
+                duration=now - entered_at if entered_at else None,
+            ),
+            cls(
+                order_id=order.pk,
+                office_id=order.office_id,
+                new_status=order.status,
+                changed_at=now,
+            ),
+        ])
+
+    @classmethod
+    def _entered_at(cls, order, status):
+        entered_at = cls.objects.filter(order_id=order.pk).order_by(
+            '-changed_at', '-id'
+        ).values_list('changed_at', flat=True).first()
+        if entered_at is None and status == 'new':
+            entered_at = order.created_at
+        return entered_at
+
+
+class OrderNotification(models.Model):
+    """Уведомление клиента о заказе через webhook мессенджера."""
+    TELEGRAM = 'telegram'
+    WHATSAPP = 'whatsapp'
+    CHANNEL_CHOICES = [
+        (TELEGRAM, 'Telegram'),
+        (WHATSAPP, 'WhatsApp'),
+    ]
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает отправки'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    order_id = models.BigIntegerField('ID заказа', db_index=True)
+    event_id = models.BigIntegerField('ID события', null=True, blank=True)
+    channel = models.CharField(
+        'Канал',
+        max_length=20,
+        choices=CHANNEL_CHOICES
+    )
+    recipient = models.CharField('Получатель', max_length=50)
+    payload = models.JSONField(
+        'Данные',
+        default=dict,
+        encoder=DjangoJSONEncoder
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    available_at = models.DateTimeField(
+        'Доступно для отправки',
+        default=timezone.now
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    sent_at = models.DateTimeField('Отправлено', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+        ordering = ['id']
+        constraints = [
+            # Повторная доставка события outbox не создаёт дубликатов
+            models.UniqueConstraint(
+                fields=['event_id', 'channel'],
+                name='orders_notification_event_channel_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['status', 'available_at'],
+                name='orders_notif_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} {self.recipient} (заказ #{self.order_id})"
+
+
+class OrderSearchEntry(models.Model):
+    """Поисковый документ заказа (см. orders.search).
+
+    Индексируется триграммами/tsvector в PostgreSQL и FTS5 в SQLite.
+    """
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_entry',
+        verbose_name='Заказ'
+    )
+    content = models.TextField('Текст для поиска')
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Поисковый индекс заказа'
+        verbose_name_plural = 'Поисковый индекс заказов'
+
+
+# ----- Архив завершённых и отменённых заказов (см. orders.archive) -----
+# Поля повторяют горячие таблицы один в один, первичные ключи сохраняются.
+
+
+class ArchivedOrder(OrderTotalsMixin, models.Model):
+    """Архивный заказ."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        'users.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Пользователь'
+    )
+    office = models.ForeignKey(
+        'exchange.ExchangeOffice',
+        on_delete=models.PROTECT,
+        related_name='+',
+        verbose_name='Обменный пункт'
+    )
+    tracking_code = models.CharField(
+        'Код отслеживания',
+        max_length=10,
+        unique=True
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=Order.STATUS_CHOICES
+    )
+    whatsapp = models.CharField('WhatsApp', max_length=20, blank=True)
+    telegram = models.CharField('Telegram', max_length=50, blank=True)
+    needs_delivery = models.BooleanField('Требуется доставка', default=False)
+    delivery_address = models.TextField(
+        'Адрес доставки',
+        blank=True,
+        null=True
+    )
+    comment = models.TextField('Комментарий', blank=True)
+    created_at = models.DateTimeField('Создан')
+    updated_at = models.DateTimeField('Обновлён')
+    archived_at = models.DateTimeField('В архиве с', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Архивный заказ'
+        verbose_name_plural = 'Архив заказов'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Архивный заказ #{self.id} ({self.get_status_display()})"
+
+
+class ArchivedOrderItem(OrderItemFormattingMixin, models.Model):
+    """Элемент архивного заказа."""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name='Заказ'
+    )
+    from_currency = models.ForeignKey(
+        'exchange.Currency',
+        related_name='+',
+        on_delete=models.PROTECT,
+        verbose_name='Из валюты'
+    )
+    to_currency = models.ForeignKey(
+        'exchange.Currency',
+        related_name='+',
+        on_delete=models.PROTECT,
+        verbose_name='В валюту'
+    )
+    amount_from = models.DecimalField(
+        'Сумма обмена',
+        max_digits=20,
+        decimal_places=10
+    )
+    amount_to = models.DecimalField(
+        'Сумма к получению',
+        max_digits=20,
+        decimal_places=10
+    )
+    rate = models.DecimalField(
+        'Курс обмена',
+        max_digits=20,
+        decimal_places=10
+    )
+
+    class Meta:
+        verbose_name = 'Элемент архивного заказа'
+        verbose_name_plural = 'Элементы архивных заказов'
+
+
+class ArchivedOrderDocument(models.Model):
+    """Документ архивного заказа. Файл остаётся на прежнем месте."""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='documents',
+        verbose_name='Заказ'
+    )
+    document_type = models.CharField(
+        'Тип документа',
+        max_length=20,
+        choices=OrderDocument.TYPE_CHOICES
+    )
+    file = models.FileField(
+        'Файл',
+        upload_to=order_document_path,
+        max_length=100
+    )
+    uploaded_at = models.DateTimeField('Время загрузки')
+    uploaded_by = models.ForeignKey(
+        'users.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name='Кто загрузил'
+    )
+
+    class Meta:
+        verbose_name = 'Документ архивного заказа'
+        verbose_name_plural = 'Документы архивных заказов'
+
+
+class ArchivedReview(models.Model):
+    """Отзыв к архивному заказу."""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.OneToOneField(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='review',
+        verbose_name='Заказ'
+    )
+    rating = models.PositiveSmallIntegerField('Оценка')
+    text = models.TextField('Текст отзыва')
+    created_at = models.DateTimeField('Создан')
+    is_visible = models.BooleanField('Отображать на сайте', default=True)
+
+    class Meta:
+        verbose_name = 'Архивный отзыв'
+        verbose_name_plural = 'Архивные отзывы'
+        ordering = ['-created_at']
@@ -0,0 +1,304 @@
+"""Order status notifications for Telegram / WhatsApp webhooks.
+
+`handle_status_changed` is an outbox handler (see orders.outbox): it only
+stores `OrderNotification` rows for the contacts of the order. The
+`send_order_notifications` command delivers them with `WebhookDispatcher`,
+an asyncio client that keeps pooled keep-alive connections, bounds the
+number of requests in flight, rate-limits every destination and retries
+transient failures with jitter.
+
+Destinations are configured in `settings.ORDER_NOTIFICATION_WEBHOOKS`::
+
+    {
+        'telegram': {
+            'url': 'https://bot.example.com/notify',
+            'token': '...',            # sent as Bearer token, optional
+            'rate_per_second': 25,     # optional
+        },
+    }
+"""
+import asyncio
+import logging
+import random
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
+
+import httpx
+from django.conf import settings
+from django.utils import timezone
+
+from core.queues import backoff_delay, claim_batch
+from orders.models import Order, OrderNotification
+
+logger = logging.getLogger(__name__)
+
+# Ответы, после которых имеет смысл повторить запрос
+RETRY_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+# Дольше Retry-After воркер не ждёт: уведомление откладывается в очереди
+MAX_RETRY_AFTER_WAIT = 30
+
+
+def get_endpoints():
+    """Return configured webhook endpoints that have a URL."""
+    return {
+        channel: config
+        for channel, config in settings.ORDER_NOTIFICATION_WEBHOOKS.items()
+        if config.get('url')
+    }
+
+
+def handle_status_changed(event):
+    """Outbox handler: queue notifications for the order contacts."""
+    endpoints = get_endpoints()
+    if not endpoints:
+        return
+
+    order = Order.objects.filter(pk=event.order_id).first()
+    if order is None:
+        return
+
+    contacts = {
+        OrderNotification.TELEGRAM: order.telegram,
+        OrderNotification.WHATSAPP: order.whatsapp,
+    }
+    notifications = [
+        OrderNotification(
+            order_id=order.pk,
+            event_id=event.pk,
+            channel=channel,
+            recipient=recipient,
+            payload=build_status_payload(
+                order, event.payload.get('new_status', order.status),
+                channel, recipient,
+            ),
+        )
+        for channel, recipient in contacts.items()
+        if recipient and channel in endpoints
+    ]
+    OrderNotification.objects.bulk_create(
+        notifications, ignore_conflicts=True
+    )
+
+
+def build_status_payload(order, status, channel, recipient):
+    """Payload for the status of the event, not the current one.
+
+    The order may have moved on by the time the event is handled; every
+    transition is still reported with its own status.
+    """
+    status_display = dict(Order.STATUS_CHOICES).get(status, status)
+    return {
+        'channel': channel,
+        'recipient': recipient,
+        'order': {
+            'id': order.pk,
+            'tracking_code': order.tracking_code,
+            'status': status,
+            'status_display': status_display,
+        },
+        'text': (
+            f"Статус заказа {order.tracking_code} изменён: {status_display}"
+        ),
+    }
+
+
+class TokenBucket:
+    """Async token bucket limiting requests per second to one destination."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(self.rate, 1))
+        self.tokens = self.capacity
+        self.updated = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(
+                        self.capacity,
+                        self.tokens + (now - self.updated) * self.rate
+                    )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class WebhookDispatcher:
+    """Sends notifications to webhook endpoints concurrently.
+
+    Use as an async context manager so the connection pool is shared by
+    all batches sent by the worker::
+
+        async with WebhookDispatcher(get_endpoints()) as dispatcher:
+            errors = await dispatcher.send_all(notifications)
+    """
+
+    def __init__(
+        self,
+        endpoints,
+        *,
+        concurrency=100,
+        max_retries=3,
+        retry_backoff=0.5,
+        max_retry_after_wait=MAX_RETRY_AFTER_WAIT,
+        timeout=10.0,
+        transport=None,
+    ):
+        self.endpoints = endpoints
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_after_wait = max_retry_after_wait
+        self.timeout = timeout
+        self.transport = transport
+        self.client = None
+        self._semaphore = None
+        self._limiters = {
+            channel: TokenBucket(config['rate_per_second'])
+            for channel, config in endpoints.items()
+            if config.get('rate_per_second')
+        }
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency,
+                keepalive_expiry=30,
+            ),
+            timeout=self.timeout,
+            transport=self.transport,
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+        self.client = None
+
+    async def send_all(self, notifications):
+        """Send notifications; return a list of errors (None on success)."""
+        return await asyncio.gather(
+            *(self.send(notification) for notification in notifications)
+        )
+
+    async def send(self, notification):
+        """Send one notification; return the error, None on success.
+
+        When the endpoint asks to wait longer than `max_retry_after_wait`
+        seconds, the wait is stored in `notification.retry_after` and the
+        notification goes back to the queue (see `record_results`).
+        """
+        endpoint = self.endpoints.get(notification.channel)
+        if endpoint is None:
+            return f'No webhook configured for {notification.channel}'
+
+        headers = {}
+        if endpoint.get('token'):
+            headers['Authorization'] = f"Bearer {endpoint['token']}"
+
+        error = None
+        delay = None
+        for attempt in range(self.max_retries + 1):
+            if delay is not None:
+                await asyncio.sleep(delay)
+            elif attempt:
+                # Full jitter: повторы разных уведомлений не совпадают
+                await asyncio.sleep(
+                    random.uniform(0, self.retry_backoff * 2 ** attempt)
+                )
+
+            limiter = self._limiters.get(notification.channel)
+            if limiter is not None:
+                await limiter.acquire()
+
+            async with self._semaphore:
+                try:
+                    response = await self.client.post(
+                        endpoint['url'],
+                        json=notification.payload,
+                        headers=headers,
+                    )
+                except httpx.HTTPError as exc:
+                    error = f'{type(exc).__name__}: {exc}'
+                    continue
+
+            if response.status_code < 400:
+                return None
+            error = f'HTTP {response.status_code}'
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+            delay = retry_after(response)
+            if delay is not None and delay > self.max_retry_after_wait:
+                notification.retry_after = delay
+                break
+        return error
+
+
+def retry_after(response):
+    """Seconds from the Retry-After header (delay or HTTP date), or None."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        return None
+    return max((retry_at - timezone.now()).total_seconds(), 0.0)
+
+
+def claim_notifications(batch_size):
+    return claim_batch(
+        OrderNotification.objects.filter(
+            status=OrderNotification.PENDING,
+            available_at__lte=timezone.now(),
+        ).order_by('id'),
+        limit=batch_size,
+        lease_seconds=settings.NOTIFICATION_LEASE_SECONDS,
+    )
+
+
+def record_results(notifications, errors):
+    """Store delivery results of a dispatched batch."""
+    sent = []
+    for notification, error in zip(notifications, errors):
+        if error is None:
+            sent.append(notification.pk)
+            continue
+
+        notification.attempts += 1
+        notification.last_error = error
+        if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            notification.status = OrderNotification.FAILED
+            logger.error(
+                "Notification %s failed after %s attempts: %s",
+                notification.pk, notification.attempts, error
+            )
+        else:
+            delay = backoff_delay(notification.attempts, base=30)
+            # Получатель сам сказал, когда повторить
+            delay = max(delay, getattr(notification, 'retry_after', 0))
+            notification.available_at = timezone.now() + timedelta(
+                seconds=delay
+            )
+        notification.save(update_fields=[
+            'attempts', 'last_error', 'status', 'available_at'
+        ])
+
+    if sent:
+        OrderNotification.objects.filter(pk__in=sent).update(
+            status=OrderNotification.SENT,
+            sent_at=timezone.now(),
+        )
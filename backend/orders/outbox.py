@@ -0,0 +1,95 @@
+"""Delivery of order events from the transactional outbox.
+
+Events are written by `OrderEvent.record()` together with the change
+itself. `process_batch()` hands them to the handlers configured in
+`settings.ORDER_EVENT_HANDLERS`, e.g.::
+
+    ORDER_EVENT_HANDLERS = {
+        'status_changed': ['orders.notifications.handle_status_changed'],
+    }
+
+A handler is a callable taking an `OrderEvent`. Delivery is at-least-once:
+an event is retried with backoff until every handler succeeds, so
+handlers must be idempotent.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.queues import backoff_delay, claim_batch
+from orders.models import OrderEvent
+
+logger = logging.getLogger(__name__)
+
+
+def get_handlers(event_type):
+    """Return handler callables configured for the event type."""
+    handlers = getattr(settings, 'ORDER_EVENT_HANDLERS', {})
+    return [import_string(path) for path in handlers.get(event_type, [])]
+
+
+def pending_events():
+    return OrderEvent.objects.filter(
+        status=OrderEvent.PENDING,
+        available_at__lte=timezone.now(),
+    ).order_by('id')
+
+
+def process_batch(batch_size=None):
+    """Deliver one batch of pending events.
+
+    Returns the number of claimed events, zero means the outbox is empty.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    events = claim_batch(
+        pending_events(),
+        limit=batch_size,
+        lease_seconds=settings.OUTBOX_LEASE_SECONDS,
+    )
+
+    delivered = []
+    for event in events:
+        try:
+            for handler in get_handlers(event.event_type):
+                handler(event)
+        except Exception as exc:  # noqa: BLE001 - any handler error is retried
+            _schedule_retry(event, exc)
+        else:
+            delivered.append(event.pk)
+
+    if delivered:
+        OrderEvent.objects.filter(pk__in=delivered).update(
+            status=OrderEvent.PROCESSED,
+            processed_at=timezone.now(),
+        )
+    return len(events)
+
+
+def _schedule_retry(event, exc):
+    event.attempts += 1
+    event.last_error = ''.join(
+        traceback.format_exception_only(type(exc), exc)
+    ).strip()
+
+    if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        event.status = OrderEvent.FAILED
+        logger.error(
+            "Order event %s failed after %s attempts: %s",
+            event.pk, event.attempts, event.last_error
+        )
+    else:
+        event.available_at = timezone.now() + timedelta(
+            seconds=backoff_delay(event.attempts)
+        )
+        logger.warning(
+            "Order event %s failed (attempt %s), retrying: %s",
+            event.pk, event.attempts, event.last_error
+        )
+
+    event.save(update_fields=[
+        'attempts', 'last_error', 'status', 'available_at'
+    ])
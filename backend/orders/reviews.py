@@ -0,0 +1,126 @@
+"""Public review feed and rating statistics.
+
+Pages of the public feed and the statistics are cached in the 'reviews'
+namespace of core.cache, which is bumped whenever a review changes, so the
+homepage is served from the cache and a changed review is visible at once.
+`ReviewStats` keeps per-office totals of visible reviews, archived ones
+included; signals in orders.signals update them incrementally and the
+overall figures are summed from the office rows.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from core.cache import acached, bump, cached
+from orders.models import ArchivedReview, Review, ReviewStats
+
+RATINGS = range(1, 6)
+
+REVIEWS_NAMESPACE = 'reviews'
+
+
+# ----- Cached feed -----
+
+def invalidate_feed():
+    bump(REVIEWS_NAMESPACE)
+
+
+def cached_feed(name, *parts, build):
+    """Return the cached value for the key, building it on a miss."""
+    return cached(
+        REVIEWS_NAMESPACE, name, *parts,
+        build=build, timeout=settings.REVIEW_FEED_CACHE_TIMEOUT,
+    )
+
+
+async def acached_feed(name, *parts, build):
+    """Async `cached_feed`; the synchronous `build` runs in a thread."""
+    return await acached(
+        REVIEWS_NAMESPACE, name, *parts,
+        build=sync_to_async(build),
+        timeout=settings.REVIEW_FEED_CACHE_TIMEOUT,
+    )
+
+
+# ----- Rating statistics -----
+
+def apply_review(review, sign):
+    """Add (sign=1) or remove (sign=-1) a visible review from the stats."""
+    office_id = review.order.office_id
+    ReviewStats.objects.get_or_create(office_id=office_id)
+    ReviewStats.objects.filter(office_id=office_id).update(
+        review_count=F('review_count') + sign,
+        rating_sum=F('rating_sum') + sign * review.rating,
+        **{
+            f'rating_{review.rating}': (
+                F(f'rating_{review.rating}') + sign
+            )
+        },
+    )
+
+
+def rebuild_stats():
+    """Recount the stats from visible live and archived reviews."""
+    totals = {}
+    for model in (Review, ArchivedReview):
+        rows = (
+            model.objects.filter(is_visible=True)
+            .values('order__office_id')
+            .annotate(
+                review_count=Count('id'),
+                rating_sum=Sum('rating'),
+                **{
+                    f'rating_{rating}': Count('id', filter=Q(rating=rating))
+                    for rating in RATINGS
+                },
+            )
+            .order_by()
+        )
+        for row in rows:
+            office_totals = totals.setdefault(row.pop('order__office_id'), {})
+            for field, value in row.items():
+                office_totals[field] = office_totals.get(field, 0) + value
+    stats = [
+        ReviewStats(office_id=office_id, **office_totals)
+        for office_id, office_totals in totals.items()
+    ]
+    with transaction.atomic():
+        ReviewStats.objects.all().delete()
+        ReviewStats.objects.bulk_create(stats)
+    invalidate_feed()
+    return len(stats)
+
+
+def rating_summary(stats):
+    """Build the API representation of one or several stats rows."""
+    count = sum(row.review_count for row in stats)
+    rating_sum = sum(row.rating_sum for row in stats)
+    return {
+        'count': count,
+        'average': round(rating_sum / count, 2) if count else None,
+        'histogram': {
+            str(rating): sum(getattr(row, f'rating_{rating}') for row in stats)
+            for rating in RATINGS
+        },
+    }
+
+
+def review_statistics():
+    """Overall and per-office rating statistics."""
+    stats = list(
+        ReviewStats.objects.select_related('office').filter(
+            review_count__gt=0
+        ).order_by('office_id')
+    )
+    return {
+        'overall': rating_summary(stats),
+        'offices': [
+            {
+                'office': row.office_id,
+                'office_name': row.office.name,
+                **rating_summary([row]),
+            }
+            for row in stats
+        ],
+    }
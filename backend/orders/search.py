@@ -0,0 +1,155 @@
+"""Operator search over orders.
+
+Every order has an `OrderSearchEntry` row with the searchable text: tracking
+code, contacts, comment, delivery address and user email. The row is kept
+current by the signals in orders.signals and indexed by the database:
+
+* PostgreSQL - a GIN `tsvector` index for words and a GIN trigram index
+  (pg_trgm) for fragments of phone numbers, handles and codes;
+* SQLite - an FTS5 table with the trigram tokenizer, synchronised with
+  the entries by triggers (see migration 0006);
+* other databases fall back to `icontains`.
+
+Archived orders are not indexed: `search_archived_orders` looks through the
+same fields of the archive tables with `icontains`, newest first.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+from orders.models import ArchivedOrder, Order, OrderSearchEntry
+
+SEARCH_RESULTS_LIMIT = 50
+
+# FTS5 trigram tokenizer не находит запросы короче трёх символов
+FTS_MIN_QUERY_LENGTH = 3
+
+FTS_TABLE = 'orders_ordersearch_fts'
+
+# Поля архивного заказа, по которым ищется тот же текст, что в индексе
+ARCHIVE_SEARCH_FIELDS = (
+    'tracking_code', 'telegram', 'whatsapp', 'comment', 'delivery_address',
+    'user__email',
+)
+
+
+# Поля заказа, из которых строится поисковый документ
+INDEXED_FIELDS = frozenset({
+    'tracking_code', 'telegram', 'whatsapp', 'comment', 'delivery_address',
+    'user',
+})
+
+
+def build_content(order):
+    """Return the text indexed for the order."""
+    parts = [
+        order.tracking_code,
+        order.telegram,
+        order.whatsapp,
+        order.comment,
+        order.delivery_address,
+        order.user.email if order.user_id else '',
+    ]
+    # Номер телефона ищется и в виде «только цифры»
+    digits = re.sub(r'\D', '', order.whatsapp or '')
+    if digits and digits != order.whatsapp:
+        parts.append(digits)
+    return '\n'.join(part for part in parts if part)
+
+
+def index_order(order, created=False):
+    """Write the order's search entry: one INSERT or UPDATE."""
+    content = build_content(order)
+    if not created:
+        updated = OrderSearchEntry.objects.filter(order_id=order.pk).update(
+            content=content
+        )
+        if updated:
+            return
+    OrderSearchEntry.objects.create(order_id=order.pk, content=content)
+
+
+def index_orders(queryset):
+    """(Re)index the orders of the queryset. Returns the number of orders."""
+    count = 0
+    for order in queryset.select_related('user').iterator(chunk_size=500):
+        index_order(order)
+        count += 1
+    return count
+
+
+def search_order_ids(query, limit=SEARCH_RESULTS_LIMIT):
+    """Return ids of orders matching the query, best matches first."""
+    query = ' '.join(query.split())
+    if not query:
+        return []
+
+    connection = connections[OrderSearchEntry.objects.db]
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(connection, query, limit)
+    if connection.vendor == 'sqlite' and len(query) >= FTS_MIN_QUERY_LENGTH:
+        return _search_sqlite(connection, query, limit)
+    return list(
+        OrderSearchEntry.objects.filter(content__icontains=query)
+        .order_by('-order_id')
+        .values_list('order_id', flat=True)[:limit]
+    )
+
+
+def search_orders(query, queryset=None, limit=SEARCH_RESULTS_LIMIT):
+    """Return a ranked list of orders from the queryset matching the query."""
+    ids = search_order_ids(query, limit)
+    if queryset is None:
+        queryset = Order.objects.all()
+    orders = queryset.in_bulk(ids)
+    return [orders[pk] for pk in ids if pk in orders]
+
+
+def search_archived_orders(query, queryset=None,
+                           limit=SEARCH_RESULTS_LIMIT):
+    """Return archived orders from the queryset matching the query."""
+    query = ' '.join(query.split())
+    if not query or limit <= 0:
+        return []
+    if queryset is None:
+        queryset = ArchivedOrder.objects.all()
+    condition = Q()
+    for field in ARCHIVE_SEARCH_FIELDS:
+        condition |= Q(**{f'{field}__icontains': query})
+    return list(queryset.filter(condition).order_by('-id')[:limit])
+
+
+def _search_postgresql(connection, query, limit):
+    # Выражения совпадают с индексами из миграции, иначе они не используются
+    sql = f"""
+        SELECT order_id
+        FROM {OrderSearchEntry._meta.db_table}
+        WHERE to_tsvector('simple', content)
+                  @@ plainto_tsquery('simple', %(query)s)
+           OR %(query)s <%% content
+        ORDER BY ts_rank(
+                     to_tsvector('simple', content),
+                     plainto_tsquery('simple', %(query)s)
+                 ) + word_similarity(%(query)s, content) DESC,
+                 order_id DESC
+        LIMIT %(limit)s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'query': query, 'limit': limit})
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_sqlite(connection, query, limit):
+    # Запрос передаётся одной фразой, чтобы символы FTS5 не разбирались
+    phrase = '"{}"'.format(query.replace('"', '""'))
+    sql = f"""
+        SELECT rowid
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH %s
+        ORDER BY bm25({FTS_TABLE}), rowid DESC
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [phrase, limit])
+        return [row[0] for row in cursor.fetchall()]
@@ -1,28 +1,80 @@
 from django.contrib.auth.models import AbstractBaseUser
+from django.db.models import Prefetch
 
-from orders.models import Order, Review
+from orders.models import (
+    ArchivedOrder,
+    ArchivedOrderItem,
+    Order,
+    OrderItem,
+    Review,
+)
 
 # ----- Order selectors -----
 
+STAFF_GROUPS = ['Operators', 'Administrators', 'Owners']
+
+
+def _items(model):
+    """Items with the currencies needed for formatting and totals."""
+    return Prefetch(
+        'items',
+        queryset=model.objects.select_related(
+            'from_currency', 'to_currency'
+        ).order_by('id'),
+    )
+
 
 def orders_for_user(user: AbstractBaseUser):
     """Return orders queryset available for the given user."""
     if user.is_anonymous:
         return Order.objects.none()
 
-    staff_groups = ['Operators', 'Administrators', 'Owners']
-    if user.groups.filter(name__in=staff_groups).exists():
-        return Order.objects.all().prefetch_related('items')
+    if user.groups.filter(name__in=STAFF_GROUPS).exists():
+        return Order.objects.all().prefetch_related(_items(OrderItem))
+
+    return Order.objects.filter(user=user).prefetch_related(
+        _items(OrderItem)
+    )
+
+
+def archived_orders_for_user(user: AbstractBaseUser):
+    """Return archived orders available for the given user."""
+    if user.is_anonymous:
+        return ArchivedOrder.objects.none()
+
+    if user.groups.filter(name__in=STAFF_GROUPS).exists():
+        return ArchivedOrder.objects.all().prefetch_related(
+            _items(ArchivedOrderItem)
+        )
+
+    return ArchivedOrder.objects.filter(
+        user=user
+    ).prefetch_related(_items(ArchivedOrderItem))
+
 
-    return Order.objects.filter(user=user).prefetch_related('items')
+def order_by_tracking_code(tracking_code: str):
+    """Find an order by tracking code, falling back to the archive."""
+    order = Order.objects.prefetch_related(_items(OrderItem)).filter(
+        tracking_code=tracking_code
+    ).first()
+    if order is None:
+        order = ArchivedOrder.objects.prefetch_related(
+            _items(ArchivedOrderItem)
+        ).filter(
+            tracking_code=tracking_code
+        ).first()
+    return order
 
 
 def reviews_for_user(action: str, user: AbstractBaseUser):
     """Return reviews queryset based on current action and user permissions."""
     if action == 'list_public':
-        return Review.objects.filter(is_visible=True)
+        return Review.objects.filter(
+            is_visible=True
+        ).select_related('order__user')
 
+    reviews = Review.objects.select_related('order__user')
     if user.groups.filter(name__in=['Administrators', 'Owners']).exists():
-        return Review.objects.all()
+        return reviews.all()
 
-    return Review.objects.filter(order__user=user) 
\ No newline at end of file
+    return reviews.filter(order__user=user) 
\ No newline at end of file
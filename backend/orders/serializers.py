@@ -1,17 +1,30 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
-from orders.models import Order, OrderDocument, OrderItem, Review
+from core.fieldsets import SparseFieldsetMixin
+from orders.exports import CSV, FORMAT_CHOICES
+from orders.models import Order, OrderDocument, OrderEvent, OrderItem, Review
 from exchange.models import ExchangeRate
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     amount_from_formatted = serializers.SerializerMethodField()
     amount_to_formatted = serializers.SerializerMethodField()
 
     class Meta:
         model = OrderItem
         fields = ['id', 'from_currency', 'to_currency',
-                  'amount_from', 'amount_to', 'rate']
+                  'amount_from', 'amount_to', 'rate',
+                  'amount_from_formatted', 'amount_to_formatted']
+        field_dependencies = {
+            'amount_from_formatted': (
+                'amount_from', 'from_currency__decimal_places',
+            ),
+            'amount_to_formatted': (
+                'amount_to', 'to_currency__decimal_places',
+            ),
+        }
 
     def get_amount_from_formatted(self, obj):
         return obj.get_formatted_amount_from()
@@ -58,12 +71,13 @@ class OrderItemSerializer(serializers.ModelSerializer):
         return data
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
     status_display = serializers.CharField(
         source='get_status_display',
         read_only=True
     )
+    total_items = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
@@ -72,10 +86,20 @@ class OrderSerializer(serializers.ModelSerializer):
             'status', 'status_display',
             'whatsapp', 'telegram', 'needs_delivery', 'delivery_address',
             'comment', 'created_at', 'items',
-            'total_from_amount', 'total_to_amount'
+            'total_from_amount', 'total_to_amount', 'total_items'
         ]
         read_only_fields = ['tracking_code', 'status', 'user', 'created_at',
                             'total_from_amount', 'total_to_amount']
+        # Элементы и итоги требуют отдельного запроса
+        expandable_fields = [
+            'items', 'total_from_amount', 'total_to_amount', 'total_items'
+        ]
+        field_dependencies = {
+            'status_display': ('status',),
+            'total_from_amount': ('items',),
+            'total_to_amount': ('items',),
+            'total_items': ('items',),
+        }
 
     @transaction.atomic
     def create(self, validated_data):
@@ -85,14 +109,17 @@ class OrderSerializer(serializers.ModelSerializer):
         for item_data in items_data:
             OrderItem.objects.create(order=order, **item_data)
 
+        OrderEvent.record(
+            order,
+            OrderEvent.ORDER_CREATED,
+            status=order.status,
+            office_id=order.office_id,
+            user_id=order.user_id,
+        )
         return order
 
-    def to_representation(self, instance):
-        """Добавляем дополнительную информацию при отображении"""
-        data = super().to_representation(instance)
-        data['total_items'] = instance.items.count()
-        data['status_display'] = instance.get_status_display()
-        return data
+    def get_total_items(self, obj):
+        return obj.items.count()
 
 
 class OrderStatusUpdateSerializer(serializers.ModelSerializer):
@@ -112,8 +139,17 @@ class OrderStatusUpdateSerializer(serializers.ModelSerializer):
             )
         return value
 
+    def update(self, instance, validated_data):
+        """Переход выполняется через Order.set_status, который пишет событие"""
+        try:
+            instance.set_status(validated_data['status'])
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError({'status': exc.messages})
+        return instance
 
-class OrderTrackingSerializer(serializers.ModelSerializer):
+
+class OrderTrackingSerializer(SparseFieldsetMixin,
+                              serializers.ModelSerializer):
     """Сериализатор для отслеживания заказа по коду"""
     items = OrderItemSerializer(many=True, read_only=True)
     status_display = serializers.CharField(
@@ -127,16 +163,33 @@ class OrderTrackingSerializer(serializers.ModelSerializer):
             'tracking_code', 'status', 'status_display',
             'created_at', 'items'
         ]
+        expandable_fields = ['items']
+        field_dependencies = {'status_display': ('status',)}
+
 
+class OrderDocumentSerializer(SparseFieldsetMixin,
+                              serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
 
-class OrderDocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderDocument
-        fields = ['id', 'document_type', 'file', 'uploaded_at']
+        fields = ['id', 'document_type', 'file', 'uploaded_at',
+                  'download_url']
         read_only_fields = ['uploaded_at']
+        # Прямая ссылка на MEDIA_URL не отдаётся: файл доступен только
+        # через защищённый download_url
+        extra_kwargs = {'file': {'write_only': True}}
+        field_dependencies = {'download_url': ('order',)}
+
+    def get_download_url(self, obj):
+        return reverse(
+            'order-download-document',
+            kwargs={'pk': obj.order_id, 'document_id': obj.pk},
+            request=self.context.get('request'),
+        )
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = ['id', 'order', 'rating', 'text',
@@ -168,7 +221,8 @@ class ReviewCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class ReviewDetailSerializer(serializers.ModelSerializer):
+class ReviewDetailSerializer(SparseFieldsetMixin,
+                             serializers.ModelSerializer):
     """Сериализатор для детального отображения отзыва"""
     display_name = serializers.CharField(read_only=True)
 
@@ -177,12 +231,47 @@ class ReviewDetailSerializer(serializers.ModelSerializer):
         fields = ['id', 'order', 'rating', 'text', 'created_at',
                   'is_visible', 'display_name']
         read_only_fields = ['created_at', 'display_name']
+        expandable_fields = ['display_name']
+        field_dependencies = {
+            'display_name': (
+                'order__user__first_name', 'order__user__username',
+            ),
+        }
 
 
-class ReviewPublicSerializer(serializers.ModelSerializer):
+class ReviewPublicSerializer(SparseFieldsetMixin,
+                             serializers.ModelSerializer):
     """Сериализатор для публичного отображения отзыва"""
     display_name = serializers.CharField(read_only=True)
 
     class Meta:
         model = Review
         fields = ['rating', 'text', 'created_at', 'display_name']
+        expandable_fields = ['display_name']
+        field_dependencies = {
+            'display_name': (
+                'order__user__first_name', 'order__user__username',
+            ),
+        }
+
+
+class OrderExportFilterSerializer(serializers.Serializer):
+    """Параметры выгрузки заказов"""
+    # Не `format`: этот параметр DRF использует для выбора рендерера
+    file_format = serializers.ChoiceField(
+        choices=FORMAT_CHOICES, default=CSV
+    )
+    status = serializers.ChoiceField(
+        choices=Order.STATUS_CHOICES, required=False
+    )
+    office = serializers.IntegerField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, data):
+        date_from, date_to = data.get('date_from'), data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError(
+                "Дата начала позже даты окончания"
+            )
+        return data
@@ -0,0 +1,131 @@
+"""Keep derived data current: the order search index (orders.search),
+review statistics (orders.reviews) and the status history of orders
+(OrderStatusChange, see reports.sla). The cached public feed is invalidated
+by the 'reviews' cache namespace (see OrdersConfig.ready).
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from orders.models import Order, OrderEvent, OrderStatusChange, Review
+from orders.reviews import apply_review
+from orders.search import INDEXED_FIELDS, index_order, index_orders
+
+
+@receiver(post_save, sender=Order, dispatch_uid='orders_index_order')
+def index_saved_order(sender, instance, created, raw=False,
+                      update_fields=None, **kwargs):
+    if raw:
+        return
+    # Смена статуса (Order.set_status) поисковый документ не меняет
+    if update_fields is not None and not INDEXED_FIELDS & update_fields:
+        return
+    index_order(instance, created=created)
+
+
+@receiver(post_save, sender=Order, dispatch_uid='orders_status_created')
+def record_initial_status(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    OrderStatusChange.record(instance, '', instance.status)
+
+
+@receiver(pre_save, sender=Order, dispatch_uid='orders_order_previous')
+def remember_order_state(sender, instance, raw=False, update_fields=None,
+                         **kwargs):
+    instance._previous_state = None
+    if raw or instance._state.adding:
+        return
+    if (update_fields is not None
+            and not {'status', 'office'} & set(update_fields)):
+        return
+    instance._previous_state = Order.objects.filter(
+        pk=instance.pk
+    ).values_list('status', 'office_id').first()
+
+
+@receiver(post_save, sender=Order, dispatch_uid='orders_order_changed')
+def record_order_changes(sender, instance, created, raw=False, **kwargs):
+    """История статусов и события outbox при любом сохранении заказа.
+
+    Статус меняют Order.set_status, админка и прямой save(): переход
+    пишется здесь, чтобы очереди SLA и итоги не расходились с заказами.
+    """
+    previous = getattr(instance, '_previous_state', None)
+    instance._previous_state = None
+    if raw or created or previous is None:
+        return
+    old_status, old_office_id = previous
+
+    if old_status != instance.status:
+        # Переход засчитывается пункту, где заказ был в прежнем статусе;
+        # перенос в новый пункт пишется ниже
+        OrderStatusChange.record(
+            instance, old_status, instance.status, office_id=old_office_id
+        )
+        OrderEvent.record(
+            instance,
+            OrderEvent.STATUS_CHANGED,
+            old_status=old_status,
+            new_status=instance.status,
+        )
+
+    if old_office_id != instance.office_id:
+        # Завершённый заказ ни в чьей очереди не стоит
+        if Order.STATUS_FLOW.get(instance.status):
+            OrderStatusChange.record_office_change(instance, old_office_id)
+        OrderEvent.record(
+            instance,
+            OrderEvent.OFFICE_CHANGED,
+            old_office=old_office_id,
+            new_office=instance.office_id,
+        )
+
+
+@receiver(post_delete, sender=Order, dispatch_uid='orders_status_deleted')
+def record_deleted_order(sender, instance, **kwargs):
+    # Завершённые заказы удаляются при архивации, в очереди их нет
+    if Order.STATUS_FLOW.get(instance.status):
+        OrderStatusChange.record(instance, instance.status, '')
+
+
+@receiver(
+    post_save,
+    sender=settings.AUTH_USER_MODEL,
+    dispatch_uid='orders_index_user_orders',
+)
+def index_user_orders(sender, instance, created, raw=False,
+                      update_fields=None, **kwargs):
+    # В индекс попадает только email пользователя
+    if raw or created:
+        return
+    if update_fields is not None and 'email' not in update_fields:
+        return
+    index_orders(Order.objects.filter(user=instance))
+
+
+@receiver(pre_save, sender=Review, dispatch_uid='orders_review_previous')
+def remember_review_state(sender, instance, raw=False, **kwargs):
+    instance._previous = None
+    if raw or instance._state.adding:
+        return
+    instance._previous = Review.objects.filter(pk=instance.pk).only(
+        'rating', 'is_visible', 'order'
+    ).first()
+
+
+@receiver(post_save, sender=Review, dispatch_uid='orders_review_saved')
+def update_review_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous is not None and previous.is_visible:
+        apply_review(previous, -1)
+    if instance.is_visible:
+        apply_review(instance, 1)
+
+
+@receiver(post_delete, sender=Review, dispatch_uid='orders_review_deleted')
+def remove_review_stats(sender, instance, **kwargs):
+    if instance.is_visible:
+        apply_review(instance, -1)
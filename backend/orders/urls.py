@@ -1,14 +1,30 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from orders.views import OrderViewSet, OrderTrackingView, ReviewViewSet
+from orders import async_views
+from core.asyncviews import hot_path, router_view
 
 router = DefaultRouter()
 router.register('orders', OrderViewSet, basename='order')
 router.register('reviews', ReviewViewSet, basename='review')
 
+order_tracking_view = OrderTrackingView.as_view()
+
 urlpatterns = [
     path('', include(router.urls)),
     path('track/<str:tracking_code>/',
-         OrderTrackingView.as_view(),
+         order_tracking_view,
+         name='order-tracking'),
+]
+
+# Асинхронные версии для ASGI, подключаются при ASYNC_HOT_ENDPOINTS
+async_urlpatterns = [
+    path('track/<str:tracking_code>/',
+         hot_path(order_tracking_view)(async_views.order_tracking),
          name='order-tracking'),
+    path('reviews/list_public/',
+         hot_path(router_view(router, 'review-list-public'))(
+             async_views.review_list_public
+         ),
+         name='review-list-public'),
 ]
@@ -1,27 +1,69 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, generics, status, permissions
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from users.permissions import (
     IsOperator,
     IsAdministrator,
     IsOwner,
 )
-from orders.models import Order
+from orders.models import Order, OrderEvent
 from orders.serializers import (
+    OrderItemSerializer,
     OrderSerializer,
     ReviewPublicSerializer,
     OrderTrackingSerializer,
     OrderStatusUpdateSerializer,
     OrderDocumentSerializer,
+    OrderExportFilterSerializer,
     ReviewCreateSerializer,
     ReviewDetailSerializer,
 )
-from orders.selectors import orders_for_user, reviews_for_user
+from orders.selectors import (
+    archived_orders_for_user,
+    order_by_tracking_code,
+    orders_for_user,
+    reviews_for_user,
+)
+from orders.exports import (
+    CONTENT_TYPES,
+    export_filename,
+    export_items,
+    export_rows,
+    iter_export,
+)
+from orders.reviews import cached_feed, review_statistics
+from orders.search import (
+    SEARCH_RESULTS_LIMIT,
+    search_archived_orders,
+    search_orders,
+)
+from core.fastpath import FastListMixin, plain_rows
+from core.fieldsets import SparseFieldsetViewMixin, fieldset_key
+from core.sendfile import sendfile_response
+from core.throttling import TokenBucketThrottle
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(SparseFieldsetViewMixin, FastListMixin,
+                   viewsets.ModelViewSet):
     serializer_class = OrderSerializer
+    fast_list_computed = (
+        'status_display', 'items', 'total_from_amount', 'total_to_amount',
+        'total_items',
+    )
+    fast_list_extra = ('pk', 'status')
+    fast_list_item_extra = (
+        'order_id', 'amount_from', 'amount_to',
+        'from_currency__decimal_places', 'to_currency__decimal_places',
+    )
 
     def get_permissions(self):
         if self.action == 'create':
@@ -32,38 +74,202 @@ class OrderViewSet(viewsets.ModelViewSet):
             ]
         elif self.action == 'destroy':
             permission_classes = [IsAdministrator | IsOwner]
+        elif self.action == 'search':
+            permission_classes = [IsOperator | IsAdministrator | IsOwner]
+        elif self.action == 'export':
+            permission_classes = [IsAdministrator | IsOwner]
         else:
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
     def get_queryset(self):
+        if self.action == 'list' and self.request.query_params.get('archived'):
+            # ?archived=1 - история заказов, перенесённых в архив
+            return archived_orders_for_user(self.request.user)
         return orders_for_user(self.request.user)
 
+    def get_order(self):
+        """Заказ из URL; не найденный в рабочей таблице ищется в архиве.
+
+        Для действий чтения: архивный заказ изменить нельзя.
+        """
+        try:
+            return self.get_object()
+        except Http404:
+            # get_object_or_404 из DRF отвечает 404 и на нечисловой id
+            order = generics.get_object_or_404(
+                archived_orders_for_user(self.request.user),
+                pk=self.kwargs['pk'],
+            )
+            self.check_object_permissions(self.request, order)
+            return order
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(self.get_order()).data)
+
+    def fast_list_complete(self, queryset, rows, extra_values):
+        """Поля, которые OrderSerializer берёт из элементов и модели.
+
+        Элементы всех заказов читаются одним запросом, как при
+        prefetch_related в orders_for_user, и только если они нужны
+        запрошенным полям (?fields=, ?expand=).
+        """
+        if not rows:
+            return
+        fields = rows[0].keys()
+        items_by_order = {}
+        if fields & set(OrderSerializer.Meta.expandable_fields):
+            items_by_order = self.fast_list_items(queryset)
+
+        status_names = dict(Order.STATUS_CHOICES)
+        for row, (pk, status_value) in zip(rows, extra_values):
+            order_items = items_by_order.get(pk, [])
+            if 'status_display' in fields:
+                row['status_display'] = status_names.get(
+                    status_value, status_value
+                )
+            if 'items' in fields:
+                row['items'] = [item for item, _, _ in order_items]
+            # Как OrderTotalsMixin: сумма Decimal или 0 без элементов
+            if 'total_from_amount' in fields:
+                row['total_from_amount'] = sum(
+                    (amount for _, amount, _ in order_items), Decimal(0)
+                ) or 0
+            if 'total_to_amount' in fields:
+                row['total_to_amount'] = sum(
+                    (amount for _, _, amount in order_items), Decimal(0)
+                ) or 0
+            if 'total_items' in fields:
+                row['total_items'] = len(order_items)
+
+    def fast_list_items(self, queryset):
+        """Элементы заказов queryset: {order_id: [(item, from, to)]}."""
+        item_model = queryset.model._meta.get_field('items').related_model
+        items, item_values = plain_rows(
+            item_model.objects.filter(
+                order__in=queryset.values('pk')
+            ).order_by('id'),
+            OrderItemSerializer(),
+            computed=('amount_from_formatted', 'amount_to_formatted'),
+            extra=self.fast_list_item_extra,
+        )
+        items_by_order = {}
+        for item, values in zip(items, item_values):
+            order_id, amount_from, amount_to, from_places, to_places = values
+            # Как OrderItem.get_formatted_amount_*: Decimal отдаётся числом
+            item['amount_from_formatted'] = round(amount_from, from_places)
+            item['amount_to_formatted'] = round(amount_to, to_places)
+            items_by_order.setdefault(order_id, []).append(
+                (item, amount_from, amount_to)
+            )
+        return items_by_order
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        # Сигналы пишут историю и события в транзакции изменения заказа
+        with transaction.atomic():
+            serializer.save()
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Поиск заказов для операторов.
+
+        Ищет по коду отслеживания, контактам, комментарию, адресу доставки
+        и email клиента; результаты отсортированы по релевантности.
+        """
+        query = request.query_params.get('q', '').strip()
+        if len(query) < 2:
+            return Response(
+                {'q': ['Введите не менее 2 символов для поиска']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        orders = search_orders(query, queryset=self.get_queryset())
+        if len(orders) < SEARCH_RESULTS_LIMIT:
+            # Архивные заказы в индекс не входят: дополняем выдачу ими
+            orders += search_archived_orders(
+                query,
+                queryset=archived_orders_for_user(request.user),
+                limit=SEARCH_RESULTS_LIMIT - len(orders),
+            )
+
+        serializer = self.get_serializer(orders, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Выгрузка заказов с элементами в CSV или XLSX.
+
+        Файл передаётся потоком, строки читаются из БД частями.
+        """
+        filters = OrderExportFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        file_format = filters.validated_data.pop('file_format')
+
+        rows = export_rows(export_items(**filters.validated_data))
+        response = StreamingHttpResponse(
+            iter_export(file_format, rows),
+            content_type=CONTENT_TYPES[file_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{export_filename(file_format)}"'
+        )
+        return response
+
     @action(detail=True, methods=['post'])
     def upload_document(self, request, pk=None):
         """Загрузка документа к заказу"""
         order = self.get_object()
-        serializer = OrderDocumentSerializer(data=request.data)
+        serializer = OrderDocumentSerializer(
+            data=request.data,
+            context=self.get_serializer_context()
+        )
 
         if serializer.is_valid():
-            serializer.save(
-                order=order,
-                uploaded_by=request.user
-            )
+            with transaction.atomic():
+                document = serializer.save(
+                    order=order,
+                    uploaded_by=request.user
+                )
+                OrderEvent.record(
+                    order,
+                    OrderEvent.DOCUMENT_UPLOADED,
+                    document_id=document.pk,
+                    document_type=document.document_type,
+                )
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
 
     @action(detail=True, methods=['get'])
     def documents(self, request, pk=None):
-        """Получение списка документов заказа"""
-        order = self.get_object()
+        """Получение списка документов заказа (и архивного)"""
+        order = self.get_order()
         documents = order.documents.all()
-        serializer = OrderDocumentSerializer(documents, many=True)
+        serializer = OrderDocumentSerializer(
+            documents,
+            many=True,
+            context=self.get_serializer_context()
+        )
         return Response(serializer.data)
 
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path=r'documents/(?P<document_id>\d+)/download',
+    )
+    def download_document(self, request, pk=None, document_id=None):
+        """Скачивание документа заказа.
+
+        Права проверяются через get_order() (заказ может быть в архиве),
+        саму передачу файла выполняет фронтовой веб-сервер
+        (см. core.sendfile).
+        """
+        order = self.get_order()
+        document = get_object_or_404(order.documents, pk=document_id)
+        return sendfile_response(request, document.file)
+
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         """Обновление статуса заказа"""
@@ -102,9 +308,55 @@ class OrderTrackingView(generics.RetrieveAPIView):
     queryset = Order.objects.all()
     lookup_field = 'tracking_code'
     permission_classes = []  # Доступно без авторизации
+    throttle_classes = [TokenBucketThrottle]
+
+    def get_object(self):
+        # Старые заказы находятся в архиве, ответ для клиента тот же
+        order = order_by_tracking_code(self.kwargs['tracking_code'])
+        if order is None:
+            raise Http404
+        return order
+
 
+class PublicReviewPagination(PageNumberPagination):
+    page_size = settings.REVIEW_FEED_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def cached_page(self, page):
+        """Кэшируемая часть страницы: ссылки зависят от хоста запроса."""
+        return {
+            'count': self.page.paginator.count,
+            'results': page,
+        }
+
+    def page_data(self, request, page_number, cached):
+        """Ответ страницы из кэша со ссылками для текущего запроса."""
+        page_number = int(page_number)
+        count = cached['count']
+        url = request.build_absolute_uri()
+        next_link = previous_link = None
+        if page_number * self.get_page_size(request) < count:
+            next_link = replace_query_param(
+                url, self.page_query_param, page_number + 1
+            )
+        if page_number == 2:
+            previous_link = remove_query_param(url, self.page_query_param)
+        elif page_number > 2:
+            previous_link = replace_query_param(
+                url, self.page_query_param, page_number - 1
+            )
+        return {
+            'count': count,
+            'next': next_link,
+            'previous': previous_link,
+            'results': cached['results'],
+        }
+
+
+class ReviewViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    fieldset_actions = ('list', 'retrieve', 'list_public')
 
-class ReviewViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return reviews_for_user(self.action, self.request.user)
 
@@ -116,18 +368,50 @@ class ReviewViewSet(viewsets.ModelViewSet):
         return ReviewDetailSerializer
 
     def get_permissions(self):
-        if self.action == 'list_public':
+        if self.action in ['list_public', 'stats']:
             return [permissions.AllowAny()]
         if self.action in ['update', 'partial_update']:
             return [IsAdministrator | IsOwner()]
         return [permissions.IsAuthenticated()]
 
-    @action(detail=False, methods=['get'])
+    @action(
+        detail=False,
+        methods=['get'],
+        pagination_class=PublicReviewPagination,
+    )
     def list_public(self, request):
-        """Публичный список отзывов для отображения на сайте"""
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        """Публичный список отзывов для отображения на сайте.
+
+        Страницы кэшируются до изменения любого отзыва (см. orders.reviews)
+        """
+        def build():
+            page = self.paginate_queryset(
+                self.filter_queryset(self.get_queryset())
+            )
+            serializer = self.get_serializer(page, many=True)
+            return self.paginator.cached_page(serializer.data)
+
+        page_number = request.query_params.get(
+            self.paginator.page_query_param, '1'
+        )
+        if not page_number.isdigit():
+            return self.get_paginated_response(build()['results'])
+        cached = cached_feed(
+            'page',
+            page_number,
+            self.paginator.get_page_size(request),
+            fieldset_key(request),
+            build=build,
+        )
+        return Response(
+            self.paginator.page_data(request, page_number, cached)
+        )
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Средняя оценка, число отзывов и распределение оценок:
+        общие и по обменным пунктам"""
+        return Response(cached_feed('stats', build=review_statistics))
 
     def perform_create(self, serializer):
         serializer.save()
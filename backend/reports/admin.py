@@ -0,0 +1,32 @@
+from django.contrib import admin
+from reports.models import OrderVolumeRollup, StatusSLA
+
+
+@admin.register(OrderVolumeRollup)
+class OrderVolumeRollupAdmin(admin.ModelAdmin):
+    list_display = ('period', 'bucket_start', 'office', 'from_currency',
+                    'to_currency', 'status', 'order_count', 'item_count',
+                    'amount_from', 'amount_to')
+    list_filter = ('period', 'office', 'status')
+    date_hierarchy = 'bucket_start'
+    ordering = ('-bucket_start',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StatusSLA)
+class StatusSLAAdmin(admin.ModelAdmin):
+    list_display = ('office', 'status', 'in_status', 'exit_count',
+                    'average_seconds', 'max_seconds', 'updated_at')
+    list_filter = ('office', 'status')
+    exclude = ('sketch',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class ReportsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'reports'
+    verbose_name = 'Отчёты'
+
+    def ready(self):
+        # Метрики SLA на /metrics и учёт удалённых заказов в итогах
+        from reports import signals, sla  # noqa: F401
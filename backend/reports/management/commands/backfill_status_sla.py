@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from reports.sla import BATCH_SIZE, backfill
+
+
+class Command(BaseCommand):
+    help = 'Count order status history into the per-office SLA metrics'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Number of history rows counted in one transaction',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Clear the metrics, recount the history and set the queues '
+                 'from the current orders',
+        )
+
+    def handle(self, *args, **options):
+        total = backfill(
+            batch_size=options['batch_size'],
+            rebuild=options['rebuild'],
+            progress=lambda done: self.stdout.write(f'Counted {done} changes'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Counted {total} changes'))
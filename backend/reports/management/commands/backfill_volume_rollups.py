@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from reports.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = 'Bring exchange volume rollups up to date with order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of orders processed in one transaction',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Clear the rollups and recount all orders, archive included',
+        )
+
+    def handle(self, *args, **options):
+        total = backfill(
+            chunk_size=options['chunk_size'],
+            rebuild=options['rebuild'],
+            progress=lambda done: self.stdout.write(f'Processed {done} orders'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} orders'))
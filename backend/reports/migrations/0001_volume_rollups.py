@@ -0,0 +1,56 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('exchange', '0001_initial'),
+        ('orders', '0006_order_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupOrderState',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup_state', serialize=False, to='orders.order', verbose_name='Заказ')),
+                ('status', models.CharField(max_length=20, verbose_name='Учтённый статус')),
+            ],
+            options={
+                'verbose_name': 'Учёт заказа в отчётах',
+                'verbose_name_plural': 'Учёт заказов в отчётах',
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderVolumeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Час'), ('day', 'День')], max_length=10, verbose_name='Период')),
+                ('bucket_start', models.DateTimeField(verbose_name='Начало периода')),
+                ('status', models.CharField(max_length=20, verbose_name='Статус заказа')),
+                ('order_count', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('item_count', models.IntegerField(default=0, verbose_name='Операций')),
+                ('amount_from', models.DecimalField(decimal_places=10, default=0, max_digits=30, verbose_name='Сумма обмена')),
+                ('amount_to', models.DecimalField(decimal_places=10, default=0, max_digits=30, verbose_name='Сумма к получению')),
+                ('rate_sum', models.DecimalField(decimal_places=10, default=0, max_digits=30, verbose_name='Сумма курсов')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('from_currency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exchange.currency', verbose_name='Из валюты')),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exchange.exchangeoffice', verbose_name='Обменный пункт')),
+                ('to_currency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exchange.currency', verbose_name='В валюту')),
+            ],
+            options={
+                'verbose_name': 'Объём обменов',
+                'verbose_name_plural': 'Объёмы обменов',
+                'ordering': ['-bucket_start'],
+                'indexes': [models.Index(fields=['period', 'bucket_start'], name='reports_volume_period_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ordervolumerollup',
+            constraint=models.UniqueConstraint(fields=('period', 'bucket_start', 'office', 'from_currency', 'to_currency', 'status'), name='reports_volume_rollup_uniq'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.14 on 2026-10-19 19:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0002_reference_sync'),
+        ('reports', '0001_volume_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusSLA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20, verbose_name='Статус заказа')),
+                ('in_status', models.IntegerField(default=0, verbose_name='Заказов в статусе сейчас')),
+                ('exit_count', models.IntegerField(default=0, verbose_name='Переходов из статуса')),
+                ('total_seconds', models.FloatField(default=0, verbose_name='Суммарное время, с')),
+                ('max_seconds', models.FloatField(default=0, verbose_name='Наибольшее время, с')),
+                ('sketch', models.JSONField(default=dict, verbose_name='Распределение времени')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exchange.exchangeoffice', verbose_name='Обменный пункт')),
+            ],
+            options={
+                'verbose_name': 'SLA статуса',
+                'verbose_name_plural': 'SLA статусов',
+                'ordering': ['office_id', 'status'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='statussla',
+            constraint=models.UniqueConstraint(fields=('office', 'status'), name='reports_status_sla_uniq'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.14 on 2026-10-19 21:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_counted_office(apps, schema_editor):
+    # Переносы между пунктами до этой миграции не учитывались: считаем,
+    # что заказ учтён в своём текущем пункте
+    Order = apps.get_model('orders', 'Order')
+    RollupOrderState = apps.get_model('reports', 'RollupOrderState')
+    RollupOrderState.objects.update(
+        office_id=Subquery(
+            Order.objects.filter(pk=OuterRef('order_id')).values('office_id')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0002_reference_sync'),
+        ('orders', '0008_order_status_change'),
+        ('reports', '0002_status_sla'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rolluporderstate',
+            name='office',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exchange.exchangeoffice', verbose_name='Учтённый пункт'),
+        ),
+        migrations.RunPython(fill_counted_office, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='rolluporderstate',
+            name='office',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exchange.exchangeoffice', verbose_name='Учтённый пункт'),
+        ),
+    ]
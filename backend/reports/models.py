@@ -0,0 +1,140 @@
+from django.db import models
+
+
+class OrderVolumeRollup(models.Model):
+    """Объём обменов за час или день (см. reports.rollups).
+
+    Одна строка на период, обменный пункт, валютную пару и статус заказа.
+    Заказ учитывается в периоде своего создания.
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    PERIOD_CHOICES = [
+        (HOUR, 'Час'),
+        (DAY, 'День'),
+    ]
+
+    period = models.CharField('Период', max_length=10, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField('Начало периода')
+    office = models.ForeignKey(
+        'exchange.ExchangeOffice',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Обменный пункт'
+    )
+    from_currency = models.ForeignKey(
+        'exchange.Currency',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Из валюты'
+    )
+    to_currency = models.ForeignKey(
+        'exchange.Currency',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='В валюту'
+    )
+    status = models.CharField('Статус заказа', max_length=20)
+    order_count = models.IntegerField('Заказов', default=0)
+    item_count = models.IntegerField('Операций', default=0)
+    amount_from = models.DecimalField(
+        'Сумма обмена', max_digits=30, decimal_places=10, default=0
+    )
+    amount_to = models.DecimalField(
+        'Сумма к получению', max_digits=30, decimal_places=10, default=0
+    )
+    # Средний курс = rate_sum / item_count
+    rate_sum = models.DecimalField(
+        'Сумма курсов', max_digits=30, decimal_places=10, default=0
+    )
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Объём обменов'
+        verbose_name_plural = 'Объёмы обменов'
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'bucket_start', 'office',
+                        'from_currency', 'to_currency', 'status'],
+                name='reports_volume_rollup_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['period', 'bucket_start'],
+                name='reports_volume_period_idx'
+            ),
+        ]
+
+    @property
+    def average_rate(self):
+        if not self.item_count:
+            return None
+        return self.rate_sum / self.item_count
+
+
+class RollupOrderState(models.Model):
+    """Статус и пункт, с которыми заказ сейчас учтён в OrderVolumeRollup.
+
+    Позволяет применять события повторно и в любом порядке: заказ
+    переносится между строками, только если статус или пункт изменились.
+    """
+    order = models.OneToOneField(
+        'orders.Order',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rollup_state',
+        verbose_name='Заказ'
+    )
+    status = models.CharField('Учтённый статус', max_length=20)
+    # Заказ могут перенести в другой пункт: вычитать надо из учтённого
+    office = models.ForeignKey(
+        'exchange.ExchangeOffice',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Учтённый пункт'
+    )
+
+    class Meta:
+        verbose_name = 'Учёт заказа в отчётах'
+        verbose_name_plural = 'Учёт заказов в отчётах'
+
+
+class StatusSLA(models.Model):
+    """Время заказов в статусе по обменному пункту (см. reports.sla).
+
+    Обновляется по истории статусов (OrderStatusChange) без её перечитывания:
+    каждый переход учитывается один раз.
+    """
+    office = models.ForeignKey(
+        'exchange.ExchangeOffice',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Обменный пункт'
+    )
+    status = models.CharField('Статус заказа', max_length=20)
+    in_status = models.IntegerField('Заказов в статусе сейчас', default=0)
+    # Переходы из статуса с известным временем в нём
+    exit_count = models.IntegerField('Переходов из статуса', default=0)
+    total_seconds = models.FloatField('Суммарное время, с', default=0)
+    max_seconds = models.FloatField('Наибольшее время, с', default=0)
+    sketch = models.JSONField('Распределение времени', default=dict)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'SLA статуса'
+        verbose_name_plural = 'SLA статусов'
+        ordering = ['office_id', 'status']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['office', 'status'],
+                name='reports_status_sla_uniq'
+            ),
+        ]
+
+    @property
+    def average_seconds(self):
+        if not self.exit_count:
+            return None
+        return self.total_seconds / self.exit_count
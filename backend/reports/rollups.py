@@ -0,0 +1,232 @@
+"""Incremental exchange volume rollups.
+
+`OrderVolumeRollup` keeps hourly and daily totals per office, currency pair
+and order status, so reports never aggregate `OrderItem` directly.
+
+The rollups are maintained by `handle_order_event`, an outbox handler (see
+orders.outbox) for order creation, status and office changes. `sync_orders`
+is idempotent: `RollupOrderState` remembers the status and the office each
+order is counted under, and an order is only moved between rows when its
+current status or office differs. It is subtracted from the rows it was
+counted in, not from those of its current office. Replayed or reordered events therefore never count an
+order twice, and the `backfill_volume_rollups` command reuses the same
+function to process history in chunks.
+
+A deleted order is subtracted by `remove_order` (reports.signals) before
+its items go; an order deleted by archival stays counted, the archive is
+part of the history.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from orders.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from reports.models import OrderVolumeRollup, RollupOrderState
+
+PERIODS = {
+    OrderVolumeRollup.HOUR: TruncHour,
+    OrderVolumeRollup.DAY: TruncDay,
+}
+
+METRICS = ('order_count', 'item_count', 'amount_from', 'amount_to',
+           'rate_sum')
+
+
+def handle_order_event(event):
+    """Outbox handler: bring the rollups in line with the order."""
+    sync_orders([event.order_id])
+
+
+def sync_orders(order_ids):
+    """Update the rollups for orders whose status or office changed since
+    last sync.
+
+    Returns the number of orders moved between rollup rows.
+    """
+    with transaction.atomic():
+        current = {
+            order_id: (status, office_id)
+            for order_id, status, office_id in Order.objects
+            .select_for_update()
+            .filter(id__in=order_ids)
+            .values_list('id', 'status', 'office_id')
+        }
+        counted = {
+            order_id: (status, office_id)
+            for order_id, status, office_id in RollupOrderState.objects
+            .filter(order_id__in=current)
+            .values_list('order_id', 'status', 'office_id')
+        }
+        changed = [
+            order_id for order_id, state in current.items()
+            if counted.get(order_id) != state
+        ]
+        if not changed:
+            return 0
+
+        deltas = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+        previous = [order_id for order_id in changed if order_id in counted]
+        if previous:
+            _accumulate(
+                deltas,
+                OrderItem.objects.filter(order_id__in=previous),
+                F('order__rollup_state__status'),
+                F('order__rollup_state__office_id'),
+                sign=-1,
+            )
+        _accumulate(
+            deltas,
+            OrderItem.objects.filter(order_id__in=changed),
+            F('order__status'),
+            F('order__office_id'),
+            sign=1,
+        )
+        _apply(deltas)
+
+        RollupOrderState.objects.bulk_create(
+            [
+                RollupOrderState(
+                    order_id=order_id,
+                    status=current[order_id][0],
+                    office_id=current[order_id][1],
+                )
+                for order_id in changed
+            ],
+            update_conflicts=True,
+            unique_fields=['order'],
+            update_fields=['status', 'office'],
+        )
+    return len(changed)
+
+
+def remove_order(order_id):
+    """Subtract a counted order from the rollups (before it is deleted)."""
+    with transaction.atomic():
+        if not RollupOrderState.objects.filter(order_id=order_id).exists():
+            return False
+        deltas = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+        _accumulate(
+            deltas,
+            OrderItem.objects.filter(order_id=order_id),
+            F('order__rollup_state__status'),
+            F('order__rollup_state__office_id'),
+            sign=-1,
+        )
+        _apply(deltas)
+        RollupOrderState.objects.filter(order_id=order_id).delete()
+    return True
+
+
+def add_archived_orders(order_ids):
+    """Add archived orders to the rollups (used when rebuilding)."""
+    deltas = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+    _accumulate(
+        deltas,
+        ArchivedOrderItem.objects.filter(order_id__in=order_ids),
+        F('order__status'),
+        F('order__office_id'),
+        sign=1,
+    )
+    with transaction.atomic():
+        _apply(deltas)
+
+
+def backfill(chunk_size=1000, rebuild=False, progress=None):
+    """Process order history in chunks. Returns the number of orders.
+
+    With `rebuild` the rollups are cleared first and archived orders are
+    counted again. Archival should not run at the same time.
+    """
+    total = 0
+    if rebuild:
+        with transaction.atomic():
+            OrderVolumeRollup.objects.all().delete()
+            RollupOrderState.objects.all().delete()
+        for order_ids in _id_chunks(ArchivedOrder.objects.all(), chunk_size):
+            add_archived_orders(order_ids)
+            total += len(order_ids)
+            if progress:
+                progress(total)
+
+    for order_ids in _id_chunks(Order.objects.all(), chunk_size):
+        sync_orders(order_ids)
+        total += len(order_ids)
+        if progress:
+            progress(total)
+    return total
+
+
+def _id_chunks(queryset, chunk_size):
+    """Yield lists of ids in ascending order (keyset pagination)."""
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def _accumulate(deltas, items, status, office, sign):
+    """Aggregate items per rollup key in the database and add to deltas."""
+    aggregates = {
+        'total_order_count': Count('order_id', distinct=True),
+        'total_item_count': Count('id'),
+        'total_amount_from': Sum('amount_from'),
+        'total_amount_to': Sum('amount_to'),
+        'total_rate_sum': Sum('rate'),
+    }
+    for period, trunc in PERIODS.items():
+        rows = (
+            items.annotate(
+                bucket=trunc('order__created_at'),
+                rollup_status=status,
+                rollup_office=office,
+            )
+            .values('bucket', 'rollup_office', 'from_currency_id',
+                    'to_currency_id', 'rollup_status')
+            .annotate(**aggregates)
+            .order_by()
+        )
+        for row in rows:
+            key = (
+                period,
+                row['bucket'],
+                row['rollup_office'],
+                row['from_currency_id'],
+                row['to_currency_id'],
+                row['rollup_status'],
+            )
+            delta = deltas[key]
+            for metric in METRICS:
+                delta[metric] += sign * (
+                    row[f'total_{metric}'] or Decimal(0)
+                )
+
+
+def _apply(deltas):
+    now = timezone.now()
+    for key, delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        period, bucket, office_id, from_id, to_id, status = key
+        rollup, _ = OrderVolumeRollup.objects.get_or_create(
+            period=period,
+            bucket_start=bucket,
+            office_id=office_id,
+            from_currency_id=from_id,
+            to_currency_id=to_id,
+            status=status,
+        )
+        OrderVolumeRollup.objects.filter(pk=rollup.pk).update(
+            updated_at=now,
+            **{metric: F(metric) + value for metric, value in delta.items()},
+        )
@@ -0,0 +1,43 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from reports.models import OrderVolumeRollup, StatusSLA
+
+
+def volume_rollups(period, date_from=None, date_to=None, office=None,
+                   status=None):
+    """Return rollup rows for the period; dates are inclusive."""
+    queryset = OrderVolumeRollup.objects.filter(
+        period=period
+    ).select_related('from_currency', 'to_currency').order_by(
+        'bucket_start', 'office_id', 'from_currency_id', 'to_currency_id',
+        'status'
+    )
+    if date_from:
+        queryset = queryset.filter(bucket_start__gte=_start_of_day(date_from))
+    if date_to:
+        queryset = queryset.filter(
+            bucket_start__lt=_start_of_day(date_to + timedelta(days=1))
+        )
+    if office:
+        queryset = queryset.filter(office_id=office)
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+def status_sla(office=None, status=None):
+    """Return SLA rows by office and status."""
+    queryset = StatusSLA.objects.select_related('office').order_by(
+        'office_id', 'status'
+    )
+    if office:
+        queryset = queryset.filter(office_id=office)
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+def _start_of_day(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
@@ -0,0 +1,73 @@
+from rest_framework import serializers
+
+from orders.models import Order
+from reports.models import OrderVolumeRollup, StatusSLA
+from reports.sla import quantiles
+
+
+class VolumeReportFilterSerializer(serializers.Serializer):
+    """Параметры запроса отчёта по объёмам"""
+    period = serializers.ChoiceField(
+        choices=OrderVolumeRollup.PERIOD_CHOICES,
+        default=OrderVolumeRollup.DAY
+    )
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    office = serializers.IntegerField(required=False)
+    status = serializers.ChoiceField(
+        choices=Order.STATUS_CHOICES, required=False
+    )
+
+    def validate(self, data):
+        date_from, date_to = data.get('date_from'), data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError(
+                "Дата начала позже даты окончания"
+            )
+        return data
+
+
+class OrderVolumeRollupSerializer(serializers.ModelSerializer):
+    from_currency_code = serializers.CharField(
+        source='from_currency.code', read_only=True
+    )
+    to_currency_code = serializers.CharField(
+        source='to_currency.code', read_only=True
+    )
+    average_rate = serializers.DecimalField(
+        max_digits=20, decimal_places=10, read_only=True
+    )
+
+    class Meta:
+        model = OrderVolumeRollup
+        fields = ['period', 'bucket_start', 'office',
+                  'from_currency', 'to_currency',
+                  'from_currency_code', 'to_currency_code', 'status',
+                  'order_count', 'item_count', 'amount_from', 'amount_to',
+                  'average_rate']
+
+
+class StatusSLAFilterSerializer(serializers.Serializer):
+    """Параметры запроса SLA статусов"""
+    office = serializers.IntegerField(required=False)
+    status = serializers.ChoiceField(
+        choices=Order.STATUS_CHOICES, required=False
+    )
+
+
+class StatusSLASerializer(serializers.ModelSerializer):
+    office_name = serializers.CharField(source='office.name', read_only=True)
+    average_seconds = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = StatusSLA
+        fields = ['office', 'office_name', 'status', 'in_status',
+                  'exit_count', 'average_seconds', 'max_seconds',
+                  'updated_at']
+
+    def to_representation(self, instance):
+        """Квантили времени в статусе, в секундах"""
+        data = super().to_representation(instance)
+        for name, seconds in quantiles(instance).items():
+            data[f'{name}_seconds'] = seconds
+        return data
@@ -0,0 +1,15 @@
+"""Keep the volume rollups (reports.rollups) right when orders are deleted."""
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from orders.models import ArchivedOrder, Order
+from reports.rollups import remove_order
+
+
+@receiver(pre_delete, sender=Order, dispatch_uid='reports_order_deleted')
+def remove_deleted_order(sender, instance, **kwargs):
+    # Архивация копирует заказ в архив до удаления: он остаётся в итогах
+    if (not Order.STATUS_FLOW.get(instance.status)
+            and ArchivedOrder.objects.filter(pk=instance.pk).exists()):
+        return
+    remove_order(instance.pk)
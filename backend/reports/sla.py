@@ -0,0 +1,186 @@
+"""Per-office SLA of order statuses, maintained incrementally.
+
+Every status transition of an order is written to `OrderStatusChange`
+(orders.models). `StatusSLA` keeps, per office and status:
+
+* `in_status` - orders in the status now (+1 when an order enters it, -1
+  when it leaves or is deleted), the queue of the office; final statuses
+  have no queue;
+* the time orders spent in the status before leaving it: count, total,
+  maximum and a quantile sketch (core.sketches) for p50/p90/p99.
+
+`apply_pending` counts history rows that are not counted yet and marks them
+in the same transaction, so replayed or concurrent runs never count a row
+twice. It runs as an outbox handler for order creation and status changes
+(`handle_order_event`) and from the `backfill_status_sla` command. The
+report (`/reports/sla/`) and /metrics read only `StatusSLA` rows.
+"""
+from collections import defaultdict
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Count
+
+from core.metrics import register_collector
+from core.sketches import QuantileSketch
+from orders.models import Order, OrderStatusChange
+from reports.models import StatusSLA
+
+BATCH_SIZE = 1000
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Статусы, из которых заказ ещё выйдет: по ним считается очередь
+QUEUED_STATUSES = tuple(
+    status for status, following in Order.STATUS_FLOW.items() if following
+)
+
+
+def handle_order_event(event):
+    """Outbox handler: count the transitions recorded so far."""
+    apply_pending()
+
+
+def apply_pending(batch_size=BATCH_SIZE):
+    """Count one batch of history rows. Returns the batch size."""
+    pending = OrderStatusChange.objects.filter(counted=False).order_by('id')
+    with transaction.atomic():
+        if connections[pending.db].features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        changes = list(
+            pending.values_list(
+                'id', 'office_id', 'old_status', 'new_status', 'duration'
+            )[:batch_size]
+        )
+        if not changes:
+            return 0
+
+        deltas = defaultdict(lambda: {'in_status': 0, 'durations': []})
+        for _, office_id, old_status, new_status, duration in changes:
+            if old_status:
+                delta = deltas[(office_id, old_status)]
+                if old_status in QUEUED_STATUSES:
+                    delta['in_status'] -= 1
+                if duration is not None:
+                    delta['durations'].append(duration.total_seconds())
+            if new_status in QUEUED_STATUSES:
+                deltas[(office_id, new_status)]['in_status'] += 1
+        _apply(deltas)
+
+        OrderStatusChange.objects.filter(
+            pk__in=[change[0] for change in changes]
+        ).update(counted=True)
+    return len(changes)
+
+
+def backfill(batch_size=BATCH_SIZE, rebuild=False, progress=None):
+    """Count all pending history rows. Returns their number.
+
+    With `rebuild` the metrics are cleared and the whole history is counted
+    again; queues are then set from the current orders, since the history
+    starts with the migration. Status changes should not run at the same
+    time.
+    """
+    if rebuild:
+        with transaction.atomic():
+            StatusSLA.objects.all().delete()
+            OrderStatusChange.objects.update(counted=False)
+
+    total = 0
+    while True:
+        applied = apply_pending(batch_size)
+        if not applied:
+            break
+        total += applied
+        if progress:
+            progress(total)
+
+    if rebuild:
+        _set_queues_from_orders()
+    return total
+
+
+def _apply(deltas):
+    # Строки блокируются в одном порядке, чтобы параллельные пакеты
+    # не ждали друг друга по кругу
+    for (office_id, status), delta in sorted(deltas.items()):
+        StatusSLA.objects.get_or_create(office_id=office_id, status=status)
+        sla = StatusSLA.objects.select_for_update().get(
+            office_id=office_id, status=status
+        )
+        sla.in_status += delta['in_status']
+        durations = delta['durations']
+        if durations:
+            sketch = QuantileSketch.from_dict(sla.sketch)
+            for seconds in durations:
+                sketch.add(seconds)
+            sla.sketch = sketch.to_dict()
+            sla.exit_count += len(durations)
+            sla.total_seconds += sum(durations)
+            sla.max_seconds = max(sla.max_seconds, *durations)
+        sla.save()
+
+
+def _set_queues_from_orders():
+    queues = {
+        (row['office_id'], row['status']): row['count']
+        for row in Order.objects.filter(status__in=QUEUED_STATUSES)
+        .values('office_id', 'status')
+        .annotate(count=Count('id'))
+        .order_by()
+    }
+    with transaction.atomic():
+        StatusSLA.objects.filter(status__in=QUEUED_STATUSES).update(
+            in_status=0
+        )
+        for (office_id, status), count in queues.items():
+            StatusSLA.objects.update_or_create(
+                office_id=office_id, status=status,
+                defaults={'in_status': count},
+            )
+
+
+def quantiles(sla):
+    """`{'p50': seconds, ...}` from the row's sketch, None when empty."""
+    sketch = QuantileSketch.from_dict(sla.sketch)
+    return {
+        f'p{round(q * 100)}': sketch.quantile(q) for q in QUANTILES
+    }
+
+
+@register_collector
+def sla_metrics():
+    """Queues and time in status by office for /metrics."""
+    try:
+        rows = list(StatusSLA.objects.order_by('office_id', 'status'))
+    except DatabaseError:
+        # Недоступная БД не должна ломать /metrics
+        return []
+    lines = [
+        '# HELP order_status_queue Orders in the status now, by office.',
+        '# TYPE order_status_queue gauge',
+    ]
+    lines += [
+        f'order_status_queue{{office="{sla.office_id}",'
+        f'status="{sla.status}"}} {sla.in_status}'
+        for sla in rows if sla.status in QUEUED_STATUSES
+    ]
+    lines += [
+        '# HELP order_status_seconds Time orders spent in the status, '
+        'by office.',
+        '# TYPE order_status_seconds summary',
+    ]
+    for sla in rows:
+        if not sla.exit_count:
+            continue
+        labels = f'office="{sla.office_id}",status="{sla.status}"'
+        sketch = QuantileSketch.from_dict(sla.sketch)
+        lines += [
+            f'order_status_seconds{{{labels},quantile="{q}"}} '
+            f'{sketch.quantile(q)!r}'
+            for q in QUANTILES
+        ]
+        lines.append(f'order_status_seconds_sum{{{labels}}} '
+                     f'{sla.total_seconds!r}')
+        lines.append(f'order_status_seconds_count{{{labels}}} '
+                     f'{sla.exit_count}')
+    return lines
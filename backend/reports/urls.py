@@ -0,0 +1,11 @@
+from django.urls import path
+from reports.views import StatusSLAView, VolumeReportView
+
+urlpatterns = [
+    path('reports/volume/',
+         VolumeReportView.as_view(),
+         name='report-volume'),
+    path('reports/sla/',
+         StatusSLAView.as_view(),
+         name='report-sla'),
+]
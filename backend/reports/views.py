@@ -0,0 +1,38 @@
+from rest_framework import generics
+
+from users.permissions import IsAdministrator, IsOperator, IsOwner
+from reports.selectors import status_sla, volume_rollups
+from reports.serializers import (
+    OrderVolumeRollupSerializer,
+    StatusSLAFilterSerializer,
+    StatusSLASerializer,
+    VolumeReportFilterSerializer,
+)
+
+
+class VolumeReportView(generics.ListAPIView):
+    """
+    Объёмы обменов по периодам, обменным пунктам, валютным парам и статусам.
+    Читает только готовые агрегаты (см. reports.rollups)
+    """
+    serializer_class = OrderVolumeRollupSerializer
+    permission_classes = [IsAdministrator | IsOwner]
+
+    def get_queryset(self):
+        filters = VolumeReportFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        return volume_rollups(**filters.validated_data)
+
+
+class StatusSLAView(generics.ListAPIView):
+    """
+    Очереди и время заказов в статусах по обменным пунктам: p50/p90/p99,
+    среднее и максимум. Читает только готовые метрики (см. reports.sla)
+    """
+    serializer_class = StatusSLASerializer
+    permission_classes = [IsOperator | IsAdministrator | IsOwner]
+
+    def get_queryset(self):
+        filters = StatusSLAFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        return status_sla(**filters.validated_data)
@@ -1,15 +1,30 @@
 """
 Pytest configuration and common fixtures for Django backend tests.
 """
+from decimal import Decimal
+
 import pytest
+from django.core.cache import cache
 from django.test import Client
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
 from rest_framework.test import APIClient
 from unittest.mock import patch
 
+from core.throttling import local_buckets
+from exchange.models import Currency, ExchangeOffice, ExchangeRate
+from orders.models import Order, OrderItem
+
 User = get_user_model()
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Cache is not rolled back with the database between tests."""
+    cache.clear()
+    local_buckets.clear()
+
+
 @pytest.fixture
 def api_client():
     """Returns an API client for testing."""
@@ -27,7 +42,7 @@ def user_data():
     """Returns sample user data for testing."""
     return {
         'email': 'test@example.com',
-        'supabase_user_id': 'test-supabase-id-123',
+        'supabase_user_id': '5f0c7c3e-1d2a-4b8e-9a51-3c9d7f1e2b40',
         'username': 'testuser',
         'first_name': 'Test',
         'last_name': 'User',
@@ -61,4 +76,74 @@ def mock_supabase_jwt():
             'email': 'test@example.com',
             'exp': 9999999999,  # Far future expiration
         }
-        yield mock_decode 
\ No newline at end of file
+        yield mock_decode 
+
+
+@pytest.fixture
+def operator(db):
+    """Creates a user from the Operators group."""
+    operator = User.objects.create_user(
+        email='operator@example.com', username='operator'
+    )
+    operator.groups.add(Group.objects.get_or_create(name='Operators')[0])
+    return operator
+
+
+@pytest.fixture
+def operator_api_client(operator):
+    """Returns an API client authenticated as an operator."""
+    client = APIClient()
+    client.force_authenticate(user=operator)
+    return client
+
+
+@pytest.fixture
+def owner_api_client(db):
+    """Returns an API client authenticated as a user from the Owners group."""
+    owner = User.objects.create_user(email='owner@example.com', username='owner')
+    owner.groups.add(Group.objects.get_or_create(name='Owners')[0])
+    client = APIClient()
+    client.force_authenticate(user=owner)
+    return client
+
+
+@pytest.fixture
+def office(db):
+    """Creates an exchange office."""
+    return ExchangeOffice.objects.create(name='Центр', address='ул. Ленина, 1')
+
+
+@pytest.fixture
+def usd(db):
+    return Currency.objects.create(code='USD', name='Доллар', symbol='$')
+
+
+@pytest.fixture
+def rub(db):
+    return Currency.objects.create(code='RUB', name='Рубль', symbol='₽')
+
+
+@pytest.fixture
+def rate(usd, rub):
+    """Creates an active USD -> RUB exchange rate."""
+    return ExchangeRate.objects.create(
+        from_currency=usd,
+        to_currency=rub,
+        rate=Decimal('90.5000'),
+        min_amount=Decimal('10.00'),
+    )
+
+
+@pytest.fixture
+def order(user, office, rate):
+    """Creates an order with a single item for the test user."""
+    order = Order.objects.create(user=user, office=office)
+    OrderItem.objects.create(
+        order=order,
+        from_currency=rate.from_currency,
+        to_currency=rate.to_currency,
+        amount_from=Decimal('100'),
+        amount_to=Decimal('9050'),
+        rate=rate.rate,
+    )
+    return order
@@ -0,0 +1,1214 @@
+"""
+Tests for the core app.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+import gzip
+import json
+
+import pytest
+from asgiref.sync import iscoroutinefunction
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.core.management import call_command
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from core.benchmark_data import seed
+from core.bootstrap import accepted_encodings
+from core.cache import EVICTIONS, LOCK_KEY, LRUCache, cache_key, cached
+from core.benchmarks import (
+    async_hot_endpoints,
+    bench_context,
+    compare,
+    default_scenarios,
+    run,
+)
+from core.db_routers import routing
+from core.fastpath import ORJSONRenderer, serializer_columns
+from core.idempotency import purge_expired
+from core.jobs import (
+    claim_jobs,
+    enqueue,
+    purge_finished,
+    run_batch,
+    schedule_recurring,
+)
+from core.mail import send_batch
+from core.metrics import REGISTRY, Histogram, render_metrics
+from core.throttling import LocalBuckets, parse_rate
+from core.models import IdempotencyKey, Job, JobQueue, QueuedEmail
+from exchange.models import Currency, CurrencyBalance, ExchangeRate
+from exchange.sync import reset_tables
+from orders.archive import archive_batch
+from orders.models import Order, OrderItem, Review
+from orders.serializers import OrderSerializer
+from users.models import User
+
+LOCMEM_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+@pytest.fixture
+def mail_queue(settings):
+    """Routes outgoing mail through the queue into the locmem outbox."""
+    settings.EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+    settings.QUEUED_EMAIL_BACKEND = LOCMEM_BACKEND
+    mail.outbox = []
+
+
+@pytest.mark.django_db
+class TestMailQueue:
+    """Test the queued email backend and worker."""
+
+    def test_send_mail_only_enqueues(self, mail_queue):
+        mail.send_mail(
+            'Тема', 'Текст', 'noreply@example.com', ['user@example.com'],
+            html_message='<p>Текст</p>',
+        )
+
+        queued = QueuedEmail.objects.get()
+        assert queued.to == ['user@example.com']
+        assert queued.html_body == '<p>Текст</p>'
+        assert mail.outbox == []
+
+    def test_attachments_are_sent_directly(self, mail_queue):
+        message = mail.EmailMessage(
+            'Отчёт', 'Во вложении', None, ['user@example.com']
+        )
+        message.attach('report.csv', 'a,b\n', 'text/csv')
+        assert message.send() == 1
+
+        assert not QueuedEmail.objects.exists()
+        assert mail.outbox[0].attachments == [
+            ('report.csv', 'a,b\n', 'text/csv')
+        ]
+
+    def test_worker_sends_batch_over_one_connection(self, mail_queue):
+        for index in range(3):
+            mail.send_mail(
+                f'Письмо {index}', 'Текст', None, [f'u{index}@example.com']
+            )
+
+        with patch(
+            'django.core.mail.backends.locmem.EmailBackend.open'
+        ) as mock_open:
+            call_command('send_queued_mail', '--once', stdout=StringIO())
+
+        assert mock_open.call_count == 1
+        assert [m.subject for m in mail.outbox] == [
+            'Письмо 0', 'Письмо 1', 'Письмо 2'
+        ]
+        alternatives = mail.outbox[0].alternatives
+        assert alternatives == []
+        assert not QueuedEmail.objects.exclude(
+            status=QueuedEmail.SENT
+        ).exists()
+
+    def test_failed_email_is_retried(self, mail_queue, settings):
+        settings.MAIL_QUEUE_MAX_ATTEMPTS = 2
+        mail.send_mail('Тема', 'Текст', None, ['user@example.com'])
+
+        with patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            side_effect=OSError('SMTP is down'),
+        ):
+            assert send_batch() == 1
+            queued = QueuedEmail.objects.get()
+            assert queued.status == QueuedEmail.PENDING
+            assert queued.attempts == 1
+            assert queued.available_at > timezone.now()
+
+            QueuedEmail.objects.update(available_at=timezone.now())
+            send_batch()
+
+        queued.refresh_from_db()
+        assert queued.status == QueuedEmail.FAILED
+        assert 'SMTP is down' in queued.last_error
+
+
+@pytest.fixture
+def order_payload(office, rate):
+    return {
+        'office': office.id,
+        'items': [{
+            'from_currency': rate.from_currency_id,
+            'to_currency': rate.to_currency_id,
+            'amount_from': '100',
+            'amount_to': '9050',
+            'rate': '90.5000',
+        }],
+    }
+
+
+@pytest.fixture
+def idempotent_client(authenticated_api_client):
+    """API client that sends credentials, which scope idempotency keys."""
+    authenticated_api_client.credentials(
+        HTTP_AUTHORIZATION='Bearer test-token'
+    )
+    return authenticated_api_client
+
+
+@pytest.mark.django_db
+class TestIdempotencyKeys:
+    """Test Idempotency-Key handling of unsafe requests."""
+
+    def post(self, client, data, key='order-1'):
+        return client.post(
+            reverse('order-list'), data, format='json',
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_first_response(
+        self, idempotent_client, order_payload
+    ):
+        first = self.post(idempotent_client, order_payload)
+        second = self.post(idempotent_client, order_payload)
+
+        assert first.status_code == status.HTTP_201_CREATED
+        assert second.status_code == status.HTTP_201_CREATED
+        assert second['Idempotent-Replayed'] == 'true'
+        assert second.json() == first.json()
+        assert Order.objects.count() == 1
+
+        self.post(idempotent_client, order_payload, key='order-2')
+        assert Order.objects.count() == 2
+
+    def test_key_reused_for_other_request(
+        self, idempotent_client, order_payload
+    ):
+        self.post(idempotent_client, order_payload)
+        order_payload['items'][0]['amount_from'] = '200'
+
+        response = self.post(idempotent_client, order_payload)
+        assert response.status_code == 422
+        assert Order.objects.count() == 1
+
+    def test_duplicate_waits_for_running_request(
+        self, idempotent_client, order_payload, settings
+    ):
+        self.post(idempotent_client, order_payload)
+        record = IdempotencyKey.objects.get()
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            status=IdempotencyKey.IN_PROGRESS
+        )
+
+        def finish_first_request(seconds):
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status=IdempotencyKey.COMPLETED
+            )
+
+        with patch('core.idempotency.time.sleep', finish_first_request):
+            response = self.post(idempotent_client, order_payload)
+        assert response['Idempotent-Replayed'] == 'true'
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            status=IdempotencyKey.IN_PROGRESS
+        )
+        settings.IDEMPOTENCY_WAIT_SECONDS = 0
+        response = self.post(idempotent_client, order_payload)
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert Order.objects.count() == 1
+
+    def test_failed_request_is_not_stored(
+        self, idempotent_client, order_payload
+    ):
+        with patch(
+            'orders.views.OrderViewSet.perform_create',
+            side_effect=RuntimeError('database is down'),
+        ):
+            idempotent_client.raise_request_exception = False
+            response = self.post(idempotent_client, order_payload)
+        assert response.status_code == 500
+        assert not IdempotencyKey.objects.exists()
+
+        response = self.post(idempotent_client, order_payload)
+        assert response.status_code == status.HTTP_201_CREATED
+
+    def test_expired_keys(self, idempotent_client, order_payload):
+        self.post(idempotent_client, order_payload)
+        IdempotencyKey.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        response = self.post(idempotent_client, order_payload)
+        assert not response.has_header('Idempotent-Replayed')
+        assert Order.objects.count() == 2
+
+        IdempotencyKey.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        assert purge_expired() == 1
+
+    def test_key_survives_token_refresh(
+        self, idempotent_client, order_payload
+    ):
+        self.post(idempotent_client, order_payload)
+        idempotent_client.credentials(HTTP_AUTHORIZATION='Bearer refreshed')
+
+        response = self.post(idempotent_client, order_payload)
+        assert response['Idempotent-Replayed'] == 'true'
+        assert Order.objects.count() == 1
+
+    def test_users_do_not_share_keys(
+        self, idempotent_client, order_payload, user
+    ):
+        self.post(idempotent_client, order_payload)
+        other = User.objects.create_user(
+            email='other@example.com', username='other'
+        )
+        idempotent_client.force_authenticate(user=other)
+
+        response = self.post(idempotent_client, order_payload)
+        assert not response.has_header('Idempotent-Replayed')
+        assert Order.objects.count() == 2
+
+    def test_token_is_checked_once(self, api_client, order_payload, user):
+        api_client.credentials(HTTP_AUTHORIZATION='Bearer test-token')
+        with patch(
+            'users.authentication.SupabaseJWTAuthentication.authenticate',
+            return_value=(user, 'test-token'),
+        ) as authenticate:
+            response = self.post(api_client, order_payload)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert authenticate.call_count == 1
+        assert IdempotencyKey.objects.get().status == (
+            IdempotencyKey.COMPLETED
+        )
+
+    def test_requests_without_credentials_are_not_tracked(
+        self, api_client, order_payload
+    ):
+        response = self.post(api_client, order_payload)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert not IdempotencyKey.objects.exists()
+
+
+@pytest.fixture
+def metrics():
+    """Clears process-wide metrics before and after the test."""
+    for metric in REGISTRY:
+        metric.clear()
+    yield
+    for metric in REGISTRY:
+        metric.clear()
+
+
+class TestHistogram:
+    """Test Prometheus histogram exposition."""
+
+    def test_cumulative_buckets(self):
+        histogram = Histogram('latency', 'Latency.', (0.1, 1), ['view'])
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'home')
+
+        assert list(histogram.collect())[2:] == [
+            'latency_bucket{view="home",le="0.1"} 2',
+            'latency_bucket{view="home",le="1"} 3',
+            'latency_bucket{view="home",le="+Inf"} 4',
+            'latency_sum{view="home"} 3.65',
+            'latency_count{view="home"} 4',
+        ]
+
+
+@pytest.mark.django_db
+class TestRequestMetrics:
+    """Test request instrumentation and the /metrics endpoint."""
+
+    def test_records_view_action_and_queries(
+        self, metrics, authenticated_api_client, order, client, settings
+    ):
+        settings.DEBUG = True
+        authenticated_api_client.get(reverse('order-list'))
+
+        body = client.get(reverse('metrics')).content.decode()
+        labels = 'view="order-list",action="list",method="GET"'
+        assert f'http_requests_total{{{labels},status="200"}} 1' in body
+        assert f'http_request_duration_seconds_count{{{labels}}} 1' in body
+        assert f'http_request_db_queries_count{{{labels}}} 1' in body
+        assert f'http_request_render_seconds_count{{{labels}}} 1' in body
+        assert f'http_response_size_bytes_count{{{labels}}} 1' in body
+
+        queries = next(
+            line for line in body.splitlines()
+            if line.startswith(f'http_request_db_queries_sum{{{labels}}}')
+        )
+        assert int(queries.split()[-1]) >= 2
+
+    def test_token_protects_endpoint(self, metrics, client, settings):
+        settings.METRICS_TOKEN = 'secret'
+
+        assert client.get(reverse('metrics')).status_code == 403
+        response = client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        assert response.status_code == 200
+
+    def test_closed_without_token_in_production(
+        self, metrics, client, settings
+    ):
+        settings.METRICS_TOKEN = ''
+        settings.DEBUG = False
+        assert client.get(reverse('metrics')).status_code == 403
+
+        settings.DEBUG = True
+        assert client.get(reverse('metrics')).status_code == 200
+
+    def test_slow_requests_are_logged_with_queries(
+        self, metrics, authenticated_api_client, order, settings, caplog
+    ):
+        settings.SLOW_REQUEST_THRESHOLD_MS = 0
+
+        with caplog.at_level('WARNING', logger='core.metrics'):
+            authenticated_api_client.get(reverse('order-list'))
+
+        record = next(
+            r for r in caplog.records if r.name == 'core.metrics'
+        )
+        assert 'Slow request GET /api/v1/orders/' in record.getMessage()
+        assert 'orders_order' in record.getMessage()
+
+
+@pytest.mark.slow
+@pytest.mark.django_db
+class TestBenchmarks:
+    """Test the benchmark data generator and runner on a tiny data set."""
+
+    def test_seed_and_run_all_scenarios(self):
+        counts = seed(currencies=5, rates=10, offices=2, users=5, orders=50,
+                      batch_size=20)
+        assert counts['orders'] == 50
+        assert Order.objects.filter(tracking_code__startswith='0').count() == 50
+
+        context = bench_context()
+        results = run(default_scenarios(context), context['users'],
+                      iterations=2, warmup=0)
+
+        assert {
+            name: result['status'] for name, result in results.items()
+            if result['status'] >= 400
+        } == {}
+        assert compare(results, results) == []
+
+    def test_compare_reports_slower_and_chattier_scenarios(self):
+        baseline = {'order-list': {'p50': 10, 'p90': 20, 'queries': 3}}
+        results = {'order-list': {'p50': 11, 'p90': 30, 'queries': 4}}
+
+        assert compare(results, baseline, tolerance=0.2) == [
+            'order-list: p90 20 -> 30 ms',
+            'order-list: queries 3 -> 4',
+        ]
+
+
+@pytest.fixture
+def replica(settings, tmp_path):
+    """A second SQLite database holding a snapshot of the primary.
+
+    Rows written to the primary after the snapshot are missing from the
+    replica, like with replication lag.
+    """
+    primary = connections['default']
+    config = connections.configure_settings({
+        'default': primary.settings_dict,
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': str(tmp_path / 'replica.sqlite3'),
+        },
+    })['replica']
+    connections.settings['replica'] = config
+    settings.DATABASE_REPLICAS = ['replica']
+
+    def snapshot():
+        primary.ensure_connection()
+        replica = connections['replica']
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+
+    yield snapshot
+    connections['replica'].close()
+    del connections['replica']
+    del connections.settings['replica']
+
+
+@pytest.mark.django_db(transaction=True)
+class TestReplicaRouting:
+    """Test routing of reads between the primary and a replica."""
+
+    def test_reads_from_replica(self, replica, api_client, usd):
+        replica()
+        eur = Currency.objects.create(code='EUR', name='Евро', symbol='€')
+
+        response = api_client.get(reverse('currency-detail', args=[eur.pk]))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_cached_lists_are_built_from_primary(self, replica, api_client,
+                                                 usd):
+        replica()
+        Currency.objects.create(code='EUR', name='Евро', symbol='€')
+
+        response = api_client.get(reverse('currency-list'))
+
+        assert [row['code'] for row in response.data] == ['USD', 'EUR']
+
+    def test_client_reads_own_writes(self, replica, owner_api_client,
+                                     api_client, usd):
+        replica()
+        owner_api_client.credentials(HTTP_AUTHORIZATION='Bearer owner')
+        response = owner_api_client.post(
+            reverse('currency-list'),
+            {'code': 'EUR', 'name': 'Евро', 'symbol': '€'},
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+        url = reverse('currency-detail', args=[response.data['id']])
+        own = owner_api_client.get(url)
+        other = api_client.get(url)
+
+        assert own.status_code == status.HTTP_200_OK
+        assert other.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_transactions_and_writes_use_primary(self, replica, usd):
+        replica()
+        Currency.objects.create(code='EUR', name='Евро', symbol='€')
+
+        with routing(use_replica=True):
+            assert Currency.objects.count() == 1
+            with transaction.atomic():
+                assert Currency.objects.count() == 2
+
+        with routing(use_replica=True):
+            Currency.objects.create(code='GBP', name='Фунт', symbol='£')
+            assert Currency.objects.count() == 3
+
+    def test_other_actions_use_primary(self, replica, rate,
+                                       authenticated_api_client):
+        # На реплике минимальная сумма осталась 10.00
+        replica()
+        rate.min_amount = 1
+        rate.save()
+
+        response = authenticated_api_client.post(
+            reverse('rate-calculate', args=[rate.pk]), {'amount_from': '5'}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+class TestAsyncHotEndpoints:
+    """Async versions of hot endpoints answer like the sync DRF views."""
+
+    def responses(self, client, method, url, data=None):
+        result = []
+        for enabled in (False, True):
+            cache.clear()
+            with async_hot_endpoints(enabled):
+                response = getattr(client, method)(url, data)
+                assert iscoroutinefunction(
+                    response.resolver_match.func
+                ) is enabled
+            result.append((
+                response.status_code,
+                response.content,
+                response.get('Content-Type'),
+                response.get('Allow'),
+                response.get('Vary'),
+            ))
+        return result
+
+    def assert_same(self, client, method, url, data=None, status_code=200):
+        sync, hot = self.responses(client, method, url, data)
+        assert sync == hot
+        assert sync[0] == status_code
+
+    def test_currency_and_rate_lists(self, api_client, rate):
+        self.assert_same(api_client, 'get', reverse('currency-list'))
+        self.assert_same(api_client, 'get', reverse('rate-list'))
+
+    def test_rate_calculate(self, authenticated_api_client, rate):
+        url = reverse('rate-calculate', args=[rate.pk])
+        self.assert_same(authenticated_api_client, 'post', url,
+                         {'amount_from': '100'})
+        self.assert_same(authenticated_api_client, 'post', url,
+                         {'amount_to': '90'}, status_code=400)
+        self.assert_same(authenticated_api_client, 'post', url, {},
+                         status_code=400)
+
+    def test_rate_calculate_requires_authentication(self, api_client, rate):
+        self.assert_same(api_client, 'post',
+                         reverse('rate-calculate', args=[rate.pk]),
+                         {'amount_from': '100'}, status_code=403)
+
+    def test_order_tracking(self, api_client, order):
+        self.assert_same(api_client, 'get',
+                         reverse('order-tracking', args=[order.tracking_code]))
+        self.assert_same(api_client, 'get',
+                         reverse('order-tracking', args=['missing']),
+                         status_code=404)
+
+    def test_public_reviews(self, api_client, order):
+        order.status = 'completed'
+        order.save()
+        Review.objects.create(order=order, rating=5, text='Отлично')
+        url = reverse('review-list-public')
+
+        self.assert_same(api_client, 'get', url)
+        self.assert_same(api_client, 'get', url, {'page': 'last'})
+        self.assert_same(api_client, 'get', url, {'page': 5}, status_code=404)
+
+
+@pytest.mark.django_db
+class TestFastListResponses:
+    """The fast read path returns the bytes of the DRF serializers."""
+
+    def assert_same(self, client, url, data=None):
+        bodies = []
+        for enabled in (False, True):
+            cache.clear()
+            with override_settings(FAST_LIST_RESPONSES=enabled):
+                response = client.get(url, data)
+            assert response.status_code == status.HTTP_200_OK
+            assert isinstance(
+                response.accepted_renderer, ORJSONRenderer
+            ) is enabled
+            bodies.append(response.content)
+        assert bodies[0] == bodies[1]
+        return bodies[1]
+
+    def test_rate_list(self, api_client, rate, usd):
+        Currency.objects.filter(pk=usd.pk).update(name='Доллар\u2028США')
+        self.assert_same(api_client, reverse('rate-list'))
+
+    def test_balances_by_office(self, owner_api_client, office, usd, rub):
+        CurrencyBalance.objects.create(
+            office=office, currency=usd, balance=Decimal('1234.5')
+        )
+        CurrencyBalance.objects.create(
+            office=office, currency=rub, balance=Decimal('0')
+        )
+
+        body = self.assert_same(owner_api_client, reverse('balance-by-office'),
+                                {'office_id': office.pk})
+        assert b'"1234.50"' in body
+
+    def test_order_list_with_items(self, operator_api_client,
+                                   authenticated_api_client, order, office,
+                                   user, rate, usd, rub):
+        Currency.objects.filter(pk=rub.pk).update(decimal_places=0)
+        OrderItem.objects.create(
+            order=order, from_currency=usd, to_currency=rub,
+            amount_from=Decimal('10.555'), amount_to=Decimal('955.2275'),
+            rate=rate.rate,
+        )
+        Order.objects.create(user=user, office=office, comment='Без элементов')
+        url = reverse('order-list')
+
+        self.assert_same(operator_api_client, url)
+        self.assert_same(authenticated_api_client, url)
+
+    def test_archived_order_list(self, authenticated_api_client, order):
+        Order.objects.filter(pk=order.pk).update(
+            status='completed',
+            updated_at=timezone.now() - timedelta(days=365),
+        )
+        archive_batch(older_than_days=30)
+
+        body = self.assert_same(authenticated_api_client,
+                                reverse('order-list'), {'archived': 1})
+        assert order.tracking_code.encode() in body
+
+    def test_browsable_api_uses_serializers(self, api_client, rate):
+        response = api_client.get(reverse('rate-list'), HTTP_ACCEPT='text/html')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not isinstance(response.accepted_renderer, ORJSONRenderer)
+
+    def test_unsupported_fields_must_be_computed(self):
+        with pytest.raises(ImproperlyConfigured, match='status_display'):
+            serializer_columns(OrderSerializer())
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+    """?fields= and ?expand= prune the response and the queries."""
+
+    def get(self, client, url, data=None):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = client.get(url, data)
+        return response, [query['sql'] for query in queries]
+
+    @pytest.mark.parametrize('fast', [False, True])
+    def test_order_list_fields(self, operator_api_client, order, fast):
+        url = reverse('order-list')
+        with override_settings(FAST_LIST_RESPONSES=fast):
+            full, full_queries = self.get(operator_api_client, url)
+            sparse, queries = self.get(
+                operator_api_client, url,
+                {'fields': 'id,status_display,total_items'},
+            )
+
+        assert sparse.status_code == status.HTTP_200_OK
+        assert sparse.json() == [{
+            'id': order.pk, 'status_display': 'Новый', 'total_items': 1,
+        }]
+        assert len(queries) == len(full_queries)
+        assert full.json()[0]['total_items'] == 1
+
+    @pytest.mark.parametrize('fast', [False, True])
+    def test_order_list_without_expandable_fields(self, operator_api_client,
+                                                  order, fast):
+        url = reverse('order-list')
+        with override_settings(FAST_LIST_RESPONSES=fast):
+            full, full_queries = self.get(operator_api_client, url)
+            sparse, queries = self.get(operator_api_client, url,
+                                       {'expand': ''})
+
+        expected = {
+            key: value for key, value in full.json()[0].items()
+            if key not in ('items', 'total_from_amount', 'total_to_amount',
+                           'total_items')
+        }
+        assert sparse.json() == [expected]
+        # Элементы заказов не читаются
+        assert len(queries) == len(full_queries) - 1
+        assert not any('orders_orderitem' in sql for sql in queries)
+
+    def test_columns_and_joins_are_pruned(self, api_client, rate):
+        response, queries = self.get(api_client, reverse('rate-list'),
+                                     {'fields': 'id,rate'})
+
+        assert response.json() == [{'id': rate.pk, 'rate': '90.5000'}]
+        assert 'JOIN' not in queries[0]
+        assert 'min_amount' not in queries[0]
+
+        with override_settings(FAST_LIST_RESPONSES=False):
+            response, queries = self.get(api_client, reverse('rate-list'),
+                                         {'fields': 'id,from_currency_code'})
+        assert response.json() == [{'id': rate.pk, 'from_currency_code': 'USD'}]
+        assert 'JOIN' in queries[0]
+        assert 'min_amount' not in queries[0]
+
+    def test_retrieve_and_user_profile(self, authenticated_api_client,
+                                       order, user):
+        response = authenticated_api_client.get(
+            reverse('order-detail', args=[order.pk]),
+            {'fields': 'tracking_code', 'expand': ''},
+        )
+        assert response.json() == {'tracking_code': order.tracking_code}
+
+        response = authenticated_api_client.get(reverse('user-me'),
+                                                {'expand': ''})
+        assert 'referral_link' not in response.json()
+        assert response.json()['email'] == user.email
+
+    def test_unknown_fields_are_rejected(self, api_client, rate):
+        response = api_client.get(reverse('rate-list'),
+                                  {'fields': 'id,secret', 'expand': 'rate'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert set(response.json()) == {'fields', 'expand'}
+
+    def test_public_review_cache_depends_on_fieldset(self, api_client, order):
+        order.status = 'completed'
+        order.save()
+        Review.objects.create(order=order, rating=5, text='Отлично')
+        url = reverse('review-list-public')
+
+        full = api_client.get(url).json()
+        sparse = api_client.get(url, {'fields': 'rating'}).json()
+
+        assert sparse['results'] == [{'rating': 5}]
+        assert api_client.get(url).json() == full
+        assert full['results'][0]['display_name'] == 'Test'
+
+    def test_writes_ignore_fieldset(self, operator_api_client, order):
+        response = operator_api_client.patch(
+            reverse('order-detail', args=[order.pk]) + '?fields=id',
+            {'comment': 'Позвоните заранее'},
+            format='json',
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['comment'] == 'Позвоните заранее'
+        assert 'items' in response.json()
+
+
+@pytest.mark.django_db
+class TestVersionedCache:
+    """Test the versioned read-through cache (core.cache)."""
+
+    def build(self, value):
+        calls = []
+
+        def build():
+            calls.append(value)
+            return value
+        return build, calls
+
+    def test_model_changes_bump_the_namespace(
+        self, api_client, rate, django_capture_on_commit_callbacks,
+        django_assert_num_queries
+    ):
+        url = reverse('rate-list')
+        assert api_client.get(url).data[0]['rate'] == '90.5000'
+        with django_assert_num_queries(0):
+            api_client.get(url)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            rate.rate = Decimal('91.0000')
+            rate.save()
+        assert api_client.get(url).data[0]['rate'] == '91.0000'
+
+        # Код валюты виден в списке курсов
+        with django_capture_on_commit_callbacks(execute=True):
+            rate.from_currency.code = 'USX'
+            rate.from_currency.save()
+        assert api_client.get(url).data[0]['from_currency_code'] == 'USX'
+
+    def test_keys_include_query_string(self, owner_api_client, office, usd):
+        CurrencyBalance.objects.create(
+            office=office, currency=usd, balance=Decimal('5')
+        )
+        url = reverse('balance-by-office')
+
+        assert len(owner_api_client.get(url, {'office_id': office.pk}).data) == 1
+        assert owner_api_client.get(url, {'office_id': 0}).data == []
+
+    def test_stale_value_is_served_while_rebuilding(self):
+        build, calls = self.build('old')
+        assert cached('test', 'key', build=build, timeout=0, stale=60) == 'old'
+
+        # Другой процесс уже пересобирает значение
+        cache.add(LOCK_KEY.format(cache_key('test', 'key')), 1)
+        build, calls = self.build('new')
+        assert cached('test', 'key', build=build, timeout=0) == 'old'
+        assert calls == []
+
+        cache.delete(LOCK_KEY.format(cache_key('test', 'key')))
+        assert cached('test', 'key', build=build, timeout=0) == 'new'
+        assert calls == ['new']
+
+    def test_concurrent_misses_wait_for_one_build(self):
+        lock = LOCK_KEY.format(cache_key('test', 'key'))
+        cache.add(lock, 1)
+        # Сборку выполняет другой запрос и сохраняет значение позже
+        with patch('core.cache.time.sleep',
+                   lambda seconds: cache.set(cache_key('test', 'key'),
+                                             ('built', float('inf')))):
+            build, calls = self.build('own')
+            assert cached('test', 'key', build=build) == 'built'
+        assert calls == []
+
+    def test_lru_cache_counts_evictions(self):
+        lru = LRUCache('test-lru', {'OPTIONS': {'MAX_ENTRIES': 2}})
+        lru.clear()
+        before = EVICTIONS._values.get(('test-lru',), 0)
+
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        assert (lru.get('a'), lru.get('b'), lru.get('c')) == (1, None, 3)
+        assert EVICTIONS._values[('test-lru',)] == before + 1
+        assert 'cache_evictions_total{cache="test-lru"}' in render_metrics()
+
+
+@pytest.mark.django_db
+class TestThrottling:
+    """Test token-bucket throttling of public endpoints (core.throttling)."""
+
+    def get(self, client, url, ip='10.0.0.1'):
+        return client.get(url, REMOTE_ADDR=ip)
+
+    @override_settings(THROTTLE_RATES={'anon': '2/min'})
+    def test_anonymous_clients_are_limited_by_ip(self, api_client, usd):
+        url = reverse('currency-list')
+        assert self.get(api_client, url).status_code == status.HTTP_200_OK
+        assert self.get(api_client, url).status_code == status.HTTP_200_OK
+
+        response = self.get(api_client, url)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response['Retry-After'] == '30'
+        # У другого адреса своя корзина, у другого эндпоинта тоже
+        assert self.get(api_client, url, ip='10.0.0.2').status_code == 200
+        assert self.get(api_client, reverse('rate-list')).status_code == 200
+        assert 'throttled_requests_total{endpoint="currency-list"}' in (
+            render_metrics()
+        )
+
+    @override_settings(THROTTLE_RATES={'user': '1/min', 'anon': '1/min'})
+    def test_authenticated_clients_are_limited_by_user(
+        self, authenticated_api_client, rate
+    ):
+        url = reverse('rate-calculate', args=[rate.pk])
+        data = {'amount_from': '100'}
+        assert authenticated_api_client.post(
+            url, data, REMOTE_ADDR='10.0.0.1'
+        ).status_code == status.HTTP_200_OK
+        assert authenticated_api_client.post(
+            url, data, REMOTE_ADDR='10.0.0.2'
+        ).status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    @override_settings(THROTTLE_RATES={'endpoint': '2/min'})
+    def test_endpoint_bucket_is_shared_by_clients(self, api_client, order):
+        url = reverse('order-tracking', args=[order.tracking_code])
+        assert self.get(api_client, url, ip='10.0.0.1').status_code == 200
+        assert self.get(api_client, url, ip='10.0.0.2').status_code == 200
+        assert self.get(api_client, url, ip='10.0.0.3').status_code == 429
+
+    @override_settings(THROTTLE_RATES={'anon': '1/min'})
+    def test_other_actions_are_not_limited(self, api_client, usd):
+        url = reverse('currency-detail', args=[usd.pk])
+        for _ in range(3):
+            assert self.get(api_client, url).status_code == 200
+
+    @override_settings(THROTTLE_RATES={'anon': '2/min'})
+    def test_async_path_takes_one_token_per_request(self, api_client, order):
+        # Неизвестный код: асинхронный view передаёт запрос синхронному
+        url = reverse('order-tracking', args=['missing'])
+        with async_hot_endpoints(True):
+            assert self.get(api_client, url).status_code == 404
+            assert self.get(api_client, url).status_code == 404
+            response = self.get(api_client, url)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response['Retry-After'] == '30'
+
+    def test_buckets_refill_and_refused_requests_take_nothing(self):
+        buckets = LocalBuckets()
+        bucket = [('key', *parse_rate('2/s'))]
+        with patch('core.throttling.time.monotonic', return_value=100.0):
+            assert buckets.take(bucket) == 0
+            assert buckets.take(bucket) == 0
+            assert buckets.take(bucket) == pytest.approx(0.5)
+            assert buckets.take(bucket) == pytest.approx(0.5)
+        with patch('core.throttling.time.monotonic', return_value=100.5):
+            assert buckets.take(bucket) == 0
+            assert buckets.take(bucket) > 0
+
+    def test_local_buckets_are_bounded(self):
+        buckets = LocalBuckets(max_buckets=2)
+        for key in 'abc':
+            buckets.take([(key, 1, 1.0)])
+        # Вытесненная корзина снова полная
+        assert buckets.take([('a', 1, 1.0)]) == 0
+        assert buckets.take([('c', 1, 1.0)]) > 0
+
+
+@pytest.mark.django_db
+class TestReferenceSync:
+    """Test delta sync of reference data (exchange.sync)."""
+
+    def sync(self, client, **seen):
+        response = client.get(reverse('sync-list'), seen)
+        assert response.status_code == status.HTTP_200_OK
+        return response.data
+
+    def test_first_sync_returns_readable_tables_in_full(
+        self, api_client, owner_api_client, rate, office
+    ):
+        data = self.sync(api_client)
+        assert set(data) == {'currencies', 'rates'}
+        assert data['rates']['full'] is True
+        assert [row['id'] for row in data['rates']['updated']] == [rate.pk]
+        assert len(data['currencies']['updated']) == 2
+
+        assert set(self.sync(owner_api_client)) == {
+            'currencies', 'rates', 'offices', 'balances'
+        }
+
+    def test_changes_and_tombstones_since_version(
+        self, api_client, rate, usd, rub, django_assert_max_num_queries
+    ):
+        seen = {
+            name: table['version']
+            for name, table in self.sync(api_client).items()
+        }
+        with django_assert_max_num_queries(2):
+            data = self.sync(api_client, **seen)
+        assert data['rates'] == {
+            'version': seen['rates'], 'full': False,
+            'updated': [], 'deleted': [],
+        }
+
+        eur = Currency.objects.create(code='EUR', name='Евро', symbol='€')
+        other = ExchangeRate.objects.create(
+            from_currency=eur, to_currency=rub,
+            rate=Decimal('99.0000'), min_amount=Decimal('10.00'),
+        )
+        rate.is_active = False
+        rate.save()
+        data = self.sync(api_client, **seen)
+
+        assert data['currencies']['full'] is False
+        assert [row['code'] for row in data['currencies']['updated']] == [
+            'EUR'
+        ]
+        assert data['currencies']['version'] > seen['currencies']
+        # Неактивный курс пропал из списка и приходит как удалённый
+        assert [row['id'] for row in data['rates']['updated']] == [other.pk]
+        assert data['rates']['deleted'] == [rate.pk]
+
+        seen = {name: table['version'] for name, table in data.items()}
+        other_id = other.pk
+        other.delete()
+        data = self.sync(api_client, **seen)
+        assert data['rates']['updated'] == []
+        assert data['rates']['deleted'] == [other_id]
+        assert data['currencies']['updated'] == []
+
+    def test_currency_change_updates_rates_and_balances(
+        self, owner_api_client, rate, office, usd
+    ):
+        CurrencyBalance.objects.create(
+            office=office, currency=usd, balance=Decimal('5')
+        )
+        seen = {
+            name: table['version']
+            for name, table in self.sync(owner_api_client).items()
+        }
+        usd.code = 'USX'
+        usd.save()
+
+        data = self.sync(owner_api_client, **seen)
+        assert data['rates']['updated'][0]['from_currency_code'] == 'USX'
+        assert data['balances']['updated'][0]['currency_code'] == 'USX'
+        assert data['offices']['updated'] == []
+
+    def test_reset_and_unknown_versions_send_tables_in_full(
+        self, api_client, rate
+    ):
+        version = self.sync(api_client)['rates']['version']
+        assert self.sync(api_client, rates=version + 5)['rates']['full']
+
+        reset_tables(ExchangeRate)
+        data = self.sync(api_client, rates=version)['rates']
+        assert data['full'] is True
+        assert len(data['updated']) == 1
+        assert self.sync(api_client, rates=data['version'])['rates'][
+            'full'
+        ] is False
+
+    def test_invalid_version(self, api_client):
+        response = api_client.get(reverse('sync-list'), {'rates': -1})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestBootstrapBundle:
+    """Test the precomputed storefront bundle (core.bootstrap)."""
+
+    def test_public_data_in_compact_tables(
+        self, api_client, rate, office, order, django_assert_num_queries
+    ):
+        Review.objects.create(order=order, rating=5, text='Отлично')
+        response = api_client.get(reverse('bootstrap'))
+        assert response.status_code == status.HTTP_200_OK
+        data = json.loads(response.content)
+
+        assert data['currencies']['fields'] == ['id', 'code', 'name', 'symbol']
+        assert [row[1] for row in data['currencies']['rows']] == ['RUB', 'USD']
+        assert data['rates']['rows'] == [[
+            rate.pk, rate.from_currency_id, rate.to_currency_id,
+            '90.5000', '10.00',
+            api_client.get(reverse('rate-list')).data[0]['updated_at'],
+        ]]
+        assert data['offices']['rows'][0][:2] == [office.pk, 'Центр']
+        assert data['reviews']['rows'][0][:2] == [5, 'Отлично']
+        assert data['rating']['count'] == 1
+
+        # Повторный запрос отдаётся из кэша без SQL
+        with django_assert_num_queries(0):
+            assert api_client.get(reverse('bootstrap')).content == (
+                response.content
+            )
+
+    def test_compressed_and_conditional_responses(self, api_client, rate):
+        plain = api_client.get(reverse('bootstrap'))
+        assert 'Content-Encoding' not in plain
+        assert 'Accept-Encoding' in plain['Vary']
+
+        packed = api_client.get(
+            reverse('bootstrap'), HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        assert packed['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(packed.content) == plain.content
+        assert packed['ETag'] == plain['ETag']
+
+        not_modified = api_client.get(
+            reverse('bootstrap'), HTTP_IF_NONE_MATCH=plain['ETag']
+        )
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+        assert not_modified.content == b''
+
+    def test_rebuilt_when_data_changes(
+        self, api_client, rate, django_capture_on_commit_callbacks
+    ):
+        etag = api_client.get(reverse('bootstrap'))['ETag']
+        with django_capture_on_commit_callbacks(execute=True):
+            rate.rate = Decimal('91.0000')
+            rate.save()
+
+        response = api_client.get(
+            reverse('bootstrap'), HTTP_IF_NONE_MATCH=etag
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+        assert json.loads(response.content)['rates']['rows'][0][3] == (
+            '91.0000'
+        )
+
+    def test_only_safe_methods(self, api_client):
+        response = api_client.post(reverse('bootstrap'))
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+    def test_accepted_encodings(self, rf):
+        request = rf.get('/', HTTP_ACCEPT_ENCODING='br;q=0, GZIP;q=0.5, *')
+        assert accepted_encodings(request) == {'gzip', '*'}
+
+
+CALLS = []
+
+
+def record_call(value, fail=False):
+    """Job used by the tests below."""
+    if fail:
+        raise ValueError('Job failed')
+    CALLS.append(value)
+
+
+@pytest.fixture
+def jobs(settings, monkeypatch):
+    settings.JOB_SCHEDULE = {}
+    monkeypatch.setattr('core.jobs._scheduled_keys', set())
+    CALLS.clear()
+    return CALLS
+
+
+@pytest.mark.django_db
+class TestJobs:
+    """Test the database job queue (core.jobs)."""
+
+    def test_jobs_run_by_priority_then_time(self, jobs):
+        enqueue(record_call, ['low'])
+        enqueue('tests.test_core.record_call', ['high'], priority=5)
+        enqueue(record_call, ['later'], run_at=timezone.now() + timedelta(
+            hours=1
+        ))
+        out = StringIO()
+        call_command('run_jobs', '--once', stdout=out)
+
+        assert jobs == ['high', 'low']
+        assert 'Processed 2 jobs' in out.getvalue()
+        assert Job.objects.filter(status=Job.SUCCEEDED).count() == 2
+        assert Job.objects.get(args=['later']).status == Job.PENDING
+
+    def test_enqueue_with_key_adds_one_job(self, jobs):
+        first = enqueue(record_call, ['a'], key='report:1')
+        assert enqueue(record_call, ['b'], key='report:1') == first
+        assert Job.objects.count() == 1
+
+        with pytest.raises(ImportError):
+            enqueue('tests.test_core.missing')
+
+    def test_failed_job_is_retried_with_backoff(self, jobs):
+        job = enqueue(record_call, ['x'], {'fail': True}, max_attempts=2)
+        assert run_batch(['default']) == 1
+        job.refresh_from_db()
+        assert job.status == Job.PENDING
+        assert job.attempts == 1
+        assert job.available_at > timezone.now()
+        assert 'Job failed' in job.last_error
+
+        Job.objects.update(available_at=timezone.now())
+        run_batch(['default'])
+        job.refresh_from_db()
+        assert job.status == Job.FAILED
+        assert job.finished_at is not None
+
+    def test_queue_concurrency_and_pause(self, jobs):
+        JobQueue.objects.create(name='exports', concurrency=1)
+        for value in ('a', 'b'):
+            enqueue(record_call, [value], queue='exports')
+
+        claimed = claim_jobs('exports', 10)
+        assert [job.args for job in claimed] == [['a']]
+        assert claim_jobs('exports', 10) == []
+
+        # Истёкшая аренда освобождает место: воркер считается упавшим
+        Job.objects.filter(pk=claimed[0].pk).update(
+            available_at=timezone.now() - timedelta(seconds=1)
+        )
+        reclaimed = claim_jobs('exports', 10)
+        assert reclaimed[0].pk == claimed[0].pk
+        assert reclaimed[0].attempts == 2
+
+        JobQueue.objects.filter(name='exports').update(
+            paused=True, concurrency=None
+        )
+        assert claim_jobs('exports', 10) == []
+
+    def test_lost_last_attempt_fails(self, jobs):
+        job = enqueue(record_call, ['x'], max_attempts=1)
+        claim_jobs('default', 1)
+        Job.objects.update(available_at=timezone.now())
+
+        assert run_batch(['default']) == 1
+        job.refresh_from_db()
+        assert job.status == Job.FAILED
+        assert 'Lease expired' in job.last_error
+        assert jobs == []
+
+    def test_recurring_job_added_once_per_period(self, jobs, settings):
+        settings.JOB_SCHEDULE = {
+            'ping': {'task': 'tests.test_core.record_call',
+                     'args': ['ping'], 'every': 3600},
+        }
+        assert schedule_recurring() == 1
+        assert schedule_recurring() == 0
+        with patch('core.jobs._scheduled_keys', set()):
+            # Другой воркер добавляет тот же период без дублей
+            schedule_recurring()
+        assert Job.objects.count() == 1
+
+        later = timezone.now() + timedelta(hours=1)
+        assert schedule_recurring(later) == 1
+        assert Job.objects.count() == 2
+
+    def test_purge_keeps_current_recurring_jobs(self, jobs, settings):
+        settings.JOB_SCHEDULE = {
+            'ping': {'task': 'tests.test_core.record_call',
+                     'args': ['ping'], 'every': 30 * 24 * 3600},
+        }
+        schedule_recurring()
+        enqueue(record_call, ['old'])
+        run_batch(['default'], batch_size=10)
+        Job.objects.update(finished_at=timezone.now() - timedelta(days=8))
+
+        assert purge_finished(days=7) == 1
+        assert Job.objects.get().key.startswith('schedule:ping:')
+
+    def test_run_jobs_starts_worker_threads(self, jobs):
+        with patch(
+            'core.management.commands.run_jobs.work', return_value=2
+        ) as work:
+            out = StringIO()
+            call_command(
+                'run_jobs', '--once', '--workers', '3',
+                '--queue', 'default', '--queue', 'exports', stdout=out,
+            )
+
+        assert work.call_count == 3
+        assert work.call_args.kwargs['queues'] == ['default', 'exports']
+        assert work.call_args.kwargs['stop'] is not None
+        assert 'Processed 6 jobs' in out.getvalue()
@@ -0,0 +1,785 @@
+"""
+Tests for the orders app.
+"""
+import asyncio
+import csv
+import io
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from exchange.models import ExchangeOffice
+from orders.archive import archive_batch
+from orders.models import (
+    ArchivedOrder,
+    ArchivedOrderDocument,
+    Order,
+    OrderDocument,
+    OrderEvent,
+    OrderNotification,
+    OrderSearchEntry,
+    Review,
+)
+from orders.notifications import WebhookDispatcher, record_results
+from orders.outbox import process_batch
+from orders.reviews import rebuild_stats, review_statistics
+
+DOCUMENT_CONTENT = b'%PDF-1.4 receipt content 0123456789'
+
+
+@pytest.fixture
+def document(order, settings, tmp_path):
+    """Creates a receipt document stored in a temporary MEDIA_ROOT."""
+    settings.MEDIA_ROOT = tmp_path
+    return OrderDocument.objects.create(
+        order=order,
+        document_type='receipt',
+        file=SimpleUploadedFile('receipt.pdf', DOCUMENT_CONTENT),
+        uploaded_by=order.user,
+    )
+
+
+class StubWebhookServer(ThreadingHTTPServer):
+    """Local HTTP server recording webhook calls.
+
+    Responds with the queued status codes first, then with 200.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubWebhookHandler)
+        self.requests = []
+        self.client_ports = set()
+        self.statuses = []
+        # Заголовок Retry-After для ответов с ошибкой
+        self.retry_after = None
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/notify'
+
+
+class StubWebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with self.server.lock:
+            self.server.requests.append(json.loads(body))
+            self.server.client_ports.add(self.client_address[1])
+            status_code = (
+                self.server.statuses.pop(0) if self.server.statuses else 200
+            )
+        self.send_response(status_code)
+        if status_code >= 400 and self.server.retry_after is not None:
+            self.send_header('Retry-After', self.server.retry_after)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def webhook_server():
+    server = StubWebhookServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+HANDLED_EVENTS = []
+
+
+def record_handled(event):
+    """Outbox handler used by the tests."""
+    HANDLED_EVENTS.append((event.event_type, event.order_id))
+
+
+def failing_handler(event):
+    raise RuntimeError('handler is down')
+
+
+def download_url(document):
+    return reverse(
+        'order-download-document',
+        kwargs={'pk': document.order_id, 'document_id': document.pk},
+    )
+
+
+@pytest.mark.django_db
+class TestOrderDocumentDownload:
+    """Test protected order document downloads."""
+
+    def test_owner_downloads_file(
+        self, authenticated_api_client, document, settings
+    ):
+        settings.SENDFILE_BACKEND = 'simple'
+        response = authenticated_api_client.get(download_url(document))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert b''.join(response.streaming_content) == DOCUMENT_CONTENT
+        assert response['Accept-Ranges'] == 'bytes'
+        assert 'receipt.pdf' in response['Content-Disposition']
+
+    def test_range_request(self, authenticated_api_client, document, settings):
+        settings.SENDFILE_BACKEND = 'simple'
+        response = authenticated_api_client.get(
+            download_url(document), HTTP_RANGE='bytes=5-12'
+        )
+
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert b''.join(response.streaming_content) == DOCUMENT_CONTENT[5:13]
+        assert response['Content-Range'] == (
+            f'bytes 5-12/{len(DOCUMENT_CONTENT)}'
+        )
+
+    def test_unsatisfiable_range(
+        self, authenticated_api_client, document, settings
+    ):
+        settings.SENDFILE_BACKEND = 'simple'
+        response = authenticated_api_client.get(
+            download_url(document), HTTP_RANGE='bytes=1000-'
+        )
+
+        assert response.status_code == 416
+
+    def test_nginx_backend_offloads_transfer(
+        self, authenticated_api_client, document, settings
+    ):
+        settings.SENDFILE_BACKEND = 'nginx'
+        settings.SENDFILE_URL = '/protected-media/'
+        response = authenticated_api_client.get(download_url(document))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == b''
+        assert response['X-Accel-Redirect'] == (
+            '/protected-media/' + document.file.name
+        )
+
+    def test_foreign_order_is_hidden(self, document, django_user_model):
+        stranger = django_user_model.objects.create_user(
+            email='stranger@example.com', username='stranger'
+        )
+        client = APIClient()
+        client.force_authenticate(user=stranger)
+
+        response = client.get(download_url(document))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_documents_list_exposes_download_url(
+        self, authenticated_api_client, document
+    ):
+        url = reverse('order-documents', kwargs={'pk': document.order_id})
+        response = authenticated_api_client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'file' not in response.data[0]
+        assert response.data[0]['download_url'].endswith(
+            download_url(document)
+        )
+
+
+@pytest.mark.django_db
+class TestOrderOutbox:
+    """Test the transactional outbox of order events."""
+
+    def test_create_order_records_event(
+        self, authenticated_api_client, office, rate
+    ):
+        data = {
+            'office': office.id,
+            'items': [{
+                'from_currency': rate.from_currency_id,
+                'to_currency': rate.to_currency_id,
+                'amount_from': '100',
+                'amount_to': '9050',
+                'rate': '90.5000',
+            }],
+        }
+        response = authenticated_api_client.post(
+            reverse('order-list'), data, format='json'
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        event = OrderEvent.objects.get()
+        assert event.event_type == OrderEvent.ORDER_CREATED
+        assert event.order_id == response.data['id']
+        assert event.status == OrderEvent.PENDING
+
+    def test_status_update_records_event(self, operator_api_client, order):
+        url = reverse('order-update-status', kwargs={'pk': order.pk})
+        response = operator_api_client.patch(url, {'status': 'processing'})
+
+        assert response.status_code == status.HTTP_200_OK
+        event = OrderEvent.objects.get(event_type=OrderEvent.STATUS_CHANGED)
+        assert event.payload == {
+            'old_status': 'new', 'new_status': 'processing'
+        }
+
+    def test_complete_requires_documents(self, operator_api_client, order):
+        Order.objects.filter(pk=order.pk).update(status='waiting_delivery')
+        url = reverse('order-update-status', kwargs={'pk': order.pk})
+        response = operator_api_client.patch(url, {'status': 'completed'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not OrderEvent.objects.exists()
+
+    def test_worker_delivers_events(self, order, settings):
+        settings.ORDER_EVENT_HANDLERS = {
+            OrderEvent.STATUS_CHANGED: ['tests.test_orders.record_handled'],
+        }
+        HANDLED_EVENTS.clear()
+        order.set_status('processing')
+
+        call_command('process_outbox', '--once', stdout=StringIO())
+
+        assert HANDLED_EVENTS == [(OrderEvent.STATUS_CHANGED, order.pk)]
+        event = OrderEvent.objects.get()
+        assert event.status == OrderEvent.PROCESSED
+        assert event.processed_at is not None
+
+    def test_failed_event_is_retried_with_backoff(self, order, settings):
+        settings.ORDER_EVENT_HANDLERS = {
+            OrderEvent.STATUS_CHANGED: ['tests.test_orders.failing_handler'],
+        }
+        settings.OUTBOX_MAX_ATTEMPTS = 2
+        order.set_status('processing')
+
+        assert process_batch() == 1
+        event = OrderEvent.objects.get()
+        assert event.status == OrderEvent.PENDING
+        assert event.attempts == 1
+        assert event.available_at > timezone.now()
+        assert 'handler is down' in event.last_error
+        # The event is not available until the backoff expires
+        assert process_batch() == 0
+
+        OrderEvent.objects.update(available_at=timezone.now())
+        process_batch()
+        event.refresh_from_db()
+        assert event.status == OrderEvent.FAILED
+
+
+def send_notifications(endpoints, notifications, **kwargs):
+    async def run():
+        async with WebhookDispatcher(endpoints, **kwargs) as dispatcher:
+            return await dispatcher.send_all(notifications)
+    return asyncio.run(run())
+
+
+class TestWebhookDispatcher:
+    """Test the asyncio webhook dispatcher against a local stub server."""
+
+    def make_notifications(self, count):
+        return [
+            OrderNotification(
+                order_id=index,
+                channel=OrderNotification.TELEGRAM,
+                recipient='@client',
+                payload={'order': {'id': index}},
+            )
+            for index in range(count)
+        ]
+
+    def test_reuses_pooled_connections(self, webhook_server):
+        endpoints = {'telegram': {'url': webhook_server.url}}
+        errors = send_notifications(
+            endpoints, self.make_notifications(30), concurrency=3
+        )
+
+        assert errors == [None] * 30
+        assert len(webhook_server.requests) == 30
+        assert len(webhook_server.client_ports) <= 3
+
+    def test_retries_transient_errors(self, webhook_server):
+        webhook_server.statuses = [503, 429]
+        endpoints = {'telegram': {'url': webhook_server.url}}
+        errors = send_notifications(
+            endpoints, self.make_notifications(1),
+            max_retries=3, retry_backoff=0.01,
+        )
+
+        assert errors == [None]
+        assert len(webhook_server.requests) == 3
+
+    def test_honors_retry_after(self, webhook_server):
+        webhook_server.statuses = [429]
+        webhook_server.retry_after = '0.2'
+        endpoints = {'telegram': {'url': webhook_server.url}}
+        started = time.monotonic()
+        errors = send_notifications(
+            endpoints, self.make_notifications(1), retry_backoff=0.001
+        )
+
+        assert errors == [None]
+        assert time.monotonic() - started >= 0.2
+
+    @pytest.mark.django_db
+    def test_long_retry_after_defers_notification(
+        self, webhook_server, settings
+    ):
+        webhook_server.statuses = [429]
+        webhook_server.retry_after = '3600'
+        endpoints = {'telegram': {'url': webhook_server.url}}
+        notifications = self.make_notifications(1)
+        notifications[0].save()
+        errors = send_notifications(endpoints, notifications)
+
+        assert errors == ['HTTP 429']
+        assert len(webhook_server.requests) == 1
+        record_results(notifications, errors)
+        notifications[0].refresh_from_db()
+        assert notifications[0].available_at >= (
+            timezone.now() + timedelta(seconds=3590)
+        )
+
+    def test_does_not_retry_client_errors(self, webhook_server):
+        webhook_server.statuses = [400]
+        endpoints = {'telegram': {'url': webhook_server.url}}
+        errors = send_notifications(
+            endpoints, self.make_notifications(1), retry_backoff=0.01
+        )
+
+        assert errors == ['HTTP 400']
+        assert len(webhook_server.requests) == 1
+
+
+@pytest.mark.django_db
+class TestStatusNotifications:
+    """Test status change notifications end to end."""
+
+    def test_status_change_notifies_contacts(
+        self, order, settings, webhook_server
+    ):
+        settings.ORDER_NOTIFICATION_WEBHOOKS = {
+            'telegram': {'url': webhook_server.url, 'rate_per_second': 50},
+            'whatsapp': {'url': None},
+        }
+        order.telegram = '@client'
+        order.whatsapp = '+79990000000'
+        order.save()
+
+        order.set_status('processing')
+        process_batch()
+        # Повторная доставка события не создаёт дубликатов
+        OrderEvent.objects.update(status=OrderEvent.PENDING)
+        process_batch()
+
+        notification = OrderNotification.objects.get()
+        assert notification.channel == OrderNotification.TELEGRAM
+
+        call_command('send_order_notifications', '--once', stdout=StringIO())
+
+        notification.refresh_from_db()
+        assert notification.status == OrderNotification.SENT
+        assert webhook_server.requests == [notification.payload]
+        assert notification.payload['order']['status'] == 'processing'
+
+    def test_each_transition_reports_its_status(self, order, settings):
+        settings.ORDER_NOTIFICATION_WEBHOOKS = {
+            'telegram': {'url': 'http://127.0.0.1:9/notify'},
+        }
+        order.telegram = '@client'
+        order.save()
+
+        # Заказ меняет статус дважды до обработки событий
+        order.set_status('processing')
+        order.set_status('waiting_delivery')
+        process_batch()
+
+        assert [
+            notification.payload['order']['status']
+            for notification in OrderNotification.objects.order_by('id')
+        ] == ['processing', 'waiting_delivery']
+
+
+@pytest.fixture
+def old_completed_order(order, document):
+    """The test order completed a year ago, with a document and a review."""
+    Review.objects.create(order=order, rating=5, text='Отлично')
+    Order.objects.filter(pk=order.pk).update(
+        status='completed',
+        updated_at=timezone.now() - timedelta(days=365),
+    )
+    order.refresh_from_db()
+    return order
+
+
+@pytest.mark.django_db
+class TestOrderArchive:
+    """Test archival of old orders."""
+
+    def test_moves_order_with_related_rows(self, old_completed_order):
+        tracking_url = reverse(
+            'order-tracking',
+            kwargs={'tracking_code': old_completed_order.tracking_code}
+        )
+        before = APIClient().get(tracking_url).data
+
+        call_command(
+            'archive_orders', '--older-than-days', '30', stdout=StringIO()
+        )
+
+        assert not Order.objects.filter(pk=old_completed_order.pk).exists()
+        archived = ArchivedOrder.objects.get(pk=old_completed_order.pk)
+        assert archived.items.count() == 1
+        assert archived.review.rating == 5
+        document = ArchivedOrderDocument.objects.get(order=archived)
+        assert document.file.read() == DOCUMENT_CONTENT
+        # Трекинг прозрачно читает архив
+        assert APIClient().get(tracking_url).data == before
+
+    def test_keeps_recent_and_active_orders(self, order, office, user):
+        Order.objects.filter(pk=order.pk).update(status='completed')
+        active = Order.objects.create(user=user, office=office)
+        Order.objects.filter(pk=active.pk).update(
+            updated_at=timezone.now() - timedelta(days=365)
+        )
+
+        assert archive_batch(older_than_days=30) == 0
+        assert Order.objects.count() == 2
+
+    def test_staff_and_owner_read_archived_order(
+        self, old_completed_order, operator_api_client,
+        authenticated_api_client
+    ):
+        archive_batch(older_than_days=30)
+        url = reverse('order-detail', kwargs={'pk': old_completed_order.pk})
+
+        response = operator_api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['tracking_code'] == (
+            old_completed_order.tracking_code
+        )
+
+        response = authenticated_api_client.get(
+            reverse('order-list'), {'archived': 1}
+        )
+        assert [o['id'] for o in response.data] == [old_completed_order.pk]
+
+    def test_archived_documents_and_bad_id(
+        self, old_completed_order, authenticated_api_client, document,
+        settings
+    ):
+        settings.SENDFILE_BACKEND = 'simple'
+        archive_batch(older_than_days=30)
+
+        response = authenticated_api_client.get(reverse(
+            'order-documents', kwargs={'pk': old_completed_order.pk}
+        ))
+        assert response.status_code == status.HTTP_200_OK
+        assert [d['id'] for d in response.data] == [document.pk]
+
+        response = authenticated_api_client.get(download_url(document))
+        assert response.status_code == status.HTTP_200_OK
+        assert b''.join(response.streaming_content) == DOCUMENT_CONTENT
+
+        response = authenticated_api_client.get(
+            reverse('order-detail', kwargs={'pk': 'abc'})
+        )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_search_and_admin_find_archived_order(
+        self, old_completed_order, operator_api_client, admin_user, client
+    ):
+        Order.objects.filter(pk=old_completed_order.pk).update(
+            telegram='@archived_client'
+        )
+        archive_batch(older_than_days=30)
+
+        response = operator_api_client.get(
+            reverse('order-search'), {'q': 'archived_cl'}
+        )
+        assert [o['id'] for o in response.data] == [old_completed_order.pk]
+
+        client.force_login(admin_user)
+        response = client.get(
+            reverse('admin:orders_order_changelist'), {'q': 'archived_cl'}
+        )
+        assert 'Найдены архивные заказы' in response.content.decode()
+
+
+@pytest.mark.django_db
+class TestOrderSearch:
+    """Tests for the operator search endpoint"""
+
+    def search(self, client, query):
+        return client.get(reverse('order-search'), {'q': query})
+
+    def test_finds_order_by_contacts_and_email(
+        self, operator_api_client, order, user
+    ):
+        order.telegram = '@ivan_petrov'
+        order.whatsapp = '+7 (999) 123-45-67'
+        order.save()
+
+        for query in ('ivan_pe', '9991234567', order.tracking_code,
+                      user.email):
+            response = self.search(operator_api_client, query)
+            assert response.status_code == status.HTTP_200_OK
+            assert [o['id'] for o in response.data] == [order.pk], query
+
+    def test_index_follows_changes(
+        self, operator_api_client, order, user
+    ):
+        order.comment = 'Клиент просил купюры по 100'
+        order.save()
+        assert self.search(operator_api_client, 'купюры').data
+
+        order.comment = ''
+        order.save()
+        assert self.search(operator_api_client, 'купюры').data == []
+
+        user.email = 'renamed@example.com'
+        user.save()
+        response = self.search(operator_api_client, 'renamed@')
+        assert [o['id'] for o in response.data] == [order.pk]
+
+    def test_status_change_skips_index(self, order):
+        table = OrderSearchEntry._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            order.set_status('processing')
+        assert not [q for q in queries if table in q['sql']]
+
+        # Сохранение целиком обновляет документ одним запросом
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+        assert len([q for q in queries if table in q['sql']]) == 1
+
+    def test_only_staff_can_search(self, authenticated_api_client, order):
+        response = self.search(authenticated_api_client, order.tracking_code)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_short_query_is_rejected(self, operator_api_client):
+        response = self.search(operator_api_client, 'a')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestOrderExport:
+    """Tests for the streaming order export"""
+
+    def export(self, client, **params):
+        return client.get(reverse('order-export'), params)
+
+    def test_csv_export_streams_items(self, owner_api_client, order):
+        response = self.export(owner_api_client, status='new')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert 'attachment' in response['Content-Disposition']
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        header, row = list(csv.reader(io.StringIO(content)))
+        assert header[:2] == ['Заказ', 'Код отслеживания']
+        assert row[:2] == [str(order.pk), order.tracking_code]
+        assert row[3] == 'Новый'
+        assert row[8:12] == ['USD', '100.00', 'RUB', '9050.00']
+
+    def test_filters(self, owner_api_client, order):
+        response = self.export(owner_api_client, status='completed')
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        assert len(content.splitlines()) == 1
+
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        response = self.export(owner_api_client, date_from=tomorrow)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        assert len(content.splitlines()) == 1
+
+        response = self.export(owner_api_client, date_from=tomorrow,
+                               date_to=timezone.localdate())
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_xlsx_export(self, owner_api_client, order):
+        openpyxl = pytest.importorskip('openpyxl')
+        response = self.export(owner_api_client, file_format='xlsx')
+
+        workbook = openpyxl.load_workbook(
+            io.BytesIO(b''.join(response.streaming_content))
+        )
+        rows = list(workbook.active.values)
+        assert len(rows) == 2
+        assert rows[1][1] == order.tracking_code
+
+    def test_archived_orders_are_exported(
+        self, owner_api_client, old_completed_order, user, office, rate
+    ):
+        archive_batch(older_than_days=30)
+        live = Order.objects.create(user=user, office=office)
+        live.items.create(
+            from_currency=rate.from_currency,
+            to_currency=rate.to_currency,
+            amount_from=Decimal('50'),
+            amount_to=Decimal('4525'),
+            rate=rate.rate,
+        )
+
+        response = self.export(owner_api_client)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(content)))[1:]
+        assert [row[0] for row in rows] == [
+            str(old_completed_order.pk), str(live.pk)
+        ]
+        assert rows[0][3] == 'Выполнен'
+
+        response = self.export(owner_api_client, status='completed')
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        assert len(content.splitlines()) == 2
+
+    def test_formulas_are_escaped(self, owner_api_client, order):
+        order.telegram = '=HYPERLINK("http://evil")'
+        order.whatsapp = '+79990000000'
+        order.save()
+
+        response = self.export(owner_api_client)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        row = list(csv.reader(io.StringIO(content)))[1]
+        assert row[6:8] == ["'=HYPERLINK(\"http://evil\")", "'+79990000000"]
+
+    def test_operator_cannot_export(self, operator_api_client):
+        response = self.export(operator_api_client)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_command_writes_file(self, order, tmp_path):
+        output = tmp_path / 'orders.csv'
+        call_command('export_orders', '--output', str(output),
+                     stdout=StringIO())
+        assert order.tracking_code in output.read_text(encoding='utf-8-sig')
+
+
+@pytest.fixture
+def reviews(user, office, rate):
+    """Creates visible reviews with ratings 5, 4 and 4 in two offices."""
+    second_office = ExchangeOffice.objects.create(
+        name='Север', address='ул. Мира, 5'
+    )
+    result = []
+    for rating, review_office in [(5, office), (4, office),
+                                  (4, second_office)]:
+        order = Order.objects.create(
+            user=user, office=review_office, status='completed'
+        )
+        result.append(Review.objects.create(
+            order=order, rating=rating, text=f'Оценка {rating}'
+        ))
+    return result
+
+
+@pytest.mark.django_db
+class TestPublicReviews:
+    """Tests for the cached public review feed and rating statistics"""
+
+    def test_feed_is_paginated_and_cached(
+        self, api_client, reviews, django_assert_num_queries, settings
+    ):
+        settings.ALLOWED_HOSTS = ['testserver', 'example.org']
+        url = reverse('review-list-public')
+
+        response = api_client.get(url, {'page_size': 2})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 3
+        assert len(response.data['results']) == 2
+        assert response.data['results'][0]['display_name'] == 'Test'
+
+        with django_assert_num_queries(0):
+            response = api_client.get(url, {'page_size': 2})
+        assert response.data['count'] == 3
+        assert response.data['next'] == (
+            f'http://testserver{url}?page=2&page_size=2'
+        )
+
+        # Ссылки из кэша строятся по хосту текущего запроса
+        response = api_client.get(
+            url, {'page_size': 2, 'page': 2}, HTTP_HOST='example.org',
+            secure=True,
+        )
+        assert response.data['next'] is None
+        assert response.data['previous'] == (
+            f'https://example.org{url}?page_size=2'
+        )
+        with django_assert_num_queries(0):
+            response = api_client.get(
+                url, {'page_size': 2}, HTTP_HOST='example.org', secure=True
+            )
+        assert response.data['next'].startswith('https://example.org/')
+
+    def test_feed_query_count_does_not_grow(
+        self, api_client, reviews, django_assert_max_num_queries
+    ):
+        # Пользователь загружается вместе с отзывом, а не отдельно
+        with django_assert_max_num_queries(2):
+            api_client.get(reverse('review-list-public'))
+
+    def test_changes_invalidate_feed(
+        self, api_client, reviews, django_capture_on_commit_callbacks
+    ):
+        url = reverse('review-list-public')
+        assert api_client.get(url).data['count'] == 3
+
+        with django_capture_on_commit_callbacks(execute=True):
+            reviews[0].is_visible = False
+            reviews[0].save()
+        assert api_client.get(url).data['count'] == 2
+
+    def test_stats_are_updated_incrementally(
+        self, api_client, reviews, django_capture_on_commit_callbacks
+    ):
+        response = api_client.get(reverse('review-stats'))
+        assert response.data['overall'] == {
+            'count': 3,
+            'average': 4.33,
+            'histogram': {'1': 0, '2': 0, '3': 0, '4': 2, '5': 1},
+        }
+        assert [o['count'] for o in response.data['offices']] == [2, 1]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            reviews[0].is_visible = False
+            reviews[0].save()
+            reviews[1].rating = 2
+            reviews[1].save()
+            reviews[2].delete()
+
+        stats = review_statistics()
+        assert stats['overall']['count'] == 1
+        assert stats['overall']['histogram']['2'] == 1
+        assert api_client.get(reverse('review-stats')).data == stats
+
+        rebuild_stats()
+        assert review_statistics() == stats
+
+    def test_archived_review_keeps_stats_and_leaves_feed(
+        self, api_client, reviews, django_capture_on_commit_callbacks
+    ):
+        url = reverse('review-list-public')
+        assert api_client.get(url).data['count'] == 3
+        stats = review_statistics()
+        Order.objects.filter(pk=reviews[2].order_id).update(
+            updated_at=timezone.now() - timedelta(days=365)
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            assert archive_batch(older_than_days=30) == 1
+
+        assert api_client.get(url).data['count'] == 2
+        assert review_statistics() == stats
+        # Пересчёт с нуля учитывает архивные отзывы
+        rebuild_stats()
+        assert review_statistics() == stats
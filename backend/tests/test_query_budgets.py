@@ -0,0 +1,221 @@
+"""
+Query budgets of API endpoints.
+
+Every GET route of the orders, exchange and users routers must have a budget
+in QUERY_BUDGETS (or a reason in EXEMPT). Each endpoint is requested on a
+small and on a larger data set: the number of SQL queries must not exceed
+the budget and must not grow with the amount of data, which is how N+1
+queries in serializers show up.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from exchange.models import Currency, CurrencyBalance, ExchangeOffice, ExchangeRate
+from exchange.urls import router as exchange_router
+from orders.models import Order, OrderDocument, OrderItem, Review
+from orders.urls import router as orders_router
+from users.urls import router as users_router
+
+ROUTERS = [orders_router, exchange_router, users_router]
+
+SMALL = 2
+LARGE = 6
+
+Budget = namedtuple('Budget', ['role', 'queries', 'params'], defaults=[None])
+
+# Имя маршрута: роль клиента и максимальное число SQL-запросов
+QUERY_BUDGETS = {
+    'order-list': Budget('customer', 3),
+    'order-detail': Budget('customer', 3),
+    'order-documents': Budget('customer', 4),
+    # Индекс, затем архив (права + заказы + элементы)
+    'order-search': Budget('operator', 7, {'q': 'bench'}),
+    'order-export': Budget('owner', 3),
+    'review-list': Budget('customer', 2),
+    'review-detail': Budget('customer', 2),
+    'review-list-public': Budget(None, 2),
+    'review-stats': Budget(None, 1),
+    'currency-list': Budget(None, 1),
+    'currency-detail': Budget(None, 1),
+    'rate-list': Budget(None, 1),
+    'rate-detail': Budget(None, 1),
+    'office-list': Budget('customer', 1),
+    'office-detail': Budget('customer', 1),
+    'office-balances': Budget('customer', 2),
+    'balance-list': Budget('owner', 2),
+    'balance-detail': Budget('owner', 2),
+    'balance-by-office': Budget('owner', 2, {'office_id': 'office'}),
+    'sync-list': Budget('owner', 6),
+    'user-list': Budget('customer', 1),
+    'user-detail': Budget('customer', 1),
+    'user-me': Budget('customer', 0),
+    'user-get-profile-by-supabase-id': Budget('customer', 1),
+    'user-referrals': Budget('customer', 2),
+    'user-referral-stats': Budget('customer', 2),
+}
+
+EXEMPT = {
+    # Передачу файла выполняет веб-сервер, см. core.sendfile
+    'order-download-document',
+}
+
+
+def router_get_routes():
+    """Names of GET routes of the routers and whether they are detail."""
+    for router in ROUTERS:
+        for _, viewset, basename in router.registry:
+            for route in router.get_routes(viewset):
+                # Маршрут без метода у viewset роутер не создаёт
+                if ('get' in route.mapping
+                        and hasattr(viewset, route.mapping['get'])):
+                    yield route.name.format(basename=basename), route.detail
+
+
+ROUTES = dict(router_get_routes())
+
+
+class Dataset:
+    """Data for the endpoints, grown in steps to compare query counts."""
+
+    def __init__(self, customer, other):
+        self.customer = customer
+        self.other = other
+        self.size = 0
+
+    def grow(self, size):
+        for number in range(self.size, size):
+            usd = Currency.objects.create(
+                code=f'U{number:02d}', name=f'Валюта {number}', symbol='$'
+            )
+            rub = Currency.objects.create(
+                code=f'R{number:02d}', name=f'Валюта {number}', symbol='₽'
+            )
+            rate = ExchangeRate.objects.create(
+                from_currency=usd, to_currency=rub,
+                rate=Decimal('90.5000'), min_amount=Decimal('10.00'),
+            )
+            office = ExchangeOffice.objects.create(
+                name=f'Пункт {number}', address=f'ул. Ленина, {number}'
+            )
+            for currency in (usd, rub):
+                CurrencyBalance.objects.create(
+                    office=office, currency=currency, balance=Decimal('1000')
+                )
+            for user in (self.customer, self.other):
+                order = Order.objects.create(
+                    user=user, office=office, status='completed',
+                    comment='bench',
+                )
+                for _ in range(2):
+                    OrderItem.objects.create(
+                        order=order, from_currency=usd, to_currency=rub,
+                        amount_from=Decimal('100'), amount_to=Decimal('9050'),
+                        rate=rate.rate,
+                    )
+                Review.objects.create(order=order, rating=5, text='Хорошо')
+        self.size = size
+
+        # Документ каждого типа у заказа один: добавляем по одному за шаг
+        first_order = self.orders().first()
+        existing = first_order.documents.count()
+        if existing < len(OrderDocument.TYPE_CHOICES):
+            OrderDocument.objects.create(
+                order=first_order,
+                document_type=OrderDocument.TYPE_CHOICES[existing][0],
+                file='orders/bench.pdf',
+            )
+
+    def orders(self):
+        return Order.objects.filter(user=self.customer).order_by('id')
+
+    def detail_kwargs(self, name):
+        basename = name.split('-')[0]
+        office = ExchangeOffice.objects.order_by('id').first()
+        objects = {
+            'order': self.orders().first(),
+            'review': Review.objects.filter(
+                order__user=self.customer
+            ).order_by('id').first(),
+            'currency': Currency.objects.order_by('id').first(),
+            'rate': ExchangeRate.objects.order_by('id').first(),
+            'office': office,
+            'balance': office.balances.order_by('id').first(),
+            'user': self.customer,
+        }
+        if name == 'user-get-profile-by-supabase-id':
+            return {'pk': self.customer.supabase_user_id}
+        return {'pk': objects[basename].pk}
+
+
+@pytest.fixture
+def dataset(user, operator):
+    # Реферальная сеть клиента не пуста
+    operator.referred_by = user
+    operator.save()
+    return Dataset(customer=user, other=operator)
+
+
+@pytest.fixture
+def clients(user, operator, owner_api_client):
+    customer = APIClient()
+    customer.force_authenticate(user=user)
+    staff = APIClient()
+    staff.force_authenticate(user=operator)
+    return {
+        None: APIClient(),
+        'customer': customer,
+        'operator': staff,
+        'owner': owner_api_client,
+    }
+
+
+def count_queries(client, url, params):
+    # Кэш ленты отзывов не должен скрывать запросы
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, params)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    assert response.status_code == 200, (url, response.status_code)
+    return len(queries)
+
+
+def test_every_route_has_a_budget():
+    assert set(ROUTES) - set(QUERY_BUDGETS) - EXEMPT == set()
+    assert set(QUERY_BUDGETS) - set(ROUTES) == set()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', sorted(QUERY_BUDGETS))
+def test_query_budget(name, dataset, clients):
+    budget = QUERY_BUDGETS[name]
+    client = clients[budget.role]
+
+    counts = []
+    for size in (SMALL, LARGE):
+        dataset.grow(size)
+        kwargs = dataset.detail_kwargs(name) if ROUTES[name] else {}
+        params = {
+            key: (
+                ExchangeOffice.objects.order_by('id').first().pk
+                if value == 'office' else value
+            )
+            for key, value in (budget.params or {}).items()
+        }
+        counts.append(
+            count_queries(client, reverse(name, kwargs=kwargs), params)
+        )
+
+    assert counts[0] == counts[1], (
+        f'{name}: query count grows with data size {counts}'
+    )
+    assert counts[1] <= budget.queries, (
+        f'{name}: {counts[1]} queries, budget {budget.queries}'
+    )
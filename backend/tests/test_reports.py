@@ -0,0 +1,356 @@
+"""
+Tests for the reports app.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from orders.archive import archive_batch
+from core.metrics import render_metrics
+from core.sketches import QuantileSketch
+from exchange.models import ExchangeOffice
+from orders.models import Order, OrderEvent, OrderStatusChange
+from orders.outbox import process_batch
+from reports import sla
+from reports.models import OrderVolumeRollup, StatusSLA
+from reports.rollups import backfill, sync_orders
+
+
+def rollup_rows(period=OrderVolumeRollup.DAY):
+    return {
+        row.status: (row.order_count, row.item_count, row.amount_from,
+                     row.amount_to)
+        for row in OrderVolumeRollup.objects.filter(period=period)
+        if row.order_count or row.item_count
+    }
+
+
+@pytest.mark.django_db
+class TestVolumeRollups:
+    """Tests for incremental rollup maintenance"""
+
+    def test_sync_counts_order_once(self, order):
+        assert sync_orders([order.pk]) == 1
+        assert sync_orders([order.pk]) == 0
+
+        expected = {'new': (1, 1, Decimal('100'), Decimal('9050'))}
+        assert rollup_rows(OrderVolumeRollup.HOUR) == expected
+        assert rollup_rows(OrderVolumeRollup.DAY) == expected
+
+        row = OrderVolumeRollup.objects.get(period=OrderVolumeRollup.DAY)
+        assert row.average_rate == Decimal('90.5')
+        assert row.bucket_start == timezone.localtime(
+            order.created_at
+        ).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def test_status_events_move_order(self, order):
+        sync_orders([order.pk])
+        order.set_status('processing')
+        order.set_status('cancelled')
+
+        process_batch()
+        # Повторная доставка события не меняет итоги
+        for event in OrderEvent.objects.all():
+            sync_orders([event.order_id])
+
+        assert rollup_rows() == {
+            'cancelled': (1, 1, Decimal('100'), Decimal('9050')),
+        }
+
+    def test_office_change_moves_order(self, order, office):
+        other = ExchangeOffice.objects.create(name='Вокзал', address='-')
+        sync_orders([order.pk])
+        order.office = other
+        order.save()
+        order.set_status('processing')
+        process_batch()
+
+        rows = {
+            (row.office_id, row.status): (row.order_count, row.amount_from)
+            for row in OrderVolumeRollup.objects.filter(
+                period=OrderVolumeRollup.DAY
+            )
+            if row.order_count
+        }
+        assert rows == {(other.pk, 'processing'): (1, Decimal('100'))}
+
+        # Удаление вычитает заказ из пункта, где он учтён
+        order.delete()
+        assert rollup_rows() == {}
+
+    def test_deleted_order_leaves_rollups(self, order):
+        sync_orders([order.pk])
+        order.set_status('processing')
+        process_batch()
+        assert rollup_rows() == {
+            'processing': (1, 1, Decimal('100'), Decimal('9050')),
+        }
+
+        order.delete()
+        assert rollup_rows() == {}
+
+    def test_archival_keeps_order_in_rollups(self, order):
+        sync_orders([order.pk])
+        Order.objects.filter(pk=order.pk).update(
+            status='completed',
+            updated_at=timezone.now() - timedelta(days=365),
+        )
+        sync_orders([order.pk])
+        assert archive_batch(older_than_days=30) == 1
+
+        assert rollup_rows() == {
+            'completed': (1, 1, Decimal('100'), Decimal('9050')),
+        }
+
+    def test_rebuild_keeps_archived_orders(self, order, user, office, rate):
+        second = Order.objects.create(user=user, office=office)
+        second.items.create(
+            from_currency=rate.from_currency,
+            to_currency=rate.to_currency,
+            amount_from=Decimal('50'),
+            amount_to=Decimal('4525'),
+            rate=rate.rate,
+        )
+        Order.objects.filter(pk=order.pk).update(
+            status='cancelled',
+            updated_at=timezone.now() - timedelta(days=365),
+        )
+        backfill(chunk_size=1)
+        archive_batch(older_than_days=30)
+
+        assert backfill(chunk_size=1, rebuild=True) == 2
+        assert rollup_rows() == {
+            'new': (1, 1, Decimal('50'), Decimal('4525')),
+            'cancelled': (1, 1, Decimal('100'), Decimal('9050')),
+        }
+
+
+@pytest.mark.django_db
+class TestVolumeReport:
+    """Tests for the volume report endpoint"""
+
+    def test_owner_reads_rollups(self, owner_api_client, order, office):
+        sync_orders([order.pk])
+        today = timezone.localdate()
+
+        response = owner_api_client.get(reverse('report-volume'), {
+            'period': 'day',
+            'date_from': today,
+            'date_to': today,
+            'office': office.pk,
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 1
+        row = response.data[0]
+        assert row['from_currency_code'] == 'USD'
+        assert row['order_count'] == 1
+        assert Decimal(row['average_rate']) == Decimal('90.5')
+
+        response = owner_api_client.get(reverse('report-volume'), {
+            'date_from': today + timedelta(days=1),
+        })
+        assert response.data == []
+
+    def test_operator_has_no_access(self, operator_api_client):
+        response = operator_api_client.get(reverse('report-volume'))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_invalid_filters(self, owner_api_client):
+        response = owner_api_client.get(
+            reverse('report-volume'), {'period': 'week'}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def move(order, new_status, at):
+    with patch('orders.models.timezone.now', return_value=at):
+        assert order.set_status(new_status)
+
+
+def sla_rows():
+    return {
+        row.status: (row.in_status, row.exit_count, row.max_seconds)
+        for row in StatusSLA.objects.all()
+    }
+
+
+@pytest.mark.django_db
+class TestStatusSLA:
+    """Tests for the status history and incremental SLA metrics"""
+
+    def test_history_and_time_in_status(self, order, user, office):
+        start = timezone.now()
+        move(order, 'processing', start + timedelta(seconds=60))
+        move(order, 'cancelled', start + timedelta(seconds=360))
+        Order.objects.create(user=user, office=office)
+
+        history = list(
+            OrderStatusChange.objects.filter(order_id=order.pk)
+            .values_list('old_status', 'new_status')
+        )
+        assert history == [
+            ('', 'new'), ('new', 'processing'), ('processing', 'cancelled'),
+        ]
+
+        process_batch()
+        rows = sla_rows()
+        assert rows['new'][:2] == (1, 1)
+        assert rows['new'][2] == pytest.approx(60, abs=1)
+        assert rows['processing'] == (0, 1, 300)
+        assert 'cancelled' not in rows
+
+        # Повторная доставка событий ничего не добавляет
+        assert sla.apply_pending() == 0
+
+    def test_quantiles_from_sketch(self, order, office):
+        start = timezone.now()
+        move(order, 'processing', start)
+        # 99 выходов из обработки: 1..99 секунд
+        OrderStatusChange.objects.bulk_create([
+            OrderStatusChange(
+                order_id=order.pk, office=office,
+                old_status='processing', new_status='waiting_delivery',
+                duration=timedelta(seconds=seconds),
+            )
+            for seconds in range(1, 100)
+        ])
+        sla.backfill(batch_size=10)
+
+        row = StatusSLA.objects.get(status='processing')
+        assert row.exit_count == 99
+        assert row.average_seconds == pytest.approx(50)
+        assert sla.quantiles(row)['p50'] == pytest.approx(50, rel=0.01)
+        assert sla.quantiles(row)['p99'] == pytest.approx(98, rel=0.01)
+
+        metrics = render_metrics()
+        assert (f'order_status_queue{{office="{office.pk}",'
+                f'status="waiting_delivery"}} 99') in metrics
+        assert f'order_status_seconds_count{{office="{office.pk}",' in metrics
+
+    def test_office_change_moves_queue_and_splits_time(self, order,
+                                                       office):
+        other = ExchangeOffice.objects.create(name='Вокзал', address='-')
+        start = timezone.now()
+        move(order, 'processing', start)
+        with patch('orders.models.timezone.now',
+                   return_value=start + timedelta(seconds=100)):
+            order.office = other
+            order.save()
+        move(order, 'waiting_delivery', start + timedelta(seconds=400))
+        # Сохранение без смены пункта истории не добавляет
+        order.save()
+        sla.backfill()
+
+        rows = {
+            (row.office_id, row.status): (
+                row.in_status, row.exit_count, row.max_seconds
+            )
+            for row in StatusSLA.objects.filter(status='processing')
+        }
+        assert rows[(office.pk, 'processing')] == (0, 1, 100)
+        assert rows[(other.pk, 'processing')] == (0, 1, 300)
+        queue = StatusSLA.objects.get(status='waiting_delivery')
+        assert (queue.office_id, queue.in_status) == (other.pk, 1)
+        assert OrderStatusChange.objects.filter(
+            order_id=order.pk
+        ).count() == 5
+
+    def test_status_saved_outside_set_status(self, order, admin_user,
+                                             client):
+        # Прямое сохранение и админка тоже пишут историю и события
+        order.status = 'processing'
+        order.save()
+        client.force_login(admin_user)
+        response = client.post(
+            reverse('admin:orders_order_change', args=[order.pk]),
+            {
+                'user': order.user_id, 'office': order.office_id,
+                'status': 'cancelled', 'tracking_code': order.tracking_code,
+                **{
+                    f'{prefix}-{field}': value
+                    for prefix in ('items', 'documents')
+                    for field, value in (
+                        ('TOTAL_FORMS', 0), ('INITIAL_FORMS', 0),
+                    )
+                },
+            },
+        )
+        assert response.status_code == 302, response.content
+        process_batch()
+
+        assert list(
+            OrderStatusChange.objects.filter(order_id=order.pk)
+            .values_list('old_status', 'new_status')
+        ) == [('', 'new'), ('new', 'processing'), ('processing', 'cancelled')]
+        assert list(
+            OrderEvent.objects.filter(
+                event_type=OrderEvent.STATUS_CHANGED
+            ).values_list('payload__new_status', flat=True)
+        ) == ['processing', 'cancelled']
+        assert {
+            status_name: in_status
+            for status_name, (in_status, _, _) in sla_rows().items()
+        } == {'new': 0, 'processing': 0}
+
+    def test_deleted_order_leaves_queue_and_rebuild(self, order, user,
+                                                    office):
+        other = Order.objects.create(user=user, office=office)
+        sla.backfill()
+        assert sla_rows()['new'][0] == 2
+
+        other.delete()
+        sla.backfill()
+        assert sla_rows()['new'][0] == 1
+
+        # Заказы до появления истории: очередь берётся из заказов
+        OrderStatusChange.objects.all().delete()
+        assert sla.backfill(rebuild=True) == 0
+        assert sla_rows() == {'new': (1, 0, 0)}
+
+    def test_sketch_relative_error_and_merge(self):
+        first, second = QuantileSketch(), QuantileSketch()
+        for value in range(1, 1001):
+            (first if value % 2 else second).add(value)
+        first.merge(QuantileSketch.from_dict(second.to_dict()))
+
+        assert first.count == 1000
+        for q in (0.5, 0.9, 0.99):
+            assert first.quantile(q) == pytest.approx(
+                q * 999 + 1, rel=0.011
+            )
+        assert QuantileSketch().quantile(0.5) is None
+
+
+@pytest.mark.django_db
+class TestStatusSLAReport:
+    """Tests for the SLA report endpoint"""
+
+    def test_operator_reads_metrics(self, operator_api_client, order,
+                                    office):
+        move(order, 'processing', timezone.now() + timedelta(seconds=30))
+        sla.backfill()
+
+        response = operator_api_client.get(
+            reverse('report-sla'), {'office': office.pk}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        rows = {row['status']: row for row in response.data}
+        assert rows['processing']['in_status'] == 1
+        assert rows['new']['office_name'] == office.name
+        assert rows['new']['p50_seconds'] == pytest.approx(30, rel=0.05)
+        assert rows['processing']['p90_seconds'] is None
+
+        response = operator_api_client.get(
+            reverse('report-sla'), {'status': 'completed'}
+        )
+        assert response.data == []
+
+    def test_customer_has_no_access(self, authenticated_api_client):
+        response = authenticated_api_client.get(reverse('report-sla'))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
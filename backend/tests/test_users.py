@@ -1,11 +1,33 @@
 """
 Tests for the users app.
 """
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.template import Template, engines
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 
+from core.models import QueuedEmail
+from orders.archive import archive_batch
+from orders.models import Order, OrderItem
+from users.email import ActivationEmail
+from users.bonuses import accrue_batch
+from users.models import BonusAccrual, BonusWatermark, ReferralPath
+from users.referrals import (
+    descendants,
+    downline_size,
+    downline_volume,
+    rebuild_paths,
+)
+
 User = get_user_model()
 
 
@@ -94,4 +116,261 @@ class TestSupabaseAuthentication:
         headers = {'HTTP_AUTHORIZATION': 'Bearer invalid-jwt-token'}
         response = api_client.get(url, **headers)
         
-        assert response.status_code == status.HTTP_401_UNAUTHORIZED 
\ No newline at end of file
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED 
+
+@pytest.mark.django_db
+class TestUserEmails:
+    """Test rendering of the account emails."""
+
+    def test_template_is_compiled_once(self, user, settings):
+        settings.EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+        settings.DJOSER = {'ACTIVATION_URL': 'activate/{uid}/{token}'}
+        loader = engines['django'].engine.template_loaders[0]
+        loader.reset()
+
+        with patch.object(
+            Template, '__init__', autospec=True, side_effect=Template.__init__
+        ) as compile_template:
+            for _ in range(3):
+                ActivationEmail(context={'user': user}).send([user.email])
+
+        compiled = {
+            call.args[0].origin.template_name
+            for call in compile_template.call_args_list
+        }
+        assert compile_template.call_count == len(compiled)
+        assert 'email/activation.html' in loader.get_template_cache
+        assert QueuedEmail.objects.filter(to=[user.email]).count() == 3
+        assert 'Активация аккаунта' in QueuedEmail.objects.first().subject
+
+
+@pytest.mark.django_db
+class TestReferralTree:
+    """Test the referral closure table (users.referrals)."""
+
+    @pytest.fixture
+    def tree(self, user):
+        """user -> a -> (b, c), b -> d"""
+        users = {'root': user}
+        for name, parent in [('a', 'root'), ('b', 'a'), ('c', 'a'),
+                             ('d', 'b')]:
+            users[name] = User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                referred_by=users[parent],
+            )
+        return users
+
+    def paths(self):
+        return set(ReferralPath.objects.values_list(
+            'ancestor__username', 'descendant__username', 'depth'
+        ))
+
+    def downline(self, user, max_depth=None):
+        return [
+            (referral.username, referral.referral_depth)
+            for referral in descendants(user, max_depth)
+        ]
+
+    def test_paths_are_maintained_on_creation(self, tree):
+        root = tree['root']
+        assert self.downline(root) == [
+            ('a', 1), ('b', 2), ('c', 2), ('d', 3)
+        ]
+        assert self.downline(root, max_depth=2) == [
+            ('a', 1), ('b', 2), ('c', 2)
+        ]
+        assert downline_size(root) == 4
+        assert downline_size(tree['a'], max_depth=1) == 2
+
+        # Реферер указывается после создания (UserCreateSerializer)
+        late = User.objects.create_user(email='late@example.com',
+                                        username='late')
+        late.referred_by = tree['d']
+        late.save()
+        assert self.downline(tree['b']) == [('d', 1), ('late', 2)]
+
+    def test_moving_and_deleting_keep_the_tree(self, tree):
+        tree['b'].referred_by = tree['c']
+        tree['b'].save()
+        assert self.downline(tree['c']) == [('b', 1), ('d', 2)]
+        assert self.downline(tree['root']) == [
+            ('a', 1), ('c', 2), ('b', 3), ('d', 4)
+        ]
+
+        tree['a'].referred_by = tree['d']
+        with pytest.raises(ValidationError) as error:
+            tree['a'].full_clean()
+        assert 'referred_by' in error.value.message_dict
+        with pytest.raises(ValidationError):
+            tree['a'].save()
+
+        tree['c'].delete()
+        assert self.downline(tree['root']) == [('a', 1)]
+        assert self.downline(tree['b']) == [('d', 1)]
+        expected = self.paths()
+        assert rebuild_paths() == len(expected)
+        assert self.paths() == expected
+
+    def test_admin_rejects_cyclic_referrer(self, tree, client):
+        admin = User.objects.create_superuser(
+            email='admin@example.com', password='secret'
+        )
+        client.force_login(admin)
+        user = tree['a']
+        response = client.post(
+            reverse('admin:users_user_change', args=[user.pk]),
+            {
+                'username': user.username,
+                'date_joined_0': user.date_joined.strftime('%Y-%m-%d'),
+                'date_joined_1': user.date_joined.strftime('%H:%M:%S'),
+                'is_active': 'on',
+                'referred_by': tree['d'].pk,
+            },
+        )
+
+        assert response.status_code == 200
+        assert 'referred_by' in response.context['adminform'].form.errors
+        user.refresh_from_db()
+        assert user.referred_by == tree['root']
+
+    def test_logins_do_not_query_the_tree(
+        self, tree, django_assert_num_queries
+    ):
+        with django_assert_num_queries(1):
+            tree['d'].save(update_fields=['last_login'])
+
+    def test_downline_volume_includes_archive(
+        self, tree, office, usd, rub, django_assert_num_queries
+    ):
+        for name, status_value, amount in [
+            ('a', 'completed', '100'), ('d', 'completed', '50'),
+            ('c', 'cancelled', '70'), ('root', 'completed', '30'),
+        ]:
+            order = Order.objects.create(
+                user=tree[name], office=office, status=status_value
+            )
+            OrderItem.objects.create(
+                order=order, from_currency=usd, to_currency=rub,
+                amount_from=Decimal(amount), amount_to=Decimal(amount) * 90,
+                rate=Decimal('90'),
+            )
+        Order.objects.filter(user=tree['d']).update(
+            updated_at='2000-01-01T00:00Z'
+        )
+        archive_batch(older_than_days=1)
+        assert not Order.objects.filter(user=tree['d']).exists()
+
+        with django_assert_num_queries(1):
+            volume = downline_volume(tree['root'])
+        assert volume == [
+            {'currency': 'USD', 'order_count': 2, 'amount': Decimal('150')}
+        ]
+        assert downline_volume(tree['root'], max_depth=1)[0]['amount'] == (
+            Decimal('100')
+        )
+
+    def test_referral_endpoints(self, tree, api_client):
+        api_client.force_authenticate(user=tree['root'])
+        response = api_client.get(
+            reverse('user-referrals'), {'depth': 2, 'page_size': 2}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 3
+        assert [row['username'] for row in response.data['results']] == [
+            'a', 'b'
+        ]
+        assert response.data['results'][1]['referral_depth'] == 2
+
+        response = api_client.get(reverse('user-referral-stats'))
+        assert response.data == {'downline_size': 4, 'volume': []}
+        response = api_client.get(reverse('user-referrals'), {'depth': 0})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestBonusAccrual:
+    """Test batch accrual of referral bonuses (users.bonuses)."""
+
+    @pytest.fixture(autouse=True)
+    def bonus_settings(self, settings):
+        settings.REFERRAL_BONUS_AMOUNTS = ['100', '50']
+        settings.BONUS_ACCRUAL_DELAY_SECONDS = 60
+
+    @pytest.fixture
+    def chain(self, user):
+        """user -> a -> b"""
+        a = User.objects.create_user(
+            email='a@example.com', username='a', referred_by=user
+        )
+        b = User.objects.create_user(
+            email='b@example.com', username='b', referred_by=a
+        )
+        return user, a, b
+
+    def complete(self, customer, office, minutes_ago=5):
+        order = Order.objects.create(
+            user=customer, office=office, status='completed'
+        )
+        Order.objects.filter(pk=order.pk).update(
+            updated_at=timezone.now() - timedelta(minutes=minutes_ago)
+        )
+        return order
+
+    def balances(self, *users):
+        return [
+            User.objects.get(pk=user.pk).bonus_balance for user in users
+        ]
+
+    def test_referrers_are_credited_by_level(self, chain, office):
+        root, a, b = chain
+        self.complete(b, office)
+        self.complete(a, office)
+        # Ещё не завершённые и слишком свежие заказы не учитываются
+        Order.objects.create(user=b, office=office, status='processing')
+        self.complete(b, office, minutes_ago=0)
+
+        assert accrue_batch() == 2
+        assert accrue_batch() == 0
+        assert self.balances(root, a, b) == [
+            Decimal('150'), Decimal('100'), Decimal('0')
+        ]
+        assert BonusAccrual.objects.filter(user=root, level=2).count() == 1
+
+    def test_accrual_is_idempotent(self, chain, office):
+        root, a, b = chain
+        order = self.complete(b, office)
+        accrue_batch()
+
+        # Заказ изменён после начисления и прошёл повторно
+        Order.objects.filter(pk=order.pk).update(
+            comment='Выдан', updated_at=timezone.now() - timedelta(minutes=2)
+        )
+        assert accrue_batch() == 1
+        BonusWatermark.objects.all().delete()
+        assert accrue_batch() == 1
+
+        assert self.balances(root, a) == [Decimal('50'), Decimal('100')]
+        assert BonusAccrual.objects.count() == 2
+
+    def test_backlog_is_processed_in_chunks(self, chain, office):
+        root, a, b = chain
+        for _ in range(5):
+            self.complete(b, office)
+
+        scanned = []
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                count = accrue_batch(batch_size=2)
+            if not count:
+                break
+            scanned.append(count)
+            balance_updates = [
+                query['sql'] for query in queries.captured_queries
+                if query['sql'].startswith(
+                    f'UPDATE "{User._meta.db_table}"'
+                )
+            ]
+            assert len(balance_updates) == 1
+
+        assert scanned == [2, 2, 1]
+        assert self.balances(root, a) == [Decimal('250'), Decimal('500')]
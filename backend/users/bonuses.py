@@ -0,0 +1,136 @@
+"""Batch accrual of referral bonuses to `User.bonus_balance`.
+
+Crediting referrers when an order completes would put concurrent UPDATEs on
+the rows of popular referrers. Instead `accrue_batch` (command
+`accrue_bonuses`, run periodically) takes completed orders past a watermark
+(`BonusWatermark`, keyset on `updated_at` and `id`) in chunks:
+
+* referrers up to `len(settings.REFERRAL_BONUS_AMOUNTS)` levels up are read
+  from the closure table (users.referrals) with one query;
+* `BonusAccrual` is the journal: one row per order and recipient, so an
+  order that is scanned again (it was edited, or a run is repeated) is not
+  credited twice;
+* balances are credited with one UPDATE per chunk (`F()` plus a `CASE` by
+  user), the last statement before commit, so user rows stay locked only
+  for the commit.
+
+Orders changed in the last `BONUS_ACCRUAL_DELAY_SECONDS` wait for the next
+run: a transaction that completed them may not have committed yet, and the
+watermark must not pass it. The watermark row is locked for the chunk, so
+concurrent runs take chunks one after another.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.utils import timezone
+
+from orders.models import Order
+from users.models import BonusAccrual, BonusWatermark, ReferralPath, User
+
+BONUS_STATUS = 'completed'
+
+
+def bonus_amounts():
+    """Bonus per completed order by referral level, level 1 first."""
+    return [Decimal(amount) for amount in settings.REFERRAL_BONUS_AMOUNTS]
+
+
+def completed_orders(watermark, until):
+    """Completed orders after the watermark and before `until`, in order."""
+    orders = Order.objects.filter(status=BONUS_STATUS, updated_at__lt=until)
+    if watermark.updated_at is not None:
+        orders = orders.filter(
+            Q(updated_at__gt=watermark.updated_at)
+            | Q(updated_at=watermark.updated_at, id__gt=watermark.order_id)
+        )
+    return orders.order_by('updated_at', 'id')
+
+
+def accrue_batch(batch_size=None):
+    """Credit the bonuses of one chunk of completed orders.
+
+    Returns the number of orders scanned, zero when there are no new ones.
+    """
+    batch_size = batch_size or settings.BONUS_ACCRUAL_BATCH_SIZE
+    until = timezone.now() - timedelta(
+        seconds=settings.BONUS_ACCRUAL_DELAY_SECONDS
+    )
+    with transaction.atomic():
+        BonusWatermark.objects.get_or_create(pk=1)
+        watermark = BonusWatermark.objects.select_for_update().get(pk=1)
+        orders = list(
+            completed_orders(watermark, until)
+            .values_list('id', 'user_id', 'updated_at')[:batch_size]
+        )
+        if not orders:
+            return 0
+
+        totals = record_accruals([
+            (order_id, user_id) for order_id, user_id, _ in orders
+            if user_id is not None
+        ])
+        watermark.order_id, _, watermark.updated_at = orders[-1]
+        watermark.save()
+        credit(totals)
+    return len(orders)
+
+
+def record_accruals(orders):
+    """Journal the bonuses of `(order_id, user_id)` pairs.
+
+    Returns the totals of the new accruals by recipient.
+    """
+    amounts = bonus_amounts()
+    if not orders or not amounts:
+        return {}
+
+    referrers = defaultdict(list)
+    for referral_id, referrer_id, depth in ReferralPath.objects.filter(
+        descendant_id__in={user_id for _, user_id in orders},
+        depth__gte=1,
+        depth__lte=len(amounts),
+    ).values_list('descendant_id', 'ancestor_id', 'depth'):
+        referrers[referral_id].append((referrer_id, depth))
+
+    recorded = set(
+        BonusAccrual.objects.filter(
+            order_id__in=[order_id for order_id, _ in orders]
+        ).values_list('order_id', 'user_id')
+    )
+    accruals = [
+        BonusAccrual(
+            order_id=order_id,
+            user_id=referrer_id,
+            referral_id=user_id,
+            level=depth,
+            amount=amounts[depth - 1],
+        )
+        for order_id, user_id in orders
+        for referrer_id, depth in referrers[user_id]
+        if (order_id, referrer_id) not in recorded and amounts[depth - 1]
+    ]
+    BonusAccrual.objects.bulk_create(accruals)
+
+    totals = defaultdict(Decimal)
+    for accrual in accruals:
+        totals[accrual.user_id] += accrual.amount
+    return totals
+
+
+def credit(totals):
+    """Add the amounts to the balances with a single UPDATE."""
+    if not totals:
+        return
+    User.objects.filter(pk__in=totals).update(
+        bonus_balance=F('bonus_balance') + Case(
+            *[
+                When(pk=user_id, then=Value(amount))
+                for user_id, amount in totals.items()
+            ],
+            output_field=DecimalField(max_digits=10, decimal_places=4),
+        )
+    )
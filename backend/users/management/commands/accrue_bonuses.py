@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from users.bonuses import accrue_batch
+
+
+class Command(BaseCommand):
+    help = 'Credit referral bonuses for orders completed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Number of orders processed in one transaction',
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Stop after this many batches (the next run resumes)',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            scanned = accrue_batch(options['batch_size'])
+            if not scanned:
+                break
+            total += scanned
+            batches += 1
+            self.stdout.write(f'Scanned {total} orders')
+
+        self.stdout.write(self.style.SUCCESS(f'Scanned {total} orders'))
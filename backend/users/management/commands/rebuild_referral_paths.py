@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from users.referrals import rebuild_paths
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the referral tree closure table from referred_by'
+
+    def handle(self, *args, **options):
+        paths = rebuild_paths()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {paths} referral paths')
+        )
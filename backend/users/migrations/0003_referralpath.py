@@ -0,0 +1,68 @@
+# Generated by Django 5.0.14 on 2026-10-19 19:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_referral_paths(apps, schema_editor):
+    # Копия users.referrals.rebuild_paths на момент миграции: пути для
+    # существующих пользователей, по одному INSERT ... SELECT на уровень
+    User = apps.get_model('users', 'User')
+    ReferralPath = apps.get_model('users', 'ReferralPath')
+    paths = ReferralPath._meta.db_table
+    users = User._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {paths} (ancestor_id, descendant_id, depth)
+            SELECT id, id, 0 FROM {users}
+        """)
+        inserted = created = cursor.rowcount
+        depth = 0
+        while inserted and depth < created:
+            depth += 1
+            # NOT EXISTS: цикл в старых данных не нарушает уникальность пар
+            cursor.execute(f"""
+                INSERT INTO {paths} (ancestor_id, descendant_id, depth)
+                SELECT path.ancestor_id, referral.id, %s
+                FROM {paths} AS path
+                JOIN {users} AS referral
+                  ON referral.referred_by_id = path.descendant_id
+                WHERE path.depth = %s
+                  AND NOT EXISTS (
+                    SELECT 1 FROM {paths} AS known
+                    WHERE known.ancestor_id = path.ancestor_id
+                      AND known.descendant_id = referral.id
+                  )
+            """, [depth, depth - 1])
+            inserted = cursor.rowcount
+            created += inserted
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_supabase_user_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralPath',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(verbose_name='Глубина')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_paths', to=settings.AUTH_USER_MODEL, verbose_name='Предок')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_paths', to=settings.AUTH_USER_MODEL, verbose_name='Потомок')),
+            ],
+            options={
+                'verbose_name': 'Путь в реферальном дереве',
+                'verbose_name_plural': 'Пути в реферальном дереве',
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='users_referral_ancestor_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='referralpath',
+            constraint=models.UniqueConstraint(fields=('descendant', 'ancestor'), name='users_referral_path_uniq'),
+        ),
+        migrations.RunPython(fill_referral_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.14 on 2026-10-19 19:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_referralpath'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BonusWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated_at', models.DateTimeField(null=True, verbose_name='Изменён не позже')),
+                ('order_id', models.BigIntegerField(default=0, verbose_name='Последний заказ')),
+            ],
+            options={
+                'verbose_name': 'Прогресс начисления бонусов',
+                'verbose_name_plural': 'Прогресс начисления бонусов',
+            },
+        ),
+        migrations.CreateModel(
+            name='BonusAccrual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField(verbose_name='Заказ')),
+                ('level', models.PositiveSmallIntegerField(verbose_name='Уровень')),
+                ('amount', models.DecimalField(decimal_places=4, max_digits=10, verbose_name='Сумма')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Начислено')),
+                ('referral', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Реферал')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bonus_accruals', to=settings.AUTH_USER_MODEL, verbose_name='Получатель')),
+            ],
+            options={
+                'verbose_name': 'Начисление бонуса',
+                'verbose_name_plural': 'Начисления бонусов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bonusaccrual',
+            constraint=models.UniqueConstraint(fields=('order_id', 'user'), name='users_bonus_accrual_uniq'),
+        ),
+    ]
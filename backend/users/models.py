@@ -1,6 +1,7 @@
 import shortuuid
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.core.exceptions import ValidationError
 
 from django.conf import settings
 
@@ -76,6 +77,17 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    def clean(self):
+        super().clean()
+        # users.referrals импортирует модели этого модуля
+        from users.referrals import in_downline
+
+        if (self.pk is not None and self.referred_by_id is not None
+                and in_downline(self.pk, self.referred_by_id)):
+            raise ValidationError({
+                'referred_by': 'Реферер не может входить в сеть пользователя'
+            })
+
     def save(self, *args, **kwargs):
         if not self.referral_code:
             self.referral_code = shortuuid.uuid()[:10].upper()
@@ -86,3 +98,91 @@ class User(AbstractUser):
         """Генерация реферальной ссылки"""
         base_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')
         return f"{base_url}/register?ref={self.referral_code}"
+
+
+class ReferralPath(models.Model):
+    """Путь в реферальном дереве (closure table, см. users.referrals).
+
+    Строка на каждую пару «предок - потомок», включая пользователя с самим
+    собой (глубина 0), поэтому вся сеть пользователя - одна выборка по
+    ancestor без рекурсии.
+    """
+    ancestor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='descendant_paths',
+        verbose_name='Предок'
+    )
+    descendant = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='ancestor_paths',
+        verbose_name='Потомок'
+    )
+    depth = models.PositiveIntegerField('Глубина')
+
+    class Meta:
+        verbose_name = 'Путь в реферальном дереве'
+        verbose_name_plural = 'Пути в реферальном дереве'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['descendant', 'ancestor'],
+                name='users_referral_path_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['ancestor', 'depth'],
+                name='users_referral_ancestor_idx'
+            ),
+        ]
+
+
+class BonusAccrual(models.Model):
+    """Начисление реферального бонуса за заказ (журнал, см. users.bonuses).
+
+    Одна строка на заказ и получателя: повторная обработка того же заказа
+    ничего не начисляет. Номер заказа хранится числом, потому что заказ
+    может быть перенесён в архив.
+    """
+    order_id = models.BigIntegerField('Заказ')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='bonus_accruals',
+        verbose_name='Получатель'
+    )
+    referral = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Реферал'
+    )
+    level = models.PositiveSmallIntegerField('Уровень')
+    amount = models.DecimalField('Сумма', max_digits=10, decimal_places=4)
+    created_at = models.DateTimeField('Начислено', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Начисление бонуса'
+        verbose_name_plural = 'Начисления бонусов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['order_id', 'user'],
+                name='users_bonus_accrual_uniq'
+            ),
+        ]
+
+
+class BonusWatermark(models.Model):
+    """Докуда просмотрены выполненные заказы (см. users.bonuses).
+
+    Единственная строка; заказы просматриваются по (updated_at, id).
+    """
+    updated_at = models.DateTimeField('Изменён не позже', null=True)
+    order_id = models.BigIntegerField('Последний заказ', default=0)
+
+    class Meta:
+        verbose_name = 'Прогресс начисления бонусов'
+        verbose_name_plural = 'Прогресс начисления бонусов'
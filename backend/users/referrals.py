@@ -0,0 +1,179 @@
+"""Referral tree analytics.
+
+`User.referred_by` forms a tree; `ReferralPath` is its closure table: a row
+for every ancestor/descendant pair with the distance between them, and a
+depth-0 row of every user with themselves. The downline of a user to any
+depth, its size and its order volume are each one query on indexed columns
+instead of walking `referrals` level by level.
+
+Signals in users.signals keep the table current when a user is created,
+gets another referrer or is deleted. `rebuild_paths` (command
+`rebuild_referral_paths`) recounts it from `referred_by` in SQL, e.g.
+after the migration or `bulk_create`.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+
+from orders.models import ArchivedOrderItem, OrderItem
+from users.models import ReferralPath, User
+
+BATCH_SIZE = 5000
+
+# Объём сети считается по выполненным заказам
+VOLUME_STATUS = 'completed'
+
+
+# ----- Maintenance -----
+
+def user_created(user):
+    """Paths of a new user: to themselves and to the referrer's ancestors."""
+    with transaction.atomic():
+        ReferralPath.objects.create(ancestor=user, descendant=user, depth=0)
+        _attach(user.pk, user.referred_by_id)
+
+
+def referrer_changed(user):
+    """Move the user with their downline under the new referrer."""
+    with transaction.atomic():
+        detach(user.pk)
+        _attach(user.pk, user.referred_by_id)
+
+
+def detach(user_id):
+    """Cut the user with their downline off the user's ancestors."""
+    ReferralPath.objects.filter(
+        descendant__in=ReferralPath.objects.filter(
+            ancestor_id=user_id
+        ).values('descendant'),
+        ancestor__in=ReferralPath.objects.filter(
+            descendant_id=user_id, depth__gt=0
+        ).values('ancestor'),
+    ).delete()
+
+
+def in_downline(user_id, other_id):
+    """True when `other_id` is the user or someone in their downline."""
+    return ReferralPath.objects.filter(
+        ancestor_id=user_id, descendant_id=other_id
+    ).exists()
+
+
+def _attach(user_id, referrer_id):
+    if referrer_id is None:
+        return
+    ancestors = list(
+        ReferralPath.objects.filter(descendant_id=referrer_id)
+        .values_list('ancestor_id', 'depth')
+    )
+    downline = list(
+        ReferralPath.objects.filter(ancestor_id=user_id)
+        .values_list('descendant_id', 'depth')
+    )
+    ReferralPath.objects.bulk_create(
+        [
+            ReferralPath(
+                ancestor_id=ancestor_id,
+                descendant_id=descendant_id,
+                depth=ancestor_depth + descendant_depth + 1,
+            )
+            for ancestor_id, ancestor_depth in ancestors
+            for descendant_id, descendant_depth in downline
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def rebuild_paths():
+    """Recount the closure table from `referred_by`. Returns the row count.
+
+    One `INSERT ... SELECT` per tree level: the paths of depth N to a user
+    are the paths of depth N - 1 to their referrer.
+    """
+    paths = ReferralPath._meta.db_table
+    users = User._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        ReferralPath.objects.all().delete()
+        cursor.execute(f"""
+            INSERT INTO {paths} (ancestor_id, descendant_id, depth)
+            SELECT id, id, 0 FROM {users}
+        """)
+        inserted = created = cursor.rowcount
+        depth = 0
+        # Глубина не больше числа пользователей, даже если в данных цикл
+        while inserted and depth < created:
+            depth += 1
+            cursor.execute(f"""
+                INSERT INTO {paths} (ancestor_id, descendant_id, depth)
+                SELECT path.ancestor_id, referral.id, %s
+                FROM {paths} AS path
+                JOIN {users} AS referral
+                  ON referral.referred_by_id = path.descendant_id
+                WHERE path.depth = %s
+            """, [depth, depth - 1])
+            inserted = cursor.rowcount
+            created += inserted
+    return created
+
+
+# ----- Analytics -----
+
+def descendants(user, max_depth=None):
+    """Users in the downline, nearest first, with `referral_depth`."""
+    paths = {
+        'ancestor_paths__ancestor': user,
+        'ancestor_paths__depth__gt': 0,
+    }
+    if max_depth is not None:
+        paths['ancestor_paths__depth__lte'] = max_depth
+    return (
+        User.objects.filter(**paths)
+        .annotate(referral_depth=F('ancestor_paths__depth'))
+        .order_by('referral_depth', 'id')
+    )
+
+
+def downline_size(user, max_depth=None):
+    paths = ReferralPath.objects.filter(ancestor=user, depth__gt=0)
+    if max_depth is not None:
+        paths = paths.filter(depth__lte=max_depth)
+    return paths.count()
+
+
+def downline_volume(user, max_depth=None):
+    """Completed orders of the downline by currency, archive included.
+
+    Returns dicts with `currency`, `order_count` and `amount` (sum of
+    `amount_from`), sorted by currency code.
+    """
+    paths = {
+        'order__user__ancestor_paths__ancestor': user,
+        'order__user__ancestor_paths__depth__gt': 0,
+    }
+    if max_depth is not None:
+        paths['order__user__ancestor_paths__depth__lte'] = max_depth
+
+    def totals(items):
+        return (
+            items.filter(order__status=VOLUME_STATUS, **paths)
+            .values(currency=F('from_currency__code'))
+            .annotate(
+                order_count=Count('order', distinct=True),
+                amount=Sum('amount_from'),
+            )
+            .order_by()
+        )
+
+    # Активные и архивные заказы - один запрос через UNION
+    volume = defaultdict(lambda: {'order_count': 0, 'amount': Decimal(0)})
+    for row in totals(OrderItem.objects).union(
+        totals(ArchivedOrderItem.objects), all=True
+    ):
+        currency = volume[row['currency']]
+        currency['order_count'] += row['order_count']
+        currency['amount'] += row['amount']
+    return [
+        {'currency': code, **volume[code]} for code in sorted(volume)
+    ]
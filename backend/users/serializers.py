@@ -2,6 +2,7 @@ from rest_framework import serializers
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
 from djoser.serializers import UserSerializer as BaseUserSerializer
 from django.contrib.auth import get_user_model
+from core.fieldsets import SparseFieldsetMixin
 
 User = get_user_model()
 
@@ -42,7 +43,7 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
         return value
 
 
-class UserSerializer(BaseUserSerializer):
+class UserSerializer(SparseFieldsetMixin, BaseUserSerializer):
     referral_link = serializers.CharField(read_only=True)
 
     class Meta(BaseUserSerializer.Meta):
@@ -50,3 +51,25 @@ class UserSerializer(BaseUserSerializer):
         fields = ('id', 'username', 'email', 'first_name', 'last_name',
                   'telegram', 'whatsapp', 'referral_link')
         read_only_fields = ('email', 'referral_code', 'bonus_balance')
+        expandable_fields = ('referral_link',)
+        field_dependencies = {'referral_link': ('referral_code',)}
+
+
+class ReferralFilterSerializer(serializers.Serializer):
+    """Параметры запросов реферальной сети"""
+    depth = serializers.IntegerField(min_value=1, required=False)
+
+
+class ReferralSerializer(serializers.ModelSerializer):
+    referral_depth = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'first_name', 'last_name',
+                  'date_joined', 'referral_depth')
+
+
+class ReferralVolumeSerializer(serializers.Serializer):
+    currency = serializers.CharField()
+    order_count = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=30, decimal_places=10)
@@ -0,0 +1,48 @@
+"""Keep the referral closure table (users.referrals) current."""
+from django.core.exceptions import ValidationError
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from users.models import User
+from users.referrals import detach, in_downline, referrer_changed, user_created
+
+REFERRER_FIELDS = {'referred_by', 'referred_by_id'}
+
+
+@receiver(pre_save, sender=User, dispatch_uid='users_referrer_previous')
+def remember_referrer(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    instance._referrer_changed = False
+    if raw or instance._state.adding:
+        return
+    # Вход пользователя и правка профиля referred_by не трогают
+    if update_fields is not None and not REFERRER_FIELDS & set(update_fields):
+        return
+    previous = User.objects.filter(pk=instance.pk).values_list(
+        'referred_by_id', flat=True
+    ).first()
+    if previous == instance.referred_by_id:
+        return
+    if instance.referred_by_id is not None and in_downline(
+        instance.pk, instance.referred_by_id
+    ):
+        # Формы проверяют это в User.clean(); здесь - защита остального кода
+        raise ValidationError('Реферер не может входить в сеть пользователя')
+    instance._referrer_changed = True
+
+
+@receiver(post_save, sender=User, dispatch_uid='users_referral_paths')
+def update_referral_paths(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        user_created(instance)
+    elif instance._referrer_changed:
+        referrer_changed(instance)
+        instance._referrer_changed = False
+
+
+@receiver(pre_delete, sender=User, dispatch_uid='users_referral_detach')
+def detach_downline(sender, instance, **kwargs):
+    # Рефералы удалённого пользователя становятся корнями своих сетей
+    detach(instance.pk)
@@ -1,15 +1,30 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
-from users.serializers import UserSerializer, UserProfileUpdateSerializer
+from users.referrals import descendants, downline_size, downline_volume
+from users.serializers import (
+    ReferralFilterSerializer,
+    ReferralSerializer,
+    ReferralVolumeSerializer,
+    UserSerializer,
+    UserProfileUpdateSerializer,
+)
 from django.contrib.auth import get_user_model
+from core.fieldsets import SparseFieldsetViewMixin
 
 User = get_user_model()
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class ReferralPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class UserViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
@@ -40,6 +55,32 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'])
+    def referrals(self, request):
+        """Реферальная сеть текущего пользователя (?depth= - до уровня)"""
+        paginator = ReferralPagination()
+        page = paginator.paginate_queryset(
+            descendants(request.user, self.referral_depth()), request,
+            view=self,
+        )
+        serializer = ReferralSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def referral_stats(self, request):
+        """Размер и объём заказов реферальной сети текущего пользователя"""
+        depth = self.referral_depth()
+        volume = downline_volume(request.user, depth)
+        return Response({
+            'downline_size': downline_size(request.user, depth),
+            'volume': ReferralVolumeSerializer(volume, many=True).data,
+        })
+
+    def referral_depth(self):
+        filters = ReferralFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        return filters.validated_data.get('depth')
+
     @action(detail=True, methods=['get'], url_path='profile')
     def get_profile_by_supabase_id(self, request, pk=None):
         """Получить профиль пользователя по Supabase ID"""
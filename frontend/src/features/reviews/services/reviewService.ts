@@ -18,8 +18,10 @@ export const reviewService = {
       return MOCK_REVIEWS;
     }
     
-    // В продакшене используем реальный API
-    const response = await api.get<Review[]>('/reviews/list_public/');
-    return response.data;
+    // В продакшене используем реальный API (ответ разбит на страницы)
+    const response = await api.get<{ count: number; results: Review[] }>(
+      '/reviews/list_public/'
+    );
+    return response.data.results;
   },
 }; 
\ No newline at end of file